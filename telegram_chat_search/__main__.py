@@ -4,6 +4,8 @@ CLI principal del Telegram Chat Search
 
 import click
 import logging
+import time
+from contextlib import nullcontext
 from pathlib import Path
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
@@ -17,6 +19,24 @@ logging.basicConfig(
 )
 
 
+def _use_sqlite_profile(default: str) -> str:
+    """Activa el perfil de PRAGMAs de SQLite (SQLITE_PROFILE o el del comando)"""
+    from .database.connection import set_pragma_profile
+
+    profile = config.sqlite_profile or default
+    set_pragma_profile(profile)
+    return profile
+
+
+def _finish_sqlite(db_path: Path, profile: str) -> None:
+    """Cierra las conexiones y, tras escribir con el perfil import, vuelca el WAL"""
+    from .database.connection import finish_import, close_all_connections
+
+    close_all_connections()
+    if profile == "import":
+        finish_import(db_path)
+
+
 @click.group()
 def cli():
     """Telegram Chat Search - Chat IA para búsqueda en mensajes de Telegram"""
@@ -28,7 +48,7 @@ def cli():
     '--input', '-i', 'input_path',
     type=click.Path(exists=True, path_type=Path),
     default=None,
-    help='Directorio con archivos HTML exportados de Telegram'
+    help='Directorio del export de Telegram (messages*.html o result.json)'
 )
 @click.option(
     '--output', '-o', 'output_path',
@@ -46,14 +66,43 @@ def cli():
     default="1478",
     help='ID del topic (para supergrupos con topics)'
 )
-def import_html(input_path, output_path, chat_id, topic_id):
-    """Importa mensajes desde archivos HTML de Telegram Desktop"""
-    from .html_parser import parse_all_html_files
-    from .database.schema import init_database, Message
-    from .database.repositories import MessageRepository, ImportantUserRepository
-
+@click.option(
+    '--workers', '-w',
+    default=1,
+    type=click.IntRange(min=1),
+    help='Procesos para parsear los archivos HTML en paralelo'
+)
+@click.option(
+    '--parser', 'parser_backend',
+    type=click.Choice(['bs4', 'lxml']),
+    default=None,
+    help='Backend de parseo HTML (default: HTML_PARSER_BACKEND o bs4)'
+)
+@click.option(
+    '--full', is_flag=True,
+    help='Re-importar todos los archivos aunque no hayan cambiado'
+)
+@click.option(
+    '--bulk-load', is_flag=True,
+    help='Desactivar los triggers FTS durante la carga y reconstruir el índice al final'
+)
+def import_html(input_path, output_path, chat_id, topic_id, workers, parser_backend, full, bulk_load):
+    """
+    Importa mensajes desde un export de Telegram Desktop.
+
+    Si el directorio contiene result.json (export JSON) se usa el importador
+    JSON en streaming; si no, se parsean los archivos messages*.html.
+    """
+    from .html_parser.extractor import find_html_files, iter_parsed_files
+    from .html_parser.manifest import plan_import, plan_resync, build_manifest_entry, ImportedRange
+    from .json_parser import find_json_export, iter_json_messages
+    from .database.schema import init_database, fts_bulk_load
+    from .database.repositories import MessageRepository, ImportantUserRepository, ImportManifestRepository
+
+    sqlite_profile = _use_sqlite_profile("import")
     input_path = input_path or config.html_export_path
     output_path = output_path or config.database_path
+    parser_backend = parser_backend or config.html_parser_backend
 
     console.print(f"[bold blue]Importando mensajes desde:[/] {input_path}")
     console.print(f"[bold blue]Base de datos:[/] {output_path}")
@@ -63,54 +112,180 @@ def import_html(input_path, output_path, chat_id, topic_id):
         TextColumn("[progress.description]{task.description}"),
         console=console
     ) as progress:
-        # Parsear HTML
-        task = progress.add_task("Parseando archivos HTML...", total=None)
-        messages = parse_all_html_files(input_path, chat_id, topic_id)
-        progress.update(task, description=f"Parseados {len(messages)} mensajes")
-
         # Inicializar base de datos
-        progress.update(task, description="Inicializando base de datos...")
-        init_database(output_path)
-
-        # Convertir a objetos Message
-        db_messages = []
-        for msg in messages:
-            db_messages.append(Message(
-                id=msg.id,
-                chat_id=msg.chat_id,
-                topic_id=msg.topic_id,
-                sender_name=msg.sender_name,
-                text=msg.text,
-                text_clean=msg.text_clean,
-                timestamp=msg.timestamp,
-                timestamp_utc=msg.timestamp_utc,
-                message_type=msg.message_type,
-                reply_to_message_id=msg.reply_to_message_id,
-                source='html_export',
-                source_file=msg.source_file,
-            ))
-
-        # Insertar mensajes
-        progress.update(task, description="Insertando mensajes en la base de datos...")
-        repo = MessageRepository(output_path)
-        count = repo.bulk_insert(db_messages)
-
-        # Añadir usuarios importantes por defecto
-        progress.update(task, description="Configurando usuarios importantes...")
-        user_repo = ImportantUserRepository(output_path)
-        for user in config.important_users:
-            user_repo.add_user(user, role="admin")
-
-        # Marcar mensajes de usuarios importantes
-        marked = user_repo.mark_important_messages()
+        task = progress.add_task("Inicializando base de datos...", total=None)
+        init_database(output_path).close()
+
+        # Un export JSON (result.json) tiene prioridad sobre los HTML
+        json_path = find_json_export(input_path)
+        export_files = [json_path] if json_path else find_html_files(input_path)
+
+        # Comparar el export con el manifest para parsear solo lo que cambió
+        progress.update(task, description="Comprobando archivos modificados...")
+        manifest_repo = ImportManifestRepository(output_path)
+        manifest = manifest_repo.get_all()
+        plan = plan_import(export_files, manifest, full=full)
+        for entry in plan.refreshed:
+            manifest_repo.save(entry)
+
+        # En modo carga masiva el índice FTS se reconstruye una vez al final
+        # en lugar de actualizarse fila a fila con los triggers
+        bulk_context = fts_bulk_load(output_path) if bulk_load else nullcontext()
+        with bulk_context:
+            file_timings = []
+            repo = MessageRepository(output_path)
+            count = 0
+
+            # Los archivos que ya no están en el export se llevan sus mensajes
+            removed = 0
+            # Archivos sin cambios que se re-parsearon porque cambió su remitente inicial
+            resynced = 0
+            for entry in plan.removed:
+                if entry.min_message_id is not None:
+                    removed += repo.delete_file_messages(entry.file_name, entry.min_message_id, entry.max_message_id)
+                manifest_repo.delete(entry.file_name)
+
+            def replace_file_range(file_path: Path) -> None:
+                # Un archivo modificado reemplaza solo su propio rango de IDs
+                previous = manifest.get(file_path.name)
+                if previous and previous.min_message_id is not None:
+                    repo.delete_file_messages(file_path.name, previous.min_message_id, previous.max_message_id)
+
+            if json_path:
+                parser_backend = "json"
+                for file_path in plan.changed:
+                    progress.update(task, description=f"Importando {file_path.name} en streaming...")
+                    replace_file_range(file_path)
+
+                    start = time.perf_counter()
+                    imported = ImportedRange()
+                    messages = imported.track(iter_json_messages(file_path, chat_id, topic_id))
+                    count += repo.bulk_insert(_to_db_messages(messages, source='json_export'), batch_size=1000)
+                    file_timings.append((file_path.name, imported.message_count, time.perf_counter() - start))
+
+                    manifest_repo.save(build_manifest_entry(file_path, plan.hashes[file_path.name], imported))
+            else:
+                # Parsear HTML e insertar en streaming: cada archivo se escribe en la
+                # base de datos mientras los workers parsean los siguientes
+                progress.update(task, description="Parseando archivos HTML...")
+                seen_ids = set()
+                to_parse, initial_senders = plan.changed, plan.initial_senders
+                hashes = dict(plan.hashes)
+                total_files = len(to_parse)
+                # Último remitente de cada archivo parseado y remitente con el que empezó
+                last_senders = {}
+                inherited = {}
+                while to_parse:
+                    parsed_files = iter_parsed_files(
+                        to_parse, chat_id, topic_id,
+                        workers=workers,
+                        backend=parser_backend,
+                        initial_senders=initial_senders
+                    )
+                    carried_sender = None
+                    for file_path, messages, elapsed in parsed_files:
+                        file_timings.append((file_path.name, len(messages), elapsed))
+                        progress.update(task, description=f"Importando {file_path.name} ({len(file_timings)}/{total_files} archivos)...")
+                        replace_file_range(file_path)
+
+                        # Eliminar duplicados (pueden existir en límites de archivos)
+                        unique = [msg for msg in messages if msg.id not in seen_ids]
+                        seen_ids.update(msg.id for msg in unique)
+                        count += repo.bulk_insert(_to_db_messages(unique), batch_size=1000)
+
+                        imported = ImportedRange.from_messages(messages)
+                        manifest_repo.save(build_manifest_entry(file_path, hashes[file_path.name], imported))
+
+                        inherited[file_path.name] = initial_senders.get(file_path.name, carried_sender)
+                        last_senders[file_path.name] = imported.last_sender
+                        if messages:
+                            carried_sender = imported.last_sender
+
+                    # Si cambió el último remitente de un archivo, el siguiente
+                    # (aunque no haya cambiado) empezó con el remitente antiguo
+                    resync = plan_resync(export_files, manifest, last_senders, inherited)
+                    to_parse, initial_senders = resync.changed, resync.initial_senders
+                    hashes.update(resync.hashes)
+                    total_files += len(to_parse)
+                    resynced += len(to_parse)
+
+            # Añadir usuarios importantes por defecto
+            progress.update(task, description="Configurando usuarios importantes...")
+            user_repo = ImportantUserRepository(output_path)
+            for user in config.important_users:
+                user_repo.add_user(user, role="admin")
+
+            # Marcar mensajes de usuarios importantes
+            marked = user_repo.mark_important_messages()
+
+            if bulk_load:
+                progress.update(task, description="Reconstruyendo índice FTS...")
+
+        _finish_sqlite(output_path, sqlite_profile)
 
         progress.update(task, description="[green]✓ Importación completada")
 
+    _print_file_timings(file_timings, workers, parser_backend)
+    if len(plan.unchanged) > resynced:
+        console.print(f"\n[dim]{len(plan.unchanged) - resynced} archivos sin cambios omitidos (usa --full para re-importarlos)[/]")
+    if plan.removed:
+        console.print(
+            f"\n[yellow]{len(plan.removed)} archivos ya no están en el export: "
+            f"eliminados {removed} mensajes[/]"
+        )
     console.print(f"\n[green]✓[/] Importados [bold]{count}[/] mensajes")
     console.print(f"[green]✓[/] Marcados [bold]{marked}[/] mensajes de usuarios importantes")
     console.print(f"\n[dim]Base de datos guardada en: {output_path}[/]")
 
 
+def _to_db_messages(messages, source: str = 'html_export'):
+    """Convierte mensajes parseados a objetos Message de forma perezosa"""
+    from .database.schema import Message
+
+    for msg in messages:
+        yield Message(
+            id=msg.id,
+            chat_id=msg.chat_id,
+            topic_id=msg.topic_id,
+            sender_name=msg.sender_name,
+            text=msg.text,
+            text_clean=msg.text_clean,
+            timestamp=msg.timestamp,
+            timestamp_utc=msg.timestamp_utc,
+            message_type=msg.message_type,
+            reply_to_message_id=msg.reply_to_message_id,
+            source=source,
+            source_file=msg.source_file,
+        )
+
+
+def _print_file_timings(file_timings: list[tuple[str, int, float]], workers: int, parser_backend: str) -> None:
+    """Muestra los tiempos de parseo por archivo"""
+    from rich.table import Table
+
+    if not file_timings:
+        return
+
+    title = f"Parseo por archivo ({parser_backend}"
+    if parser_backend != "json":
+        title += f", {workers} proceso{'s' if workers > 1 else ''}"
+    table = Table(title=title + ")")
+    table.add_column("Archivo")
+    table.add_column("Mensajes", justify="right")
+    table.add_column("Tiempo", justify="right")
+    table.add_column("Msg/s", justify="right")
+
+    for file_name, n_messages, elapsed in file_timings:
+        rate = n_messages / elapsed if elapsed > 0 else 0
+        table.add_row(file_name, str(n_messages), f"{elapsed:.2f}s", f"{rate:.0f}")
+
+    total_messages = sum(n for _, n, _ in file_timings)
+    total_time = sum(t for _, _, t in file_timings)
+    table.add_row("[bold]Total (CPU)[/]", str(total_messages), f"{total_time:.2f}s", "", end_section=True)
+
+    console.print(table)
+
+
 @cli.command('generate-embeddings')
 @click.option(
     '--database', '-d',
@@ -123,12 +298,57 @@ def import_html(input_path, output_path, chat_id, topic_id):
     default=32,
     help='Tamaño del batch para generar embeddings'
 )
-def generate_embeddings(database, batch_size):
-    """Genera embeddings para búsqueda semántica"""
+@click.option(
+    '--chunk-size',
+    default=1000,
+    type=click.IntRange(min=1),
+    help='Mensajes que se leen, codifican y guardan en cada bloque'
+)
+@click.option(
+    '--full', is_flag=True,
+    help='Re-codificar todos los mensajes en lugar de solo los nuevos o modificados'
+)
+@click.option(
+    '--restart', is_flag=True,
+    help='Con --full: ignorar el checkpoint de una ejecución interrumpida y empezar de cero'
+)
+@click.option(
+    '--workers', '-w',
+    default=1,
+    type=click.IntRange(min=1),
+    help='Procesos que codifican en paralelo, cada uno con su modelo'
+)
+@click.option(
+    '--skip-low-value', is_flag=True,
+    help='No generar embeddings de mensajes de bajo valor (risas, monosílabos...)'
+)
+def generate_embeddings(database, batch_size, chunk_size, full, restart, workers, skip_low_value):
+    """
+    Genera embeddings para búsqueda semántica.
+
+    Por defecto solo codifica los mensajes sin embedding, con el texto
+    modificado o codificados con otro modelo, y elimina los embeddings de
+    mensajes que ya no existen. Los mensajes se procesan en bloques de
+    --chunk-size: cada bloque se codifica y se guarda antes de leer el
+    siguiente, de modo que la memoria no depende del tamaño del chat.
+
+    Con --workers N los bloques se codifican en N procesos mientras el
+    proceso principal guarda los ya terminados.
+
+    Cada texto distinto se codifica una sola vez (los repetidos y los que ya
+    tienen embedding reutilizan el vector) y los textos se agrupan por
+    longitud para minimizar el padding.
+    """
+    from .database.schema import init_database
     from .database.repositories import MessageRepository, EmbeddingRepository
-    from .search.embeddings import EmbeddingEngine
+    from .database.vector_store import load_vector_store
+    from .database.message_metadata import load_message_metadata
+    from .search.embeddings import EmbeddingEngine, iter_encoded_chunks
+    from .search.encode_planner import EncodePlanner
 
+    sqlite_profile = _use_sqlite_profile("import")
     database = database or config.database_path
+    model_name = config.embedding_model
 
     console.print(f"[bold blue]Generando embeddings desde:[/] {database}")
 
@@ -139,33 +359,185 @@ def generate_embeddings(database, batch_size):
     ) as progress:
         task = progress.add_task("Cargando mensajes...", total=None)
 
-        # Obtener mensajes con texto
+        # Crea las tablas/columnas nuevas en bases de datos anteriores
+        init_database(database).close()
         msg_repo = MessageRepository(database)
-        messages = msg_repo.get_messages_with_text()
-        progress.update(task, description=f"Cargados {len(messages)} mensajes con texto")
+        emb_repo = EmbeddingRepository(database)
 
-        if not messages:
-            console.print("[yellow]No hay mensajes para procesar[/]")
+        removed = emb_repo.delete_orphans()
+
+        if full:
+            # Una re-codificación completa interrumpida continúa desde su checkpoint
+            checkpoint = None if restart else emb_repo.get_checkpoint(model_name)
+            last_id, generated = checkpoint or (0, 0)
+            if checkpoint:
+                console.print(f"[yellow]Reanudando tras el mensaje {last_id} ({generated} embeddings ya generados)[/]")
+            total = generated + msg_repo.count_messages_with_text(after_id=last_id)
+            chunks = msg_repo.iter_messages_with_text(chunk_size=chunk_size, after_id=last_id)
+        else:
+            # En modo incremental lo ya guardado deja de estar pendiente, así
+            # que una ejecución interrumpida se reanuda sola
+            generated = 0
+            # Con --skip-low-value los textos ya omitidos antes no están pendientes
+            total = msg_repo.count_messages_needing_embedding(model_name, skip_low_value=skip_low_value)
+            chunks = msg_repo.iter_messages_needing_embedding(
+                model_name, chunk_size=chunk_size, skip_low_value=skip_low_value
+            )
+
+        if total == generated:
+            emb_repo.clear_checkpoint(model_name)
+            load_message_metadata(database, load_vector_store(database))
+            _finish_sqlite(database, sqlite_profile)
+            console.print("[green]✓[/] Los embeddings están al día")
+            if removed:
+                console.print(f"[green]✓[/] Eliminados [bold]{removed}[/] embeddings huérfanos")
             return
 
-        # Preparar textos
-        texts = [m.text_clean for m in messages]
-        message_ids = [m.id for m in messages]
+        # Con --full se re-codifica todo: no se reutilizan los embeddings guardados
+        planner = EncodePlanner(
+            batch_size=batch_size,
+            skip_low_value=skip_low_value,
+            lookup_existing=None if full else (lambda hashes: emb_repo.get_embeddings_by_text_hash(hashes, model_name)),
+        )
+        plans = (planner.plan(chunk) for chunk in chunks)
+
+        if workers > 1:
+            encoded_chunks = iter_encoded_chunks(
+                plans, lambda plan: plan.texts, model_name,
+                batch_size=batch_size, workers=workers,
+                backend=config.embedding_backend, onnx_dir=config.onnx_model_dir
+            )
+        else:
+            engine = EmbeddingEngine(model_name, backend=config.embedding_backend, onnx_dir=config.onnx_model_dir)
+            encoded_chunks = (
+                (plan, engine.encode(plan.texts, batch_size=batch_size, show_progress=False))
+                for plan in plans
+            )
+
+        start = time.perf_counter()
+        progress.update(task, description=f"Generando embeddings ({generated}/{total})...")
+        for plan, encoded in encoded_chunks:
+            planner.remember(plan, encoded)
+            message_ids, embeddings, hashes = plan.expand(encoded)
+            if message_ids:
+                emb_repo.bulk_save_embeddings(message_ids, embeddings, model_name, text_hashes=hashes)
+            if plan.skipped_hashes:
+                emb_repo.mark_low_value_texts(plan.skipped_hashes)
+
+            # Los omitidos también cuentan como procesados
+            generated += plan.processed
+            if full:
+                emb_repo.save_checkpoint(model_name, plan.last_id, generated)
+            progress.update(task, description=f"Generando embeddings ({generated}/{total})...")
+        elapsed = time.perf_counter() - start
+
+        emb_repo.clear_checkpoint(model_name)
+
+        # Volcar los embeddings al almacén en disco que abre el servidor
+        progress.update(task, description="Actualizando almacén de vectores...")
+        load_message_metadata(database, load_vector_store(database))
+
+        _finish_sqlite(database, sqlite_profile)
 
-        # Generar embeddings
-        progress.update(task, description="Generando embeddings (esto puede tardar)...")
-        engine = EmbeddingEngine(config.embedding_model)
-        embeddings = engine.encode(texts, batch_size=batch_size, show_progress=True)
+        progress.update(task, description="[green]✓ Embeddings generados")
 
-        # Guardar en base de datos
-        progress.update(task, description="Guardando embeddings...")
-        emb_repo = EmbeddingRepository(database)
-        emb_repo.bulk_save_embeddings(message_ids, embeddings, config.embedding_model)
+    stats = planner.stats
+    console.print(f"\n[green]✓[/] Generados [bold]{stats.messages - stats.skipped}[/] embeddings")
+    for line in stats.summary():
+        console.print(f"  {line}")
+    if stats.encoded:
+        console.print(
+            f"[green]✓[/] {stats.encoded} textos en {elapsed:.1f}s: "
+            f"[bold]{stats.encoded / max(elapsed, 1e-9):.1f}[/] textos/s "
+            f"({workers} proceso{'s' if workers > 1 else ''})"
+        )
+    if removed:
+        console.print(f"[green]✓[/] Eliminados [bold]{removed}[/] embeddings huérfanos")
+    console.print(f"[dim]Modelo: {model_name} ({config.embedding_backend})[/]")
+
+
+@cli.command('export-onnx')
+@click.option(
+    '--output', '-o',
+    type=click.Path(path_type=Path),
+    default=None,
+    help='Directorio de salida (default: ONNX_MODEL_DIR)'
+)
+@click.option('--no-quantize', is_flag=True, help='No generar la variante int8')
+def export_onnx(output, no_quantize):
+    """
+    Exporta el modelo de embeddings a ONNX para el backend onnxruntime.
 
-        progress.update(task, description="[green]✓ Embeddings generados")
+    Genera model.onnx y, salvo --no-quantize, model_int8.onnx (cuantización
+    dinámica). Después activa el backend con EMBEDDING_BACKEND=onnx u onnx-int8.
+    """
+    from .search.onnx_encoder import export_onnx as run_export
+
+    output = output or config.onnx_model_dir
+    with console.status(f"Exportando {config.embedding_model} a ONNX..."):
+        report = run_export(config.embedding_model, output, quantize=not no_quantize)
+
+    console.print(f"[green]✓[/] Modelo exportado en {output}")
+    for key, label in (("min_cosine", "onnx"), ("min_cosine_int8", "onnx-int8")):
+        if key in report:
+            color = "green" if report[key] >= 0.99 else "yellow"
+            console.print(f"  {label}: similitud coseno mínima con sentence-transformers [{color}]{report[key]:.4f}[/]")
 
-    console.print(f"\n[green]✓[/] Generados [bold]{len(embeddings)}[/] embeddings")
-    console.print(f"[dim]Modelo: {config.embedding_model}[/]")
+
+@cli.command('build-ann-index')
+@click.option(
+    '--database', '-d',
+    type=click.Path(exists=True, path_type=Path),
+    default=None,
+    help='Ruta a la base de datos SQLite'
+)
+@click.option('--nlist', type=click.IntRange(min=1), default=None, help='Número de listas IVF (default: 4·√n)')
+@click.option('--iterations', default=20, type=click.IntRange(min=1), help='Iteraciones de k-means')
+@click.option('--top-k', '-k', default=10, help='k para medir recall@k')
+@click.option('--queries', 'n_queries', default=200, type=click.IntRange(min=1),
+              help='Vectores del corpus usados como queries para medir el recall')
+def build_ann_index(database, nlist, iterations, top_k, n_queries):
+    """
+    Construye el índice aproximado (IVF) para la búsqueda semántica.
+
+    Informa del recall@k frente a la búsqueda exacta para distintos nprobe;
+    el valor elegido se configura con ANN_NPROBE.
+    """
+    import numpy as np
+    from rich.table import Table
+    from .database.vector_store import load_vector_store
+    from .search.ivf_index import build_ivf_index, save_ivf_index, evaluate_recall
+
+    database = database or config.database_path
+
+    with console.status("Cargando almacén de vectores..."):
+        store = load_vector_store(database)
+    if not len(store):
+        console.print("[yellow]No hay embeddings. Ejecuta primero generate-embeddings[/]")
+        return
+
+    start = time.perf_counter()
+    with console.status(f"Entrenando k-means sobre {store.n_vectors} vectores..."):
+        index = build_ivf_index(store, nlist=nlist, n_iter=iterations)
+        path = save_ivf_index(index, database)
+    console.print(f"[green]✓[/] Índice IVF con [bold]{index.nlist}[/] listas en {time.perf_counter() - start:.1f}s: {path}")
+
+    rng = np.random.default_rng(0)
+    queries = np.asarray(store.vectors[np.sort(rng.choice(store.n_vectors, size=min(n_queries, store.n_vectors), replace=False))])
+    with console.status("Midiendo recall..."):
+        report = evaluate_recall(index, store, queries, top_k=top_k)
+
+    table = Table(title=f"Recall@{top_k} frente a búsqueda exacta ({len(queries)} queries)")
+    table.add_column("nprobe", justify="right")
+    table.add_column(f"Recall@{top_k}", justify="right")
+    table.add_column("IVF ms/query", justify="right")
+    table.add_column("Exacta ms/query", justify="right")
+    for row in report:
+        marker = " ←" if row["nprobe"] == config.ann_nprobe else ""
+        table.add_row(f"{row['nprobe']}{marker}", f"{row['recall']:.3f}",
+                      f"{row['ann_ms']:.2f}", f"{row['exact_ms']:.2f}")
+    console.print(table)
+    console.print(f"[dim]nprobe actual: {config.ann_nprobe} (ANN_NPROBE)[/]")
 
 
 @cli.command('add-important-user')
@@ -179,9 +551,12 @@ def generate_embeddings(database, batch_size):
 )
 def add_important_user(name, role, database):
     """Añade un usuario a la lista de usuarios importantes"""
+    from .database.schema import init_database
     from .database.repositories import ImportantUserRepository
 
     database = database or config.database_path
+    # Crea las tablas/columnas nuevas en bases de datos anteriores
+    init_database(database).close()
 
     user_repo = ImportantUserRepository(database)
     user_repo.add_user(name, role)
@@ -257,7 +632,7 @@ def stats(database):
 
 
 @cli.command('search')
-@click.argument('query')
+@click.argument('query', required=False)
 @click.option(
     '--database', '-d',
     type=click.Path(exists=True, path_type=Path),
@@ -265,19 +640,63 @@ def stats(database):
     help='Ruta a la base de datos SQLite'
 )
 @click.option('--top-k', '-k', default=10, help='Número de resultados')
-def search(query, database, top_k):
+@click.option(
+    '--queries-file',
+    type=click.File('r', encoding='utf-8'),
+    default=None,
+    help='Archivo con una query por línea: se buscan en lote y se escriben como JSONL'
+)
+@click.option(
+    '--output', '-o',
+    type=click.File('w', encoding='utf-8'),
+    default='-',
+    help='Destino del JSONL con --queries-file (default: salida estándar)'
+)
+@click.option('--since', default=None, help='Solo mensajes desde esta fecha (AAAA-MM-DD [HH:MM])')
+@click.option('--until', default=None, help='Solo mensajes hasta esta fecha, incluida (AAAA-MM-DD [HH:MM])')
+@click.option('--sender', 'senders', multiple=True, help='Solo mensajes de este remitente (repetible)')
+@click.option('--type', 'message_types', multiple=True, help='Solo mensajes de este tipo: text, photo... (repetible)')
+@click.option('--important-only', is_flag=True, help='Solo mensajes de usuarios importantes')
+def search(query, database, top_k, queries_file, output, since, until, senders, message_types, important_only):
     """Búsqueda rápida desde línea de comandos"""
     from .search.hybrid_search import HybridSearch
-    from .search.filters import es_mensaje_bajo_valor
+    from .search.filters import SearchFilters, es_mensaje_bajo_valor
     from .chat_interface.deep_links import generate_telegram_link
 
+    if not query and not queries_file:
+        raise click.UsageError("Indica una QUERY o --queries-file")
+
+    try:
+        filters = SearchFilters.from_options(since, until, senders, message_types, important_only)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="'--since' / '--until'")
+
+    _use_sqlite_profile("serve")
     database = database or config.database_path
 
-    search_engine = HybridSearch(database)
+    search_engine = HybridSearch(
+        database,
+        message_cache_size=config.message_cache_size,
+        nprobe=config.ann_nprobe,
+        vector_tier=config.vector_tier,
+        rescore_factor=config.vector_rescore_factor,
+        query_cache_size=config.query_cache_size,
+        query_cache_path=config.query_cache_path,
+        embedding_backend=config.embedding_backend,
+        onnx_dir=config.onnx_model_dir,
+        vector_timeout=config.search_vector_timeout or None,
+        fts_timeout=config.search_fts_timeout or None,
+        result_cache_size=config.result_cache_size,
+        result_cache_ttl=config.result_cache_ttl or None
+    )
+
+    if queries_file:
+        _search_batch_jsonl(search_engine, queries_file, output, top_k, filters)
+        return
 
     console.print(f"\n[bold]🔍 Buscando:[/] {query}\n")
 
-    results = search_engine.search(query, top_k=top_k)
+    results = search_engine.search(query, top_k=top_k, filters=filters)
 
     # Filtrar mensajes de bajo valor (monosilabos, risas, etc.)
     results = [r for r in results if not es_mensaje_bajo_valor(r.message.text_clean)]
@@ -300,5 +719,51 @@ def search(query, database, top_k):
         console.print()
 
 
+def _search_batch_jsonl(search_engine, queries_file, output, top_k: int, filters=None) -> None:
+    """Busca en lote las queries de un archivo y escribe una línea JSON por query"""
+    import json
+    from .search.filters import es_mensaje_bajo_valor
+    from .chat_interface.deep_links import generate_telegram_link
+
+    queries = [line.strip() for line in queries_file if line.strip()]
+    if not queries:
+        raise click.UsageError("El archivo de queries está vacío")
+
+    start = time.perf_counter()
+    batch_results = search_engine.search_batch(queries, top_k=top_k, filters=filters)
+    elapsed = time.perf_counter() - start
+
+    for query, results in zip(queries, batch_results):
+        output.write(json.dumps({
+            "query": query,
+            "results": [
+                {
+                    "id": r.message.id,
+                    "score": r.score,
+                    "match_type": r.match_type,
+                    "sender": r.message.sender_name,
+                    "timestamp": str(r.message.timestamp),
+                    "text": r.message.text,
+                    "link": generate_telegram_link(r.message.chat_id, r.message.id),
+                }
+                for r in results
+                if not es_mensaje_bajo_valor(r.message.text_clean)
+            ],
+        }, ensure_ascii=False) + "\n")
+
+    # El resumen va a stderr para no mezclarse con el JSONL
+    stderr = Console(stderr=True)
+    stderr.print(
+        f"[green]✓[/] {len(queries)} queries en {elapsed:.2f}s "
+        f"({elapsed / len(queries) * 1000:.1f} ms/query)"
+    )
+    if search_engine.query_cache is not None:
+        stats = search_engine.query_cache.stats()
+        stderr.print(
+            f"  Caché de queries: {stats['hits']} aciertos / {stats['misses']} fallos "
+            f"({stats['hit_rate']:.0%}), ~{stats['saved_seconds']:.2f}s de encode ahorrados"
+        )
+
+
 if __name__ == '__main__':
     cli()
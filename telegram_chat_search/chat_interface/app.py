@@ -9,8 +9,9 @@ import logging
 from ..config import config
 from ..search.hybrid_search import HybridSearch, SearchResult
 from ..database.repositories import ImportantUserRepository
+from ..database.connection import set_pragma_profile, preload_database
 from ..llm.summarizer import OpenRouterSummarizer, MockSummarizer
-from ..search.filters import es_mensaje_bajo_valor
+from ..search.filters import SearchFilters, es_mensaje_bajo_valor
 # from .deep_links import generate_telegram_links, format_links_markdown
 
 logger = logging.getLogger(__name__)
@@ -27,7 +28,21 @@ class TelegramChatBot:
         important_users: Optional[list[str]] = None
     ):
         self.db_path = db_path
-        self.search_engine = HybridSearch(db_path)
+        self.search_engine = HybridSearch(
+            db_path,
+            message_cache_size=config.message_cache_size,
+            nprobe=config.ann_nprobe,
+            vector_tier=config.vector_tier,
+            rescore_factor=config.vector_rescore_factor,
+            query_cache_size=config.query_cache_size,
+            query_cache_path=config.query_cache_path,
+            embedding_backend=config.embedding_backend,
+            onnx_dir=config.onnx_model_dir,
+            vector_timeout=config.search_vector_timeout or None,
+            fts_timeout=config.search_fts_timeout or None,
+            result_cache_size=config.result_cache_size,
+            result_cache_ttl=config.result_cache_ttl or None
+        )
         self.important_users = set(important_users or [])
 
         # Cargar usuarios importantes de la base de datos
@@ -98,12 +113,24 @@ class TelegramChatBot:
 ---
 """
 
-    def search_and_respond(self, query: str) -> str:
+    def search_and_respond(
+        self,
+        query: str,
+        since: str = "",
+        until: str = "",
+        senders: Optional[list[str]] = None,
+        message_types: Optional[list[str]] = None,
+        important_only: bool = False
+    ) -> str:
         """
         Busca mensajes y genera respuesta con resumen.
 
         Args:
             query: Pregunta del usuario
+            since, until: Rango de fechas (AAAA-MM-DD, vacío = sin límite)
+            senders: Remitentes a los que limitar la búsqueda
+            message_types: Tipos de mensaje a los que limitar la búsqueda
+            important_only: Solo mensajes de usuarios importantes
 
         Returns:
             Respuesta formateada en Markdown
@@ -111,11 +138,18 @@ class TelegramChatBot:
         if not query.strip():
             return "Por favor, escribe una pregunta para buscar en el chat."
 
+        try:
+            filters = SearchFilters.from_options(
+                since, until, senders or (), message_types or (), important_only
+            )
+        except ValueError as e:
+            return f"⚠️ {e}"
+
         logger.info(f"Procesando consulta: {query}")
 
         # Buscar mensajes relevantes
         # results = self.search_engine.search(query, top_k=15)
-        results = self.search_engine.search(query, top_k=50)
+        results = self.search_engine.search(query, top_k=50, filters=filters)
 
         # Filtrar mensajes de bajo valor (monosilabos, risas, etc.)
         results = [r for r in results if not es_mensaje_bajo_valor(r.message.text_clean)]
@@ -195,6 +229,12 @@ def create_chat_app(
             "Primero ejecuta: python -m telegram_chat_search import-html"
         )
 
+    # Perfil de solo lectura para servir búsquedas, con la BD ya en la caché del SO
+    sqlite_profile = config.sqlite_profile or "serve"
+    set_pragma_profile(sqlite_profile)
+    if sqlite_profile == "serve":
+        preload_database(db_path)
+
     # Crear bot
     bot = TelegramChatBot(
         db_path=db_path,
@@ -376,15 +416,33 @@ def create_chat_app(
                 lines=2
             )
 
+        with gr.Accordion("Filtros", open=False):
+            with gr.Row():
+                since_input = gr.Textbox(label="Desde", placeholder="AAAA-MM-DD")
+                until_input = gr.Textbox(label="Hasta", placeholder="AAAA-MM-DD")
+                important_input = gr.Checkbox(label="Solo usuarios importantes")
+            with gr.Row():
+                senders_input = gr.Dropdown(
+                    label="Remitentes",
+                    choices=bot.search_engine.message_repo.get_sender_names(),
+                    multiselect=True,
+                    allow_custom_value=True
+                )
+                types_input = gr.CheckboxGroup(
+                    label="Tipo de mensaje",
+                    choices=bot.search_engine.message_repo.get_message_types()
+                )
+
         with gr.Row():
             search_btn = gr.Button("🔍 Buscar", variant="primary")
             clear_btn = gr.Button("🗑️ Limpiar", variant="secondary")
 
         output = gr.Markdown(label="Resultados")
+        search_inputs = [query_input, since_input, until_input, senders_input, types_input, important_input]
 
         # Función que muestra indicador de carga
-        def search_with_loading(query):
-            return bot.search_and_respond(query)
+        def search_with_loading(query, since, until, senders, types, important_only):
+            return bot.search_and_respond(query, since, until, senders, types, important_only)
 
         # Event handlers con indicador de carga
         search_btn.click(
@@ -392,7 +450,7 @@ def create_chat_app(
             outputs=[output]
         ).then(
             fn=search_with_loading,
-            inputs=[query_input],
+            inputs=search_inputs,
             outputs=[output]
         )
 
@@ -401,7 +459,7 @@ def create_chat_app(
             outputs=[output]
         ).then(
             fn=search_with_loading,
-            inputs=[query_input],
+            inputs=search_inputs,
             outputs=[output]
         )
 
@@ -20,6 +20,13 @@ class Config:
     html_export_path: Path = field(default_factory=lambda: Path(__file__).parent.parent / "chats")
     database_path: Path = field(default_factory=lambda: Path(__file__).parent.parent / "data" / "telegram_messages.db")
 
+    # Backend para parsear el export HTML: 'bs4' (BeautifulSoup) o 'lxml' (más rápido)
+    html_parser_backend: str = field(default_factory=lambda: os.getenv("HTML_PARSER_BACKEND", "bs4"))
+
+    # Perfil de PRAGMAs de SQLite: 'default', 'import' o 'serve'.
+    # Vacío = cada comando usa el suyo (import para importar, serve para el chat)
+    sqlite_profile: str = field(default_factory=lambda: os.getenv("SQLITE_PROFILE", ""))
+
     # Chat info (del export actual)
     chat_id: str = "Freedomia_io"
     topic_id: str = "1478"
@@ -30,9 +37,37 @@ class Config:
 
     # Embeddings
     embedding_model: str = "paraphrase-multilingual-MiniLM-L12-v2"
+    # Backend del encoder: 'sentence-transformers' (PyTorch), 'onnx' u 'onnx-int8'
+    embedding_backend: str = field(default_factory=lambda: os.getenv("EMBEDDING_BACKEND", "sentence-transformers"))
+    # Directorio del modelo exportado con export-onnx
+    onnx_model_dir: Path = field(default_factory=lambda: Path(
+        os.getenv("ONNX_MODEL_DIR", str(Path(__file__).parent.parent / "data" / "onnx"))
+    ))
 
     # Búsqueda
     search_top_k: int = 15
+    # Mensajes completos que se mantienen en memoria para hidratar resultados
+    message_cache_size: int = field(default_factory=lambda: int(os.getenv("MESSAGE_CACHE_SIZE", "10000")))
+    # Listas del índice IVF que se exploran por query (si existe el índice)
+    ann_nprobe: int = field(default_factory=lambda: int(os.getenv("ANN_NPROBE", "8")))
+    # Copia de los embeddings que se recorre en memoria: float32, float16, int8 o binary.
+    # Los candidatos se reordenan con float32 leídos del disco
+    vector_tier: str = field(default_factory=lambda: os.getenv("VECTOR_TIER", "float32"))
+    # Candidatos por resultado que se reordenan con precisión completa
+    vector_rescore_factor: int = field(default_factory=lambda: int(os.getenv("VECTOR_RESCORE_FACTOR", "10")))
+    # Plazo (s) de las ramas vectorial y FTS de una búsqueda híbrida (0 = sin límite).
+    # Si la vectorial no llega a tiempo se responde solo con FTS
+    search_vector_timeout: float = field(default_factory=lambda: float(os.getenv("SEARCH_VECTOR_TIMEOUT", "2.0")))
+    search_fts_timeout: float = field(default_factory=lambda: float(os.getenv("SEARCH_FTS_TIMEOUT", "2.0")))
+    # Embeddings de queries cacheados (0 = sin caché)
+    query_cache_size: int = field(default_factory=lambda: int(os.getenv("QUERY_CACHE_SIZE", "1000")))
+    # Archivo SQLite donde persistir la caché de queries (vacío = solo en memoria)
+    query_cache_path: Optional[Path] = field(
+        default_factory=lambda: Path(os.environ["QUERY_CACHE_PATH"]) if os.getenv("QUERY_CACHE_PATH") else None
+    )
+    # Rankings de búsquedas completas cacheados (0 = sin caché) y su validez en segundos (0 = sin caducidad)
+    result_cache_size: int = field(default_factory=lambda: int(os.getenv("RESULT_CACHE_SIZE", "256")))
+    result_cache_ttl: float = field(default_factory=lambda: float(os.getenv("RESULT_CACHE_TTL", "600")))
 
     # Usuarios importantes (admins, moderadores)
     important_users: list = field(default_factory=lambda: [
@@ -1,4 +1,4 @@
-from .schema import init_database, Message, MessageEmbedding, ImportantUser, SyncState
+from .schema import init_database, Message, MessageEmbedding, ImportantUser, SyncState, ImportManifestEntry
 from .repositories import MessageRepository
 
 __all__ = [
@@ -7,5 +7,6 @@ __all__ = [
     "MessageEmbedding",
     "ImportantUser",
     "SyncState",
+    "ImportManifestEntry",
     "MessageRepository",
 ]
@@ -0,0 +1,281 @@
+"""
+Gestión de conexiones SQLite de larga vida
+
+Abrir una conexión por consulta cuesta más que la propia consulta en las
+búsquedas (una por resultado al hidratar mensajes). ConnectionManager mantiene
+las conexiones abiertas:
+
+- Una conexión de escritura por hilo (sqlite3 no permite compartirlas).
+- Un pool de conexiones de solo lectura que se prestan a cualquier hilo, para
+  los workers de Gradio.
+
+Cada conexión se configura con el perfil de PRAGMAs activo:
+
+- "default": valores por defecto de SQLite.
+- "import": WAL, synchronous=NORMAL, caché grande y temporales en memoria,
+  para cargas masivas.
+- "serve": solo lectura (query_only), caché grande y mmap, para servir
+  búsquedas; las páginas de la base de datos se precargan al arrancar.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_READ_POOL_SIZE = 4
+
+# PRAGMAs por perfil, en el orden en que se aplican
+PRAGMA_PROFILES: dict[str, dict[str, object]] = {
+    "default": {},
+    "import": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -256 * 1024,  # KiB (256 MB)
+        "temp_store": "MEMORY",
+    },
+    "serve": {
+        "cache_size": -64 * 1024,  # KiB (64 MB)
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "query_only": "ON",
+    },
+}
+
+# PRAGMAs que modifican el archivo y no se aplican en conexiones de solo lectura
+_WRITE_PRAGMAS = {"journal_mode", "synchronous"}
+
+_active_profile = "default"
+
+
+def set_pragma_profile(profile: str) -> None:
+    """Selecciona el perfil de PRAGMAs para las conexiones que se abran a partir de ahora"""
+    global _active_profile
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(
+            f"Perfil SQLite desconocido: {profile} (usa {', '.join(PRAGMA_PROFILES)})"
+        )
+    _active_profile = profile
+    logger.info(f"Perfil SQLite: {profile}")
+
+
+def get_pragma_profile() -> str:
+    """Perfil de PRAGMAs activo"""
+    return _active_profile
+
+
+def apply_pragma_profile(conn: sqlite3.Connection, read_only: bool = False) -> None:
+    """Aplica el perfil de PRAGMAs activo a una conexión"""
+    for name, value in PRAGMA_PROFILES[_active_profile].items():
+        if read_only and name in _WRITE_PRAGMAS:
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def finish_import(db_path: Path, retries: int = 5, retry_delay: float = 0.2) -> bool:
+    """
+    Deja la base de datos autocontenida tras una importación.
+
+    Vuelca el WAL al archivo principal y vuelve al journal por defecto para
+    que el .db pueda copiarse (p. ej. a la imagen de Docker) sin el -wal.
+
+    Cambiar el journal requiere que ninguna otra conexión tenga la base de
+    datos abierta: si está ocupada se reintenta y, si sigue ocupada, se deja
+    en WAL con un aviso (los datos ya están confirmados).
+
+    Returns:
+        True si se pudo volver al journal por defecto
+    """
+    for attempt in range(retries + 1):
+        conn = sqlite3.connect(str(db_path), timeout=retry_delay)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("PRAGMA journal_mode = DELETE")
+            return True
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            if attempt == retries:
+                logger.warning(
+                    f"No se pudo volcar el WAL de {Path(db_path).name} ({e}): "
+                    "la base de datos queda en modo WAL"
+                )
+                return False
+        finally:
+            conn.close()
+        time.sleep(retry_delay * (attempt + 1))
+    return False
+
+
+def preload_database(db_path: Path, chunk_size: int = 4 * 1024 * 1024) -> int:
+    """
+    Lee la base de datos completa para cargar sus páginas en la caché del SO.
+
+    Returns:
+        Número de bytes leídos
+    """
+    total = 0
+    for path in (Path(db_path), Path(f"{db_path}-wal")):
+        if not path.exists():
+            continue
+        with open(path, 'rb', buffering=0) as f:
+            while chunk := f.read(chunk_size):
+                total += len(chunk)
+    logger.info(f"Precargados {total / 1024 / 1024:.1f} MB de {Path(db_path).name} en la caché del SO")
+    return total
+
+
+class ConnectionManager:
+    """Conexiones reutilizables a una base de datos SQLite"""
+
+    def __init__(self, db_path: Path, read_pool_size: int = DEFAULT_READ_POOL_SIZE):
+        self.db_path = Path(db_path)
+        self.read_pool_size = read_pool_size
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._idle_readers: queue.LifoQueue = queue.LifoQueue()
+        self._n_readers = 0
+        self._all_connections: list[sqlite3.Connection] = []
+
+    def _register(self, conn: sqlite3.Connection, read_only: bool = False) -> sqlite3.Connection:
+        conn.row_factory = sqlite3.Row
+        apply_pragma_profile(conn, read_only=read_only)
+        with self._lock:
+            self._all_connections.append(conn)
+        return conn
+
+    def writer(self) -> sqlite3.Connection:
+        """Conexión de lectura/escritura del hilo actual (se crea la primera vez)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._register(sqlite3.connect(str(self.db_path)))
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Presta una conexión de solo lectura del pool.
+
+        Si todas están en uso y el pool está lleno, espera a que se devuelva una.
+        """
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle_readers.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._idle_readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._n_readers < self.read_pool_size
+            if can_create:
+                self._n_readers += 1
+
+        if not can_create:
+            return self._idle_readers.get()
+
+        try:
+            uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return self._register(conn, read_only=True)
+        except sqlite3.Error:
+            with self._lock:
+                self._n_readers -= 1
+            raise
+
+    def close(self) -> None:
+        """Cierra todas las conexiones abiertas por el gestor"""
+        with self._lock:
+            connections, self._all_connections = self._all_connections, []
+            self._n_readers = 0
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Conexión de otro hilo: se cerrará al terminar el proceso
+                pass
+        self._local = threading.local()
+        self._idle_readers = queue.LifoQueue()
+
+
+_managers: dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path: Path) -> ConnectionManager:
+    """Devuelve el gestor de conexiones compartido para una base de datos"""
+    key = str(Path(db_path).resolve())
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(Path(db_path))
+            _managers[key] = manager
+        return manager
+
+
+def close_all_connections() -> None:
+    """Cierra las conexiones de todos los gestores"""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        manager.close()
+
+
+if __name__ == "__main__":
+    # Benchmark del coste por consulta: conexión nueva vs conexión del pool
+    import tempfile
+    import time
+    from datetime import datetime
+    from .schema import init_database, get_connection, Message
+    from .repositories import MessageRepository
+
+    logging.basicConfig(level=logging.WARNING)
+
+    n_queries = 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        init_database(db_path).close()
+        now = datetime(2025, 11, 24, 22, 59, 16)
+        MessageRepository(db_path).bulk_insert(
+            Message(id=i, chat_id="1", topic_id="1", sender_name="Ana", text=f"mensaje {i}",
+                    text_clean=f"mensaje {i}", timestamp=now, timestamp_utc=now, message_type='text')
+            for i in range(1, 10_001)
+        )
+
+        def per_query_connection(msg_id: int) -> None:
+            conn = get_connection(db_path)
+            conn.execute("SELECT * FROM messages WHERE id = ?", (msg_id,)).fetchone()
+            conn.close()
+
+        manager = get_connection_manager(db_path)
+
+        def pooled_connection(msg_id: int) -> None:
+            with manager.reader() as conn:
+                conn.execute("SELECT * FROM messages WHERE id = ?", (msg_id,)).fetchone()
+
+        for label, fn in (("conexión por consulta", per_query_connection),
+                          ("pool de conexiones", pooled_connection)):
+            start = time.perf_counter()
+            for i in range(n_queries):
+                fn(1 + (i * 7919) % 10_000)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>22}: {elapsed / n_queries * 1e6:7.1f} µs/consulta "
+                  f"({elapsed / n_queries * 50 * 1e3:.2f} ms por búsqueda de 50 resultados)")
+
+        close_all_connections()
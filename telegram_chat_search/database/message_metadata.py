@@ -0,0 +1,300 @@
+"""
+Metadatos columnares de los mensajes del almacén de vectores
+
+Junto a los vectores (<db>.vectors/) se guardan arrays numpy compactos
+alineados con VectorStore.ids: la posición i describe al mensaje ids[i].
+Filtrar por fecha, remitente o tipo, dar más peso a lo reciente o contar
+facetas se hace con operaciones vectorizadas sobre estos arrays, sin volver
+a SQLite mensaje a mensaje.
+
+- timestamps: int64, segundos epoch de messages.timestamp (hora local del
+  export, tratada como UTC igual que en las comparaciones de texto de SQL)
+- sender_ids: int32, índice en senders (remitentes internados)
+- type_codes: int8, índice en message_types
+- important: bool, is_important_user
+- reply_parents: int32, posición en ids del mensaje respondido (-1 si no hay
+  o no tiene embedding)
+- text_lengths: int32, caracteres de text_clean
+
+metadata.json guarda las versiones de los embeddings y de los mensajes con
+las que se generó; si alguna cambia los arrays se regeneran.
+"""
+
+import calendar
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+import logging
+
+import numpy as np
+
+from .repositories import MessageRepository
+from .vector_store import VectorStore, vector_store_path
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+_META_FILE = "metadata.json"
+_ARRAYS = {
+    "timestamps": np.int64,
+    "sender_ids": np.int32,
+    "type_codes": np.int8,
+    "important": np.bool_,
+    "reply_parents": np.int32,
+    "text_lengths": np.int32,
+}
+
+
+def _array_file(name: str) -> str:
+    return f"meta_{name}.npy"
+
+
+def to_epoch(value: datetime) -> int:
+    """Segundos epoch de una fecha, en la misma escala que timestamps"""
+    return calendar.timegm(value.replace(tzinfo=None).timetuple())
+
+
+@dataclass
+class MessageMetadata:
+    """Metadatos por mensaje alineados con VectorStore.ids"""
+    timestamps: np.ndarray
+    sender_ids: np.ndarray
+    type_codes: np.ndarray
+    important: np.ndarray
+    reply_parents: np.ndarray
+    text_lengths: np.ndarray
+    senders: list[str]
+    message_types: list[str]
+    store_version: int
+    messages_version: int
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def sender_codes(self, names: Iterable[str]) -> np.ndarray:
+        """Códigos de los remitentes dados (los desconocidos se ignoran)"""
+        index = {name: i for i, name in enumerate(self.senders)}
+        return np.array([index[n] for n in names if n in index], dtype=np.int32)
+
+    def type_codes_of(self, names: Iterable[str]) -> np.ndarray:
+        """Códigos de los tipos de mensaje dados (los desconocidos se ignoran)"""
+        index = {name: i for i, name in enumerate(self.message_types)}
+        return np.array([index[n] for n in names if n in index], dtype=np.int8)
+
+    def mask(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        senders: Iterable[str] = (),
+        message_types: Iterable[str] = (),
+        important_only: bool = False
+    ) -> np.ndarray:
+        """
+        bool (n,): mensajes con since <= timestamp < until, de alguno de los
+        remitentes y tipos dados (vacío = todos) y, opcionalmente, de
+        usuarios importantes.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if since is not None:
+            mask &= self.timestamps >= to_epoch(since)
+        if until is not None:
+            mask &= self.timestamps < to_epoch(until)
+        senders = list(senders)
+        if senders:
+            mask &= np.isin(self.sender_ids, self.sender_codes(senders))
+        message_types = list(message_types)
+        if message_types:
+            mask &= np.isin(self.type_codes, self.type_codes_of(message_types))
+        if important_only:
+            mask &= self.important
+        return mask
+
+
+def build_message_metadata(
+    db_path: Path,
+    store: VectorStore,
+    persist: bool = True
+) -> MessageMetadata:
+    """
+    Lee los metadatos de los mensajes del almacén en una pasada por id y,
+    con persist, los guarda junto a los vectores.
+
+    Los archivos se escriben con nombres temporales y se renombran al final
+    (metadata.json el último), como los del almacén de vectores.
+    """
+    repo = MessageRepository(db_path)
+    messages_version = repo.get_version()
+
+    ids = np.asarray(store.ids)
+    n = len(ids)
+    arrays = {name: np.zeros(n, dtype=dtype) for name, dtype in _ARRAYS.items()}
+    reply_to = np.full(n, -1, dtype=np.int64)
+    senders: dict[str, int] = {}
+    message_types: dict[str, int] = {}
+
+    if n:
+        for rows in repo.iter_metadata_chunks():
+            chunk_ids = np.fromiter((row['id'] for row in rows), dtype=np.int64, count=len(rows))
+            positions = np.searchsorted(ids, chunk_ids)
+            positions[positions == n] = 0
+            for row, position, present in zip(rows, positions, ids[positions] == chunk_ids):
+                if not present:
+                    continue
+                arrays["timestamps"][position] = row['epoch'] or 0
+                arrays["sender_ids"][position] = senders.setdefault(row['sender_name'], len(senders))
+                arrays["type_codes"][position] = message_types.setdefault(row['message_type'], len(message_types))
+                arrays["important"][position] = bool(row['is_important_user'])
+                arrays["text_lengths"][position] = row['text_length'] or 0
+                if row['reply_to_message_id'] is not None:
+                    reply_to[position] = row['reply_to_message_id']
+
+    # Mensaje respondido -> su posición en ids (si tiene embedding)
+    parents = arrays["reply_parents"]
+    parents[:] = -1
+    has_reply = np.flatnonzero(reply_to >= 0)
+    if len(has_reply):
+        targets = np.searchsorted(ids, reply_to[has_reply])
+        targets[targets == n] = 0
+        found = ids[targets] == reply_to[has_reply]
+        parents[has_reply[found]] = targets[found]
+
+    metadata = MessageMetadata(
+        **arrays,
+        senders=list(senders),
+        message_types=list(message_types),
+        store_version=store.version,
+        messages_version=messages_version,
+    )
+    if persist:
+        _save_metadata(db_path, metadata)
+    return metadata
+
+
+def _save_metadata(db_path: Path, metadata: MessageMetadata) -> None:
+    store_dir = vector_store_path(db_path)
+    # Sin metadata.json los lectores no abren arrays a medio reemplazar
+    (store_dir / _META_FILE).unlink(missing_ok=True)
+    for name in _ARRAYS:
+        path = store_dir / _array_file(name)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, getattr(metadata, name))
+        os.replace(tmp_path, path)
+
+    meta_path = store_dir / _META_FILE
+    tmp_meta = meta_path.with_name(f"{_META_FILE}.{os.getpid()}.tmp")
+    tmp_meta.write_text(json.dumps({
+        "format": FORMAT_VERSION,
+        "store_version": metadata.store_version,
+        "messages_version": metadata.messages_version,
+        "count": len(metadata),
+        "senders": metadata.senders,
+        "message_types": metadata.message_types,
+    }, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp_meta, meta_path)
+
+
+def open_message_metadata(db_path: Path, store: VectorStore) -> Optional[MessageMetadata]:
+    """
+    Abre los metadatos guardados con np.memmap si corresponden al almacén y
+    a la versión actual de los mensajes.
+
+    Returns:
+        MessageMetadata o None si no existen o están desactualizados
+    """
+    store_dir = vector_store_path(db_path)
+    meta_path = store_dir / _META_FILE
+    if not meta_path.exists():
+        return None
+
+    meta = json.loads(meta_path.read_text(encoding='utf-8'))
+    messages_version = MessageRepository(db_path).get_version()
+    if (meta.get("format") != FORMAT_VERSION or meta.get("store_version") != store.version
+            or meta.get("messages_version") != messages_version or meta.get("count") != len(store)):
+        logger.info("Metadatos de mensajes desactualizados")
+        return None
+
+    try:
+        arrays = {name: np.load(store_dir / _array_file(name), mmap_mode='r') for name in _ARRAYS}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Metadatos de mensajes incompletos ({e}), se regenerarán")
+        return None
+    if any(len(array) != len(store) for array in arrays.values()):
+        return None
+
+    return MessageMetadata(
+        **arrays,
+        senders=meta["senders"],
+        message_types=meta["message_types"],
+        store_version=store.version,
+        messages_version=messages_version,
+    )
+
+
+def load_message_metadata(db_path: Path, store: VectorStore) -> MessageMetadata:
+    """
+    Abre los metadatos del almacén, regenerándolos si faltan o están
+    desactualizados. Si no se puede escribir junto a la base de datos se
+    quedan solo en memoria.
+    """
+    metadata = open_message_metadata(db_path, store)
+    if metadata is not None:
+        return metadata
+
+    try:
+        return build_message_metadata(db_path, store)
+    except OSError as e:
+        logger.warning(f"No se pudieron guardar los metadatos de mensajes ({e}), solo en memoria")
+        return build_message_metadata(db_path, store, persist=False)
+
+
+if __name__ == "__main__":
+    # Benchmark de filtrado: consulta SQL de ids frente a máscara sobre los arrays
+    import sys
+    import time
+    from datetime import timedelta, timezone
+    from .vector_store import load_vector_store
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if len(sys.argv) > 1:
+        db_path = Path(sys.argv[1])
+    else:
+        db_path = Path(__file__).parent.parent.parent / "data" / "telegram_messages.db"
+
+    if not db_path.exists():
+        print(f"Base de datos no encontrada: {db_path}")
+        sys.exit(1)
+
+    store = load_vector_store(db_path)
+    start = time.perf_counter()
+    metadata = load_message_metadata(db_path, store)
+    print(f"carga: {len(metadata)} mensajes en {(time.perf_counter() - start) * 1000:.1f} ms")
+    if not len(metadata):
+        sys.exit(0)
+
+    last = datetime.fromtimestamp(int(metadata.timestamps.max()), timezone.utc).replace(tzinfo=None)
+    since = last - timedelta(days=30)
+    top_senders = [metadata.senders[i] for i in np.bincount(metadata.sender_ids).argsort()[::-1][:3]]
+    repo = MessageRepository(db_path)
+
+    for label, where, array_mask in (
+        ("último mes", ("m.timestamp >= ?", [since.isoformat(sep=" ")]),
+         lambda: metadata.mask(since=since)),
+        ("3 remitentes", ("m.sender_name IN (SELECT value FROM json_each(?))", [json.dumps(top_senders)]),
+         lambda: metadata.mask(senders=top_senders)),
+    ):
+        start = time.perf_counter()
+        for _ in range(10):
+            np.isin(store.ids, repo.filter_message_ids(*where), assume_unique=True)
+        sql_ms = (time.perf_counter() - start) * 100
+
+        start = time.perf_counter()
+        for _ in range(10):
+            mask = array_mask()
+        array_ms = (time.perf_counter() - start) * 100
+        print(f"{label:>14}: {int(mask.sum())} mensajes, SQL {sql_ms:7.2f} ms, arrays {array_ms:7.2f} ms")
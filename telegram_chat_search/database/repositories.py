@@ -2,26 +2,161 @@
 Repositorios para acceso a datos
 """
 
+import hashlib
+import json
 import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Iterator
+from itertools import islice
+from typing import ContextManager, Optional, Iterable, Iterator, TypeVar
 import numpy as np
 import logging
 
-from .schema import Message, get_connection
+from .schema import Message, ImportManifestEntry
+from .connection import get_connection_manager
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+DEFAULT_MESSAGE_CACHE_SIZE = 10_000
+
+# Condición de los mensajes que reciben embedding
+_HAS_TEXT_SQL = """
+    m.text_clean IS NOT NULL
+    AND m.text_clean != ''
+    AND m.message_type != 'service'
+"""
+
+# Mensajes sin embedding, con el texto modificado o codificados con otro modelo
+_NEEDS_EMBEDDING_SQL = """
+    (e.message_id IS NULL
+     OR e.model_name != ?
+     OR e.text_hash IS NULL
+     OR e.text_hash != text_hash(m.text_clean))
+"""
+
+# Textos omitidos como de bajo valor en una generación anterior (--skip-low-value)
+_NOT_LOW_VALUE_SQL = """
+    NOT EXISTS (SELECT 1 FROM low_value_texts s WHERE s.text_hash = text_hash(m.text_clean))
+"""
+
+
+def text_hash(text: Optional[str]) -> str:
+    """Hash del texto codificado, para detectar embeddings desactualizados"""
+    return hashlib.blake2b((text or "").encode('utf-8'), digest_size=16).hexdigest()
+
+
+def get_store_version(conn: sqlite3.Connection, key: str) -> int:
+    """Contador de versión guardado en store_metadata (0 si no existe)"""
+    try:
+        row = conn.execute("SELECT value FROM store_metadata WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        # Base de datos anterior a store_metadata
+        return 0
+    return int(row[0]) if row else 0
+
+
+def bump_store_version(conn: sqlite3.Connection, key: str) -> None:
+    """Incrementa un contador de versión de store_metadata (sin hacer commit)"""
+    conn.execute("""
+        INSERT INTO store_metadata (key, value) VALUES (?, 1)
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    """, (key,))
+
+
+def batched(items: Iterable[T], batch_size: int) -> Iterator[list[T]]:
+    """Agrupa un iterable en listas de hasta batch_size elementos"""
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+class MessageCache:
+    """
+    Caché LRU acotada de objetos Message por ID, segura entre hilos.
+
+    Las escrituras de este proceso la vacían directamente; las de otros
+    procesos (un import-html mientras el chat está abierto) se detectan con
+    check_version antes de leer de ella.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MESSAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self._messages: OrderedDict[int, Message] = OrderedDict()
+        self._lock = threading.Lock()
+        # messages_version de la base de datos con la que se llenó la caché
+        self._version: Optional[int] = None
+
+    def check_version(self, version: int) -> None:
+        """Vacía la caché si los mensajes cambiaron desde que se llenó"""
+        with self._lock:
+            if version != self._version:
+                self._messages.clear()
+                self._version = version
+
+    def get_many(self, message_ids: Iterable[int]) -> dict[int, Message]:
+        """Devuelve los mensajes cacheados de entre los IDs pedidos"""
+        found = {}
+        with self._lock:
+            for msg_id in message_ids:
+                msg = self._messages.get(msg_id)
+                if msg is not None:
+                    self._messages.move_to_end(msg_id)
+                    found[msg_id] = msg
+        return found
+
+    def put_many(self, messages: Iterable[Message]) -> None:
+        """Añade mensajes, descartando los menos usados si se supera max_size"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for msg in messages:
+                self._messages[msg.id] = msg
+                self._messages.move_to_end(msg.id)
+            while len(self._messages) > self.max_size:
+                self._messages.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._messages.clear()
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+
+_message_caches: dict[str, MessageCache] = {}
+_message_caches_lock = threading.Lock()
+
+
+def get_message_cache(db_path: Path, max_size: Optional[int] = None) -> MessageCache:
+    """Caché de mensajes compartida por todos los repositorios de una base de datos"""
+    key = str(Path(db_path).resolve())
+    with _message_caches_lock:
+        cache = _message_caches.get(key)
+        if cache is None:
+            cache = MessageCache(DEFAULT_MESSAGE_CACHE_SIZE if max_size is None else max_size)
+            _message_caches[key] = cache
+        elif max_size is not None:
+            cache.max_size = max_size
+        return cache
+
 
 class MessageRepository:
     """Repositorio para operaciones CRUD de mensajes"""
 
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, cache_size: Optional[int] = None):
         self.db_path = db_path
+        self._connections = get_connection_manager(db_path)
+        self._cache = get_message_cache(db_path, cache_size)
 
     def _get_conn(self) -> sqlite3.Connection:
-        return get_connection(self.db_path)
+        return self._connections.writer()
+
+    def _read_conn(self) -> ContextManager[sqlite3.Connection]:
+        return self._connections.reader()
 
     def insert_message(self, msg: Message) -> None:
         """Inserta un mensaje en la base de datos"""
@@ -37,19 +172,24 @@ class MessageRepository:
                 msg.message_type, msg.text, msg.text_clean, msg.timestamp, msg.timestamp_utc,
                 msg.reply_to_message_id, msg.source, msg.source_file
             ))
+            bump_store_version(conn, 'messages_version')
             conn.commit()
+        self._cache.clear()
 
-    def bulk_insert(self, messages: list[Message], batch_size: int = 100) -> int:
+    def bulk_insert(self, messages: Iterable[Message], batch_size: int = 100) -> int:
         """
         Inserta múltiples mensajes de forma eficiente.
 
+        Acepta cualquier iterable (incluidos generadores): los mensajes se
+        escriben en lotes de batch_size a medida que se consumen, sin
+        materializar la secuencia completa.
+
         Returns:
             Número de mensajes insertados
         """
         count = 0
         with self._get_conn() as conn:
-            for i in range(0, len(messages), batch_size):
-                batch = messages[i:i + batch_size]
+            for batch in batched(messages, batch_size):
                 conn.executemany("""
                     INSERT OR REPLACE INTO messages (
                         id, chat_id, topic_id, sender_name, is_important_user,
@@ -66,26 +206,66 @@ class MessageRepository:
                 ])
                 count += len(batch)
 
+            if count:
+                bump_store_version(conn, 'messages_version')
             conn.commit()
+        self._cache.clear()
 
         logger.info(f"Insertados {count} mensajes")
         return count
 
+    def delete_file_messages(self, source_file: str, min_id: int, max_id: int) -> int:
+        """
+        Elimina los mensajes importados desde un archivo dentro de su rango de IDs.
+
+        Returns:
+            Número de mensajes eliminados
+        """
+        with self._get_conn() as conn:
+            cursor = conn.execute("""
+                DELETE FROM messages
+                WHERE id BETWEEN ? AND ?
+                AND source_file = ?
+            """, (min_id, max_id, source_file))
+            if cursor.rowcount:
+                bump_store_version(conn, 'messages_version')
+            conn.commit()
+        self._cache.clear()
+        return cursor.rowcount
+
     def get_message(self, message_id: int) -> Optional[Message]:
         """Obtiene un mensaje por ID"""
-        with self._get_conn() as conn:
-            row = conn.execute(
-                "SELECT * FROM messages WHERE id = ?",
-                (message_id,)
-            ).fetchone()
+        messages = self.get_messages([message_id])
+        return messages[0] if messages else None
 
-            if row:
-                return self._row_to_message(row)
-            return None
+    def get_messages(self, message_ids: Iterable[int]) -> list[Message]:
+        """
+        Obtiene varios mensajes por ID con una sola consulta.
+
+        Los IDs que no están en la caché se piden juntos (pasados como un
+        array JSON, sin límite de parámetros). El resultado conserva el orden
+        de message_ids y omite los que no existen.
+        """
+        message_ids = list(message_ids)
+        with self._read_conn() as conn:
+            self._cache.check_version(get_store_version(conn, 'messages_version'))
+            found = self._cache.get_many(message_ids)
+            missing = list(dict.fromkeys(i for i in message_ids if i not in found))
+            rows = conn.execute(
+                "SELECT * FROM messages WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(missing),)
+            ).fetchall() if missing else []
+
+        if missing:
+            fetched = [self._row_to_message(row) for row in rows]
+            self._cache.put_many(fetched)
+            found.update((msg.id, msg) for msg in fetched)
+
+        return [found[i] for i in message_ids if i in found]
 
     def get_all_messages(self) -> list[Message]:
         """Obtiene todos los mensajes"""
-        with self._get_conn() as conn:
+        with self._read_conn() as conn:
             rows = conn.execute(
                 "SELECT * FROM messages ORDER BY timestamp"
             ).fetchall()
@@ -93,7 +273,7 @@ class MessageRepository:
 
     def get_messages_with_text(self) -> list[Message]:
         """Obtiene solo mensajes con texto (para generar embeddings)"""
-        with self._get_conn() as conn:
+        with self._read_conn() as conn:
             rows = conn.execute("""
                 SELECT * FROM messages
                 WHERE text_clean IS NOT NULL
@@ -103,9 +283,99 @@ class MessageRepository:
             """).fetchall()
             return [self._row_to_message(row) for row in rows]
 
+    def count_messages_with_text(self, after_id: int = 0) -> int:
+        """Cuenta los mensajes con texto (los que reciben embedding) tras un ID"""
+        with self._read_conn() as conn:
+            row = conn.execute(f"""
+                SELECT COUNT(*) as count FROM messages m
+                WHERE m.id > ? AND {_HAS_TEXT_SQL}
+            """, (after_id,)).fetchone()
+            return row['count']
+
+    def iter_messages_with_text(
+        self,
+        chunk_size: int = 1000,
+        after_id: int = 0
+    ) -> Iterator[list[Message]]:
+        """
+        Genera los mensajes con texto en bloques de chunk_size, ordenados por ID.
+
+        Cada bloque es una consulta independiente (paginación por ID), así que
+        no se mantiene una transacción de lectura abierta mientras el llamador
+        escribe entre bloques.
+
+        Args:
+            chunk_size: Mensajes por bloque
+            after_id: Empezar después de este ID (para reanudar)
+        """
+        return self._iter_chunks(
+            f"SELECT m.* FROM messages m WHERE m.id > ? AND {_HAS_TEXT_SQL}",
+            (), chunk_size, after_id
+        )
+
+    def count_messages_needing_embedding(self, model_name: str, skip_low_value: bool = False) -> int:
+        """
+        Cuenta los mensajes sin embedding vigente para el modelo.
+
+        Args:
+            skip_low_value: Excluir los textos ya omitidos como de bajo valor
+        """
+        low_value_sql = f"AND {_NOT_LOW_VALUE_SQL}" if skip_low_value else ""
+        with self._read_conn() as conn:
+            conn.create_function("text_hash", 1, text_hash, deterministic=True)
+            row = conn.execute(f"""
+                SELECT COUNT(*) as count FROM messages m
+                LEFT JOIN message_embeddings e ON e.message_id = m.id
+                WHERE {_HAS_TEXT_SQL} AND {_NEEDS_EMBEDDING_SQL} {low_value_sql}
+            """, (model_name,)).fetchone()
+            return row['count']
+
+    def iter_messages_needing_embedding(
+        self,
+        model_name: str,
+        chunk_size: int = 1000,
+        skip_low_value: bool = False
+    ) -> Iterator[list[Message]]:
+        """
+        Genera en bloques los mensajes nuevos, modificados o codificados con
+        otro modelo (los que necesita una generación incremental).
+
+        Args:
+            skip_low_value: Excluir los textos ya omitidos como de bajo valor
+        """
+        low_value_sql = f"AND {_NOT_LOW_VALUE_SQL}" if skip_low_value else ""
+        return self._iter_chunks(f"""
+            SELECT m.* FROM messages m
+            LEFT JOIN message_embeddings e ON e.message_id = m.id
+            WHERE m.id > ? AND {_HAS_TEXT_SQL} AND {_NEEDS_EMBEDDING_SQL} {low_value_sql}
+        """, (model_name,), chunk_size)
+
+    def _iter_chunks(
+        self,
+        select_sql: str,
+        params: tuple,
+        chunk_size: int,
+        after_id: int = 0
+    ) -> Iterator[list[Message]]:
+        """Pagina por ID una consulta cuyo primer parámetro es 'm.id > ?'"""
+        last_id = after_id
+        while True:
+            with self._read_conn() as conn:
+                conn.create_function("text_hash", 1, text_hash, deterministic=True)
+                rows = conn.execute(
+                    f"{select_sql} ORDER BY m.id LIMIT ?",
+                    (last_id, *params, chunk_size)
+                ).fetchall()
+                chunk = [self._row_to_message(row) for row in rows]
+
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1].id
+
     def get_latest_message_id(self, chat_id: str, topic_id: str) -> Optional[int]:
         """Obtiene el ID del último mensaje para sincronización incremental"""
-        with self._get_conn() as conn:
+        with self._read_conn() as conn:
             row = conn.execute("""
                 SELECT MAX(id) as max_id FROM messages
                 WHERE chat_id = ? AND topic_id = ?
@@ -115,9 +385,67 @@ class MessageRepository:
                 return row['max_id']
             return None
 
+    def get_version(self) -> int:
+        """Versión de los mensajes: cambia con cada escritura en messages"""
+        with self._read_conn() as conn:
+            return get_store_version(conn, 'messages_version')
+
+    def get_data_version(self) -> tuple[int, int]:
+        """(versión de los mensajes, versión de los embeddings): cambia con cualquier escritura de ambos"""
+        with self._read_conn() as conn:
+            return get_store_version(conn, 'messages_version'), get_store_version(conn, 'embeddings_version')
+
+    def iter_metadata_chunks(self, chunk_size: int = 100_000) -> Iterator[list[sqlite3.Row]]:
+        """
+        Genera por bloques ordenados por id los metadatos de cada mensaje:
+        id, epoch (segundos de timestamp), sender_name, message_type,
+        is_important_user, reply_to_message_id y text_length.
+        """
+        last_id = -1
+        while True:
+            with self._read_conn() as conn:
+                rows = conn.execute("""
+                    SELECT id, CAST(strftime('%s', timestamp) AS INTEGER) AS epoch,
+                           sender_name, message_type, is_important_user,
+                           reply_to_message_id, length(text_clean) AS text_length
+                    FROM messages
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (last_id, chunk_size)).fetchall()
+
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1]['id']
+
+    def filter_message_ids(self, where_sql: str, where_params: Iterable = ()) -> np.ndarray:
+        """IDs (int64, ordenados) de los mensajes que cumplen una condición sobre messages (alias m)"""
+        with self._read_conn() as conn:
+            rows = conn.execute(
+                f"SELECT m.id FROM messages m WHERE {where_sql} ORDER BY m.id", tuple(where_params)
+            ).fetchall()
+        return np.fromiter((row['id'] for row in rows), dtype=np.int64, count=len(rows))
+
+    def get_sender_names(self) -> list[str]:
+        """Remitentes distintos, de más a menos mensajes"""
+        with self._read_conn() as conn:
+            rows = conn.execute("""
+                SELECT sender_name FROM messages
+                GROUP BY sender_name
+                ORDER BY COUNT(*) DESC
+            """).fetchall()
+        return [row['sender_name'] for row in rows]
+
+    def get_message_types(self) -> list[str]:
+        """Tipos de mensaje presentes (text, photo, file...)"""
+        with self._read_conn() as conn:
+            rows = conn.execute("SELECT DISTINCT message_type FROM messages ORDER BY message_type").fetchall()
+        return [row['message_type'] for row in rows]
+
     def count_messages(self) -> int:
         """Cuenta el total de mensajes"""
-        with self._get_conn() as conn:
+        with self._read_conn() as conn:
             row = conn.execute("SELECT COUNT(*) as count FROM messages").fetchone()
             return row['count']
 
@@ -132,10 +460,21 @@ class MessageRepository:
         sanitized = ' '.join(sanitized.split()).strip()
         return sanitized if sanitized else None
 
-    def fts_search(self, query: str, limit: int = 20) -> list[tuple[Message, float]]:
+    def fts_search(
+        self,
+        query: str,
+        limit: int = 20,
+        where_sql: str = "1",
+        where_params: Iterable = ()
+    ) -> list[tuple[Message, float]]:
         """
         Búsqueda Full-Text Search con FTS5.
 
+        Args:
+            where_sql: Condición adicional sobre messages (alias m), p. ej.
+                       la de SearchFilters.to_sql()
+            where_params: Parámetros de where_sql
+
         Returns:
             Lista de tuplas (mensaje, score)
         """
@@ -145,18 +484,23 @@ class MessageRepository:
             return []
 
         try:
-            with self._get_conn() as conn:
+            with self._read_conn() as conn:
+                self._cache.check_version(get_store_version(conn, 'messages_version'))
                 # FTS5 con ranking BM25
-                rows = conn.execute("""
+                rows = conn.execute(f"""
                     SELECT m.*, bm25(messages_fts) as score
                     FROM messages_fts fts
                     JOIN messages m ON fts.rowid = m.id
-                    WHERE messages_fts MATCH ?
+                    WHERE messages_fts MATCH ? AND ({where_sql})
                     ORDER BY score
                     LIMIT ?
-                """, (safe_query, limit)).fetchall()
+                """, (safe_query, *where_params, limit)).fetchall()
+
+                results = [(self._row_to_message(row), row['score']) for row in rows]
 
-                return [(self._row_to_message(row), row['score']) for row in rows]
+            # Las filas ya están completas: se cachean para la hidratación
+            self._cache.put_many(msg for msg, _ in results)
+            return results
         except Exception as e:
             import logging
             logging.getLogger(__name__).warning(f"FTS search failed: {e}")
@@ -186,9 +530,13 @@ class EmbeddingRepository:
 
     def __init__(self, db_path: Path):
         self.db_path = db_path
+        self._connections = get_connection_manager(db_path)
 
     def _get_conn(self) -> sqlite3.Connection:
-        return get_connection(self.db_path)
+        return self._connections.writer()
+
+    def _read_conn(self) -> ContextManager[sqlite3.Connection]:
+        return self._connections.reader()
 
     def save_embedding(self, message_id: int, embedding: np.ndarray, model_name: str) -> None:
         """Guarda un embedding"""
@@ -199,6 +547,7 @@ class EmbeddingRepository:
                 INSERT OR REPLACE INTO message_embeddings (message_id, embedding, model_name)
                 VALUES (?, ?, ?)
             """, (message_id, embedding_bytes, model_name))
+            self._bump_version(conn)
             conn.commit()
 
     def bulk_save_embeddings(
@@ -206,22 +555,34 @@ class EmbeddingRepository:
         message_ids: list[int],
         embeddings: np.ndarray,
         model_name: str,
-        batch_size: int = 100
+        batch_size: int = 100,
+        text_hashes: Optional[list[str]] = None
     ) -> None:
-        """Guarda múltiples embeddings de forma eficiente"""
+        """
+        Guarda múltiples embeddings de forma eficiente.
+
+        Args:
+            text_hashes: text_hash() del texto codificado de cada mensaje, para
+                         que la generación incremental detecte cambios
+        """
+        if text_hashes is None:
+            text_hashes = [None] * len(message_ids)
+
         with self._get_conn() as conn:
             for i in range(0, len(message_ids), batch_size):
                 batch_ids = message_ids[i:i + batch_size]
                 batch_embeddings = embeddings[i:i + batch_size]
+                batch_hashes = text_hashes[i:i + batch_size]
 
                 conn.executemany("""
-                    INSERT OR REPLACE INTO message_embeddings (message_id, embedding, model_name)
-                    VALUES (?, ?, ?)
+                    INSERT OR REPLACE INTO message_embeddings (message_id, embedding, model_name, text_hash)
+                    VALUES (?, ?, ?, ?)
                 """, [
-                    (msg_id, emb.astype(np.float32).tobytes(), model_name)
-                    for msg_id, emb in zip(batch_ids, batch_embeddings)
+                    (msg_id, emb.astype(np.float32).tobytes(), model_name, hash_)
+                    for msg_id, emb, hash_ in zip(batch_ids, batch_embeddings, batch_hashes)
                 ])
 
+            self._bump_version(conn)
             conn.commit()
 
         logger.info(f"Guardados {len(message_ids)} embeddings")
@@ -233,7 +594,7 @@ class EmbeddingRepository:
         Returns:
             Tupla de (lista de message_ids, matriz de embeddings)
         """
-        with self._get_conn() as conn:
+        with self._read_conn() as conn:
             rows = conn.execute("""
                 SELECT message_id, embedding FROM message_embeddings
                 ORDER BY message_id
@@ -243,28 +604,210 @@ class EmbeddingRepository:
                 return [], np.array([])
 
             message_ids = [row['message_id'] for row in rows]
-            embeddings = np.array([
-                np.frombuffer(row['embedding'], dtype=np.float32)
-                for row in rows
-            ])
+            # Una sola copia: los BLOBs se concatenan y se interpretan como matriz
+            embeddings = np.frombuffer(
+                b''.join(row['embedding'] for row in rows), dtype=np.float32
+            ).reshape(len(rows), -1)
 
             return message_ids, embeddings
 
+    def mark_low_value_texts(self, text_hashes: Iterable[str]) -> None:
+        """Registra textos omitidos como de bajo valor, para no volver a planificarlos"""
+        with self._get_conn() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO low_value_texts (text_hash) VALUES (?)",
+                [(hash_,) for hash_ in dict.fromkeys(text_hashes)]
+            )
+            conn.commit()
+
+    def get_embeddings_by_text_hash(self, text_hashes: Iterable[str], model_name: str) -> dict[str, np.ndarray]:
+        """
+        Un embedding ya guardado por cada text_hash pedido (los que existan).
+
+        Returns:
+            Dict text_hash -> vector float32
+        """
+        hashes = list(dict.fromkeys(text_hashes))
+        if not hashes:
+            return {}
+
+        with self._read_conn() as conn:
+            rows = conn.execute("""
+                SELECT text_hash, MIN(embedding) AS embedding FROM message_embeddings
+                WHERE model_name = ? AND text_hash IN (SELECT value FROM json_each(?))
+                GROUP BY text_hash
+            """, (model_name, json.dumps(hashes))).fetchall()
+
+        return {row['text_hash']: np.frombuffer(row['embedding'], dtype=np.float32) for row in rows}
+
+    def iter_embedding_chunks(self, chunk_size: int = 10_000) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Genera los embeddings por bloques ordenados por message_id.
+
+        Yields:
+            Tuplas (ids int64 (n,), matriz float32 (n, dim))
+        """
+        last_id = -1
+        while True:
+            with self._read_conn() as conn:
+                rows = conn.execute("""
+                    SELECT message_id, embedding FROM message_embeddings
+                    WHERE message_id > ?
+                    ORDER BY message_id
+                    LIMIT ?
+                """, (last_id, chunk_size)).fetchall()
+
+            if not rows:
+                return
+            ids = np.fromiter((row['message_id'] for row in rows), dtype=np.int64, count=len(rows))
+            vectors = np.frombuffer(
+                b''.join(row['embedding'] for row in rows), dtype=np.float32
+            ).reshape(len(rows), -1)
+            yield ids, vectors
+            last_id = int(ids[-1])
+
+    def iter_text_hash_chunks(self, chunk_size: int = 100_000) -> Iterator[tuple[np.ndarray, list[Optional[str]]]]:
+        """
+        Genera (message_ids int64, text_hashes) de los embeddings por bloques
+        ordenados por message_id, sin leer los vectores.
+        """
+        last_id = -1
+        while True:
+            with self._read_conn() as conn:
+                rows = conn.execute("""
+                    SELECT message_id, text_hash FROM message_embeddings
+                    WHERE message_id > ?
+                    ORDER BY message_id
+                    LIMIT ?
+                """, (last_id, chunk_size)).fetchall()
+
+            if not rows:
+                return
+            ids = np.fromiter((row['message_id'] for row in rows), dtype=np.int64, count=len(rows))
+            yield ids, [row['text_hash'] for row in rows]
+            last_id = int(ids[-1])
+
+    def get_version(self) -> int:
+        """Versión de los embeddings: cambia con cada escritura en message_embeddings"""
+        with self._read_conn() as conn:
+            return get_store_version(conn, 'embeddings_version')
+
+    def _bump_version(self, conn: sqlite3.Connection) -> None:
+        bump_store_version(conn, 'embeddings_version')
+
     def count_embeddings(self) -> int:
         """Cuenta el total de embeddings"""
-        with self._get_conn() as conn:
+        with self._read_conn() as conn:
             row = conn.execute("SELECT COUNT(*) as count FROM message_embeddings").fetchone()
             return row['count']
 
+    def delete_orphans(self) -> int:
+        """
+        Elimina los embeddings de mensajes borrados o que ya no tienen texto.
+
+        Returns:
+            Número de embeddings eliminados
+        """
+        with self._get_conn() as conn:
+            cursor = conn.execute(f"""
+                DELETE FROM message_embeddings
+                WHERE message_id NOT IN (
+                    SELECT m.id FROM messages m WHERE {_HAS_TEXT_SQL}
+                )
+            """)
+            if cursor.rowcount:
+                self._bump_version(conn)
+            conn.commit()
+            return cursor.rowcount
+
+    def get_checkpoint(self, model_name: str) -> Optional[tuple[int, int]]:
+        """
+        Punto de reanudación de una generación en streaming interrumpida.
+
+        Returns:
+            Tupla (último message_id guardado, embeddings generados) o None
+        """
+        with self._read_conn() as conn:
+            row = conn.execute("""
+                SELECT last_message_id, embedded_count FROM embedding_checkpoints
+                WHERE model_name = ?
+            """, (model_name,)).fetchone()
+            return (row['last_message_id'], row['embedded_count']) if row else None
+
+    def save_checkpoint(self, model_name: str, last_message_id: int, embedded_count: int) -> None:
+        """Registra el último bloque guardado de una generación en streaming"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO embedding_checkpoints
+                    (model_name, last_message_id, embedded_count, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            """, (model_name, last_message_id, embedded_count))
+            conn.commit()
+
+    def clear_checkpoint(self, model_name: str) -> None:
+        """Elimina el checkpoint al completar la generación"""
+        with self._get_conn() as conn:
+            conn.execute("DELETE FROM embedding_checkpoints WHERE model_name = ?", (model_name,))
+            conn.commit()
+
+
+class ImportManifestRepository:
+    """Repositorio del manifest de archivos importados"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._connections = get_connection_manager(db_path)
+
+    def _get_conn(self) -> sqlite3.Connection:
+        return self._connections.writer()
+
+    def _read_conn(self) -> ContextManager[sqlite3.Connection]:
+        return self._connections.reader()
+
+    def get_all(self) -> dict[str, ImportManifestEntry]:
+        """Obtiene el manifest indexado por nombre de archivo"""
+        with self._read_conn() as conn:
+            rows = conn.execute("""
+                SELECT file_name, size, mtime_ns, content_hash, min_message_id,
+                       max_message_id, message_count, last_sender
+                FROM import_manifest
+            """).fetchall()
+            return {row['file_name']: ImportManifestEntry(**dict(row)) for row in rows}
+
+    def save(self, entry: ImportManifestEntry) -> None:
+        """Guarda (o reemplaza) la entrada de un archivo"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO import_manifest (
+                    file_name, size, mtime_ns, content_hash, min_message_id,
+                    max_message_id, message_count, last_sender
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                entry.file_name, entry.size, entry.mtime_ns, entry.content_hash,
+                entry.min_message_id, entry.max_message_id, entry.message_count,
+                entry.last_sender
+            ))
+            conn.commit()
+
+    def delete(self, file_name: str) -> None:
+        """Elimina la entrada de un archivo"""
+        with self._get_conn() as conn:
+            conn.execute("DELETE FROM import_manifest WHERE file_name = ?", (file_name,))
+            conn.commit()
+
 
 class ImportantUserRepository:
     """Repositorio para usuarios importantes"""
 
     def __init__(self, db_path: Path):
         self.db_path = db_path
+        self._connections = get_connection_manager(db_path)
 
     def _get_conn(self) -> sqlite3.Connection:
-        return get_connection(self.db_path)
+        return self._connections.writer()
+
+    def _read_conn(self) -> ContextManager[sqlite3.Connection]:
+        return self._connections.reader()
 
     def add_user(self, user_name: str, role: str = "important", color: str = "#FFD700") -> None:
         """Añade un usuario importante"""
@@ -277,13 +820,13 @@ class ImportantUserRepository:
 
     def get_all_users(self) -> list[str]:
         """Obtiene todos los nombres de usuarios importantes"""
-        with self._get_conn() as conn:
+        with self._read_conn() as conn:
             rows = conn.execute("SELECT user_name FROM important_users").fetchall()
             return [row['user_name'] for row in rows]
 
     def is_important(self, user_name: str) -> bool:
         """Verifica si un usuario es importante"""
-        with self._get_conn() as conn:
+        with self._read_conn() as conn:
             row = conn.execute(
                 "SELECT 1 FROM important_users WHERE user_name = ?",
                 (user_name,)
@@ -304,5 +847,51 @@ class ImportantUserRepository:
                 SET is_important_user = TRUE
                 WHERE sender_name IN (SELECT user_name FROM important_users)
             """)
+            if cursor.rowcount:
+                bump_store_version(conn, 'messages_version')
             conn.commit()
-            return cursor.rowcount
+        get_message_cache(self.db_path).clear()
+        return cursor.rowcount
+
+
+if __name__ == "__main__":
+    # Benchmark de importación con y sin modo carga masiva (triggers FTS diferidos)
+    import sys
+    import tempfile
+    import time
+    from .schema import init_database, fts_bulk_load
+
+    logging.basicConfig(level=logging.WARNING)
+
+    n_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    words = "tarjeta virtual google wallet recarga banco cuenta cripto gracias inversión".split()
+
+    def synthetic_messages():
+        now = datetime(2025, 11, 24, 22, 59, 16)
+        for i in range(1, n_messages + 1):
+            text = " ".join(words[(i * k) % len(words)] for k in range(1, 2 + i % 12))
+            yield Message(
+                id=i, chat_id="562952938253116", topic_id="1478",
+                sender_name=f"Usuario {i % 500}", text=text, text_clean=text,
+                timestamp=now, timestamp_utc=now, message_type='text',
+                source_file=f"messages{i // 1000}.html",
+            )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for bulk_load in (False, True):
+            db_path = Path(tmp) / f"bench_{bulk_load}.db"
+            init_database(db_path).close()
+            repo = MessageRepository(db_path)
+
+            for label in ("importación inicial", "re-importación (REPLACE)"):
+                start = time.perf_counter()
+                if bulk_load:
+                    with fts_bulk_load(db_path):
+                        repo.bulk_insert(synthetic_messages(), batch_size=1000)
+                else:
+                    repo.bulk_insert(synthetic_messages(), batch_size=1000)
+                elapsed = time.perf_counter() - start
+
+                mode = "carga masiva" if bulk_load else "triggers FTS"
+                print(f"{mode:>13} | {label:<25} | {n_messages} mensajes en {elapsed:6.1f}s "
+                      f"({n_messages / elapsed:,.0f} msg/s)")
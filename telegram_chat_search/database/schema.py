@@ -3,12 +3,15 @@ Esquema de base de datos SQLite con FTS5 para búsqueda de texto
 """
 
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Optional
+from typing import Iterator, Optional
 import logging
 
+from .connection import apply_pragma_profile
+
 logger = logging.getLogger(__name__)
 
 
@@ -36,6 +39,7 @@ class MessageEmbedding:
     message_id: int
     embedding: bytes  # numpy array serializado
     model_name: str
+    text_hash: Optional[str] = None  # hash del text_clean codificado
 
 
 @dataclass
@@ -57,6 +61,19 @@ class SyncState:
     last_sync_at: datetime
 
 
+@dataclass
+class ImportManifestEntry:
+    """Estado de un archivo del export ya importado (para re-importación incremental)"""
+    file_name: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    min_message_id: Optional[int] = None
+    max_message_id: Optional[int] = None
+    message_count: int = 0
+    last_sender: Optional[str] = None
+
+
 # SQL para crear las tablas
 CREATE_TABLES_SQL = """
 -- Tabla principal de mensajes
@@ -97,33 +114,36 @@ CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
     tokenize='unicode61'
 );
 
--- Triggers para mantener FTS sincronizado
-CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
-    INSERT INTO messages_fts(rowid, text_clean, sender_name)
-    VALUES (new.id, new.text_clean, new.sender_name);
-END;
-
-CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
-    INSERT INTO messages_fts(messages_fts, rowid, text_clean, sender_name)
-    VALUES ('delete', old.id, old.text_clean, old.sender_name);
-END;
-
-CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
-    INSERT INTO messages_fts(messages_fts, rowid, text_clean, sender_name)
-    VALUES ('delete', old.id, old.text_clean, old.sender_name);
-    INSERT INTO messages_fts(rowid, text_clean, sender_name)
-    VALUES (new.id, new.text_clean, new.sender_name);
-END;
-
 -- Tabla de embeddings vectoriales
 CREATE TABLE IF NOT EXISTS message_embeddings (
     message_id INTEGER PRIMARY KEY,
     embedding BLOB NOT NULL,
     model_name TEXT NOT NULL,
+    text_hash TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (message_id) REFERENCES messages(id) ON DELETE CASCADE
 );
 
+-- Progreso de generate-embeddings en streaming (para reanudar)
+CREATE TABLE IF NOT EXISTS embedding_checkpoints (
+    model_name TEXT PRIMARY KEY,
+    last_message_id INTEGER NOT NULL,
+    embedded_count INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Textos de bajo valor omitidos por generate-embeddings --skip-low-value
+-- (por text_hash): dejan de contar como pendientes mientras no cambien
+CREATE TABLE IF NOT EXISTS low_value_texts (
+    text_hash TEXT PRIMARY KEY
+);
+
+-- Metadatos del almacén (p. ej. versión de los embeddings para el sidecar de vectores)
+CREATE TABLE IF NOT EXISTS store_metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
 -- Usuarios importantes (administradores, moderadores, expertos)
 CREATE TABLE IF NOT EXISTS important_users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -132,6 +152,19 @@ CREATE TABLE IF NOT EXISTS important_users (
     highlight_color TEXT DEFAULT '#FFD700'
 );
 
+-- Manifest de archivos importados (re-importación incremental)
+CREATE TABLE IF NOT EXISTS import_manifest (
+    file_name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    min_message_id INTEGER,
+    max_message_id INTEGER,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_sender TEXT,
+    imported_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Estado de sincronización
 CREATE TABLE IF NOT EXISTS sync_state (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -145,6 +178,29 @@ CREATE TABLE IF NOT EXISTS sync_state (
 """
 
 
+# Triggers para mantener FTS sincronizado (se desactivan durante cargas masivas)
+FTS_TRIGGERS_SQL = """
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, text_clean, sender_name)
+    VALUES (new.id, new.text_clean, new.sender_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text_clean, sender_name)
+    VALUES ('delete', old.id, old.text_clean, old.sender_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text_clean, sender_name)
+    VALUES ('delete', old.id, old.text_clean, old.sender_name);
+    INSERT INTO messages_fts(rowid, text_clean, sender_name)
+    VALUES (new.id, new.text_clean, new.sender_name);
+END;
+"""
+
+FTS_TRIGGER_NAMES = ("messages_ai", "messages_ad", "messages_au")
+
+
 def init_database(db_path: Path) -> sqlite3.Connection:
     """
     Inicializa la base de datos creando las tablas necesarias.
@@ -163,9 +219,19 @@ def init_database(db_path: Path) -> sqlite3.Connection:
     # Conectar y crear tablas
     conn = sqlite3.connect(str(db_path))
     conn.row_factory = sqlite3.Row
+    apply_pragma_profile(conn)
+
+    # Si faltan los triggers de una tabla con mensajes, una carga masiva se
+    # interrumpió antes de terminar: el índice FTS no está sincronizado
+    interrupted_bulk_load = _has_table(conn, "messages") and not _has_fts_triggers(conn)
 
     # Ejecutar SQL de creación
     conn.executescript(CREATE_TABLES_SQL)
+    _migrate(conn)
+    if interrupted_bulk_load:
+        logger.warning("Carga masiva interrumpida detectada, reconstruyendo índice FTS...")
+        rebuild_fts_index(conn)
+    conn.executescript(FTS_TRIGGERS_SQL)
     conn.commit()
 
     logger.info("Base de datos inicializada correctamente")
@@ -176,9 +242,69 @@ def get_connection(db_path: Path) -> sqlite3.Connection:
     """Obtiene una conexión a la base de datos existente"""
     conn = sqlite3.connect(str(db_path))
     conn.row_factory = sqlite3.Row
+    apply_pragma_profile(conn)
     return conn
 
 
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Añade a bases de datos anteriores las columnas nuevas"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(message_embeddings)")}
+    if "text_hash" not in columns:
+        logger.info("Migrando message_embeddings: añadiendo columna text_hash")
+        conn.execute("ALTER TABLE message_embeddings ADD COLUMN text_hash TEXT")
+    # Para reutilizar el embedding de textos idénticos ya codificados
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_text_hash ON message_embeddings(text_hash)")
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def _has_fts_triggers(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' "
+        f"AND name IN ({','.join('?' * len(FTS_TRIGGER_NAMES))})",
+        FTS_TRIGGER_NAMES
+    ).fetchone()
+    return row[0] == len(FTS_TRIGGER_NAMES)
+
+
+def rebuild_fts_index(conn: sqlite3.Connection) -> None:
+    """Reconstruye el índice FTS5 desde la tabla messages y lo compacta"""
+    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+
+
+@contextmanager
+def fts_bulk_load(db_path: Path) -> Iterator[None]:
+    """
+    Modo de carga masiva: desactiva los triggers FTS mientras dura el bloque.
+
+    Las inserciones dentro del bloque solo escriben en messages. Al salir se
+    reconstruye el índice FTS una única vez ('rebuild' + 'optimize') y se
+    restauran los triggers, en lugar de actualizar el índice fila a fila.
+    """
+    conn = get_connection(db_path)
+    try:
+        for name in FTS_TRIGGER_NAMES:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.commit()
+        logger.info("Modo carga masiva: triggers FTS desactivados")
+
+        yield
+
+        logger.info("Reconstruyendo índice FTS...")
+        rebuild_fts_index(conn)
+        conn.executescript(FTS_TRIGGERS_SQL)
+        conn.commit()
+        logger.info("Índice FTS reconstruido y triggers restaurados")
+    finally:
+        conn.close()
+
+
 if __name__ == "__main__":
     # Test de creación de base de datos
     import tempfile
@@ -0,0 +1,388 @@
+"""
+Almacén de vectores en disco junto a la base de datos
+
+Los embeddings se vuelcan desde message_embeddings a un directorio hermano de
+la base de datos (<db>.vectors/) como una matriz float32 contigua y un array de
+IDs en formato .npy. Se abren con np.memmap: la carga es instantánea, no copia
+los datos a la memoria del proceso y varios procesos comparten la caché de
+páginas del SO.
+
+Los vectores se guardan normalizados (norma L2 = 1), así que la similitud
+coseno con una query es un único producto matriz-vector.
+
+Muchos mensajes son repeticiones exactas ("ok gracias", enlaces, [STICKER]):
+se guarda un solo vector por texto distinto (mismo text_hash) y una tabla
+int32 con la fila de vectors de cada mensaje. La búsqueda puntúa solo los
+vectores únicos y expande cada acierto a todos sus mensajes.
+
+meta.json guarda la versión de los embeddings (store_metadata) con la que se
+generó el volcado; si no coincide con la de la base de datos el almacén está
+desactualizado y se regenera.
+
+Cada volcado se escribe en su propio subdirectorio (store-<versión>-...) que
+meta.json indica: los lectores siguen ese nombre, así que nunca mezclan
+arrays de dos volcados. Se conserva el volcado anterior para los procesos que
+lo estén abriendo en ese momento.
+"""
+
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import logging
+
+import numpy as np
+
+from .repositories import EmbeddingRepository
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 4
+
+_IDS_FILE = "ids.npy"
+_ROWS_FILE = "rows.npy"
+_MEMBERS_FILE = "members.npy"
+_OFFSETS_FILE = "offsets.npy"
+_VECTORS_FILE = "vectors.npy"
+_META_FILE = "meta.json"
+_ARRAY_FILES = (_IDS_FILE, _ROWS_FILE, _MEMBERS_FILE, _OFFSETS_FILE, _VECTORS_FILE)
+# Subdirectorio de cada volcado (el que indica meta.json)
+_GENERATION_PREFIX = "store-"
+
+
+@dataclass
+class VectorStore:
+    """
+    Embeddings únicos del corpus y su correspondencia con los message_ids.
+
+    Sin rows (carga en memoria) cada mensaje tiene su propia fila.
+    """
+    ids: np.ndarray                        # int64 (n,) message_ids ordenados
+    vectors: np.ndarray                    # float32 (u, dim) normalizados, normalmente un np.memmap
+    version: int
+    rows: Optional[np.ndarray] = None      # int32 (n,): fila de vectors de cada mensaje
+    members: Optional[np.ndarray] = None   # int32 (n,): posiciones en ids agrupadas por fila
+    offsets: Optional[np.ndarray] = None   # int64 (u + 1,): la fila r son members[offsets[r]:offsets[r + 1]]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_vectors(self) -> int:
+        return len(self.vectors)
+
+    def message_positions(self, row: int) -> np.ndarray:
+        """Posiciones en ids de los mensajes que comparten la fila row de vectors"""
+        if self.offsets is None:
+            return np.array([row], dtype=np.int64)
+        return self.members[self.offsets[row]:self.offsets[row + 1]]
+
+    def message_ids(self, row: int) -> np.ndarray:
+        """message_ids que comparten la fila row de vectors"""
+        return self.ids[self.message_positions(row)]
+
+    def expand(
+        self,
+        rows: np.ndarray,
+        scores: np.ndarray,
+        top_k: Optional[int] = None,
+        message_mask: Optional[np.ndarray] = None
+    ) -> list[tuple[int, float]]:
+        """
+        Convierte filas de vectors ordenadas por score en (message_id, score),
+        expandiendo cada fila a todos sus mensajes hasta top_k resultados.
+
+        Args:
+            message_mask: bool (n,) alineado con ids; los mensajes a False se omiten
+        """
+        results = []
+        for row, score in zip(rows, scores):
+            positions = self.message_positions(row)
+            if message_mask is not None:
+                positions = positions[message_mask[positions]]
+            results.extend((int(self.ids[p]), float(score)) for p in positions)
+            if top_k is not None and len(results) >= top_k:
+                return results[:top_k]
+        return results
+
+    def vector_mask(self, message_mask: np.ndarray) -> np.ndarray:
+        """bool (u,) sobre vectors: filas con algún mensaje a True en message_mask (n,)"""
+        if self.rows is None:
+            return message_mask
+        vector_mask = np.zeros(self.n_vectors, dtype=bool)
+        vector_mask[self.rows[message_mask]] = True
+        return vector_mask
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Normaliza cada fila a norma L2 = 1 (las filas nulas se dejan a cero)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def _save(path: Path, array: np.ndarray) -> None:
+    # Con un archivo abierto np.save no añade la extensión .npy al nombre temporal
+    with open(path, 'wb') as f:
+        np.save(f, array)
+
+
+def vector_store_path(db_path: Path) -> Path:
+    """Directorio del almacén de vectores de una base de datos"""
+    return Path(f"{db_path}.vectors")
+
+
+def _dedupe_rows(repo: EmbeddingRepository, count: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Asigna una fila de vectors a cada mensaje: los que comparten text_hash
+    comparten fila (los embeddings sin text_hash tienen la suya).
+
+    Returns:
+        (ids int64 (n,), rows int32 (n,), first int64 (u,): posición del
+        primer mensaje de cada fila)
+    """
+    ids = np.empty(count, dtype=np.int64)
+    rows = np.empty(count, dtype=np.int32)
+    first: list[int] = []
+    row_of_hash: dict[str, int] = {}
+
+    written = 0
+    for chunk_ids, hashes in repo.iter_text_hash_chunks():
+        n = min(len(chunk_ids), count - written)
+        ids[written:written + n] = chunk_ids[:n]
+        for i, hash_ in enumerate(hashes[:n]):
+            row = row_of_hash.get(hash_) if hash_ is not None else None
+            if row is None:
+                row = len(first)
+                first.append(written + i)
+                if hash_ is not None:
+                    row_of_hash[hash_] = row
+            rows[written + i] = row
+        written += n
+        if written == count:
+            break
+
+    return ids[:written], rows[:written], np.array(first, dtype=np.int64)
+
+
+def build_vector_store(db_path: Path, chunk_size: int = 10_000) -> VectorStore:
+    """
+    Vuelca message_embeddings al almacén en disco (deduplicado) y lo abre.
+
+    Una primera pasada lee solo los text_hash para asignar filas; la segunda
+    copia el vector del primer mensaje de cada texto distinto.
+
+    Los arrays se escriben en un subdirectorio temporal que se renombra
+    entero al terminar; después meta.json pasa a apuntar a él, así que un
+    lector nunca ve un volcado a medias ni arrays de dos volcados.
+    """
+    repo = EmbeddingRepository(db_path)
+    store_dir = vector_store_path(db_path)
+    store_dir.mkdir(parents=True, exist_ok=True)
+
+    # Versión leída antes de copiar: si hay escrituras durante el volcado, el
+    # almacén queda marcado como desactualizado y se regenerará
+    version = repo.get_version()
+    ids, rows, first = _dedupe_rows(repo, repo.count_embeddings())
+
+    # Mensajes agrupados por fila, para expandir los resultados
+    members = np.argsort(rows, kind='stable').astype(np.int32)
+    offsets = np.zeros(len(first) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(first)), out=offsets[1:])
+
+    generation = f"{_GENERATION_PREFIX}{version}-{os.getpid()}-{time.time_ns()}"
+    tmp_dir = store_dir / f"{generation}.tmp"
+    tmp_dir.mkdir()
+    tmp = {name: tmp_dir / name for name in _ARRAY_FILES}
+    _save(tmp[_IDS_FILE], ids)
+    _save(tmp[_ROWS_FILE], rows)
+    _save(tmp[_MEMBERS_FILE], members)
+    _save(tmp[_OFFSETS_FILE], offsets)
+
+    # Filas únicas en orden de message_id: las posiciones de first son crecientes
+    vectors_out = None
+    next_row = 0
+    for chunk_ids, vectors in repo.iter_embedding_chunks(chunk_size):
+        if vectors_out is None:
+            vectors_out = np.lib.format.open_memmap(
+                tmp[_VECTORS_FILE], mode='w+', dtype=np.float32, shape=(len(first), vectors.shape[1])
+            )
+        positions = np.searchsorted(ids, chunk_ids)
+        positions[positions == len(ids)] = 0
+        present = ids[positions] == chunk_ids
+        new_rows = present & (first[rows[positions]] == positions)
+        if new_rows.any():
+            block = normalize_rows(vectors[new_rows])
+            vectors_out[next_row:next_row + len(block)] = block
+            next_row += len(block)
+        if next_row == len(first):
+            break
+
+    if vectors_out is None:
+        _save(tmp[_VECTORS_FILE], np.empty((0, 0), dtype=np.float32))
+    else:
+        vectors_out.flush()
+        del vectors_out
+
+    os.replace(tmp_dir, store_dir / generation)
+
+    previous = _read_meta(store_dir)
+    tmp_meta = store_dir / f"{_META_FILE}.{os.getpid()}.tmp"
+    tmp_meta.write_text(json.dumps({
+        "format": FORMAT_VERSION,
+        "version": version,
+        "count": len(ids),
+        "unique": len(first),
+        "dir": generation,
+    }))
+    os.replace(tmp_meta, store_dir / _META_FILE)
+    _remove_old_generations(store_dir, keep={generation, (previous or {}).get("dir")})
+
+    logger.info(f"Almacén de vectores generado: {len(ids)} mensajes, {len(first)} vectores únicos en {store_dir}")
+    return open_vector_store(db_path, expected_version=version)
+
+
+def _read_meta(store_dir: Path) -> Optional[dict]:
+    try:
+        return json.loads((store_dir / _META_FILE).read_text())
+    except FileNotFoundError:
+        return None
+
+
+def _remove_old_generations(store_dir: Path, keep: set) -> None:
+    """Borra los volcados anteriores (y los arrays del formato antiguo), salvo los de keep"""
+    for path in store_dir.iterdir():
+        if path.is_dir() and path.name.startswith(_GENERATION_PREFIX) and not path.name.endswith(".tmp"):
+            if path.name not in keep:
+                # En Linux los procesos que aún lo tengan mapeado siguen leyéndolo
+                shutil.rmtree(path, ignore_errors=True)
+        elif path.name in _ARRAY_FILES:
+            path.unlink(missing_ok=True)
+
+
+def open_vector_store(db_path: Path, expected_version: Optional[int] = None) -> Optional[VectorStore]:
+    """
+    Abre el almacén con np.memmap si existe y está al día.
+
+    Args:
+        expected_version: Versión requerida (default: la actual de la base de datos)
+
+    Returns:
+        VectorStore o None si no existe o está desactualizado
+    """
+    store_dir = vector_store_path(db_path)
+    meta = _read_meta(store_dir)
+    if meta is None:
+        return None
+
+    if expected_version is None:
+        expected_version = EmbeddingRepository(db_path).get_version()
+
+    if meta.get("format") != FORMAT_VERSION or meta.get("version") != expected_version:
+        logger.info(f"Almacén de vectores desactualizado (versión {meta.get('version')}, base de datos {expected_version})")
+        return None
+
+    # Todos los arrays del volcado que indica meta.json
+    generation_dir = store_dir / meta["dir"]
+    try:
+        arrays = {name: np.load(generation_dir / name, mmap_mode='r') for name in _ARRAY_FILES}
+    except FileNotFoundError:
+        if (_read_meta(store_dir) or {}).get("dir") == meta["dir"]:
+            logger.warning("Almacén de vectores incompleto, se regenerará")
+            return None
+        # Un volcado más reciente sustituyó y borró este mientras se abría
+        logger.info("El almacén de vectores cambió mientras se abría, reintentando")
+        return open_vector_store(db_path, expected_version)
+    if (len(arrays[_IDS_FILE]) != meta["count"] or len(arrays[_ROWS_FILE]) != meta["count"]
+            or len(arrays[_VECTORS_FILE]) != meta["unique"]):
+        logger.warning("Almacén de vectores incompleto, se regenerará")
+        return None
+
+    return VectorStore(
+        ids=arrays[_IDS_FILE],
+        vectors=arrays[_VECTORS_FILE],
+        version=expected_version,
+        rows=arrays[_ROWS_FILE],
+        members=arrays[_MEMBERS_FILE],
+        offsets=arrays[_OFFSETS_FILE],
+    )
+
+
+def load_vector_store(db_path: Path) -> VectorStore:
+    """
+    Abre el almacén de vectores, regenerándolo si falta o está desactualizado.
+
+    Si no se puede escribir junto a la base de datos, carga los embeddings
+    en memoria desde SQLite.
+    """
+    store = open_vector_store(db_path)
+    if store is not None:
+        return store
+
+    try:
+        return build_vector_store(db_path)
+    except OSError as e:
+        logger.warning(f"No se pudo escribir el almacén de vectores ({e}), cargando en memoria")
+        repo = EmbeddingRepository(db_path)
+        version = repo.get_version()
+        ids, vectors = repo.get_all_embeddings()
+        return VectorStore(
+            ids=np.asarray(ids, dtype=np.int64),
+            vectors=normalize_rows(vectors) if len(ids) else vectors,
+            version=version,
+        )
+
+
+if __name__ == "__main__":
+    # Benchmark de carga: BLOBs de SQLite vs almacén mapeado en memoria
+    import sys
+    import tempfile
+    import time
+    import tracemalloc
+    from .schema import init_database
+    from .connection import close_all_connections
+
+    logging.basicConfig(level=logging.WARNING)
+
+    n_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    dim = 384
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        init_database(db_path).close()
+        repo = EmbeddingRepository(db_path)
+        rng = np.random.default_rng(0)
+        # Como en un chat real, ~60% de los mensajes repiten uno de 1000 textos
+        # cortos ("ok", "gracias"...) con el mismo vector
+        common = rng.standard_normal((1000, dim), dtype=np.float32)
+        for start in range(0, n_vectors, 50_000):
+            ids = list(range(start, min(start + 50_000, n_vectors)))
+            vectors = rng.standard_normal((len(ids), dim), dtype=np.float32)
+            picks = rng.integers(0, len(common), len(ids))
+            repeated = rng.random(len(ids)) < 0.6
+            vectors[repeated] = common[picks[repeated]]
+            hashes = [f"c{p}" if r else f"u{i}" for i, p, r in zip(ids, picks, repeated)]
+            repo.bulk_save_embeddings(ids, vectors, "bench", batch_size=5000, text_hashes=hashes)
+
+        start = time.perf_counter()
+        store = build_vector_store(db_path)
+        print(f"volcado inicial: {time.perf_counter() - start:.2f}s, {store.n_vectors} vectores únicos "
+              f"({store.vectors.nbytes / 1024 / 1024:.1f} MB frente a {n_vectors * dim * 4 / 1024 / 1024:.1f} MB)")
+        del store
+
+        for label, load in (("BLOBs de SQLite", repo.get_all_embeddings),
+                            ("almacén np.memmap", lambda: load_vector_store(db_path))):
+            tracemalloc.start()
+            start = time.perf_counter()
+            loaded = load()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{label:>18}: {n_vectors} mensajes en {elapsed * 1000:8.1f} ms, "
+                  f"pico de memoria {peak / 1024 / 1024:7.1f} MB")
+            del loaded
+
+        close_all_connections()
@@ -1,3 +1,3 @@
-from .extractor import HTMLMessageExtractor, parse_all_html_files
+from .extractor import HTMLMessageExtractor, create_extractor, parse_all_html_files, iter_html_messages
 
-__all__ = ["HTMLMessageExtractor", "parse_all_html_files"]
+__all__ = ["HTMLMessageExtractor", "create_extractor", "parse_all_html_files", "iter_html_messages"]
@@ -3,15 +3,26 @@ Parser de exports HTML de Telegram Desktop
 """
 
 import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from dataclasses import dataclass, field
-from typing import Optional, Iterator
+from typing import Callable, Optional, Iterator
 from bs4 import BeautifulSoup
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Remitente provisional para mensajes "joined" al inicio de un archivo cuando
+# se parsea en paralelo: el remitente real está en el archivo anterior y se
+# resuelve al fusionar los resultados en orden.
+_PENDING_SENDER = "\x00pending-sender"
+
+# messages.html, messages2.html, ..., messages10.html: el número es el orden
+_HTML_FILE_PATTERN = re.compile(r'^messages(\d*)\.html$')
+
 
 @dataclass
 class ParsedMessage:
@@ -32,25 +43,38 @@ class ParsedMessage:
 
 
 class HTMLMessageExtractor:
-    """Extrae mensajes de archivos HTML exportados por Telegram Desktop"""
+    """
+    Extrae mensajes de archivos HTML exportados por Telegram Desktop.
+
+    Backend basado en BeautifulSoup. El acceso al árbol HTML pasa por los
+    métodos _load_message_divs, _find, _get_attr, _get_classes, _get_text,
+    _get_text_with_breaks y _contains_text, que otros backends sobrescriben
+    (ver LxmlMessageExtractor) reutilizando toda la lógica de extracción.
+    """
+
+    backend = "bs4"
 
     def __init__(self, chat_id: str, topic_id: str):
         self.chat_id = chat_id
         self.topic_id = topic_id
 
-    def parse_file(self, file_path: Path) -> list[ParsedMessage]:
-        """Parsea un archivo HTML y extrae todos los mensajes"""
-        logger.info(f"Parseando archivo: {file_path.name}")
+    def parse_file(self, file_path: Path, initial_sender: Optional[str] = None) -> list[ParsedMessage]:
+        """
+        Parsea un archivo HTML y extrae todos los mensajes.
 
-        with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, 'lxml')
+        Args:
+            file_path: Archivo messages*.html
+            initial_sender: Remitente del último mensaje del archivo anterior,
+                            para los mensajes "joined" al inicio del archivo
+        """
+        logger.info(f"Parseando archivo: {file_path.name}")
 
         messages = []
-        current_sender = None
+        current_sender = initial_sender
         source_file = file_path.name
 
         # Buscar todos los divs con clase 'message'
-        for div in soup.find_all('div', class_='message'):
+        for div in self._load_message_divs(file_path):
             try:
                 msg = self._parse_message_div(div, current_sender, source_file)
                 if msg:
@@ -59,7 +83,7 @@ class HTMLMessageExtractor:
                         current_sender = msg.sender_name
                     messages.append(msg)
             except Exception as e:
-                msg_id = div.get('id', 'unknown')
+                msg_id = self._get_attr(div, 'id', 'unknown')
                 logger.warning(f"Error parseando mensaje {msg_id}: {e}")
                 continue
 
@@ -70,7 +94,7 @@ class HTMLMessageExtractor:
         """Parsea un div de mensaje individual"""
 
         # Obtener ID del mensaje
-        msg_id_str = div.get('id', '')
+        msg_id_str = self._get_attr(div, 'id', '')
         if not msg_id_str.startswith('message'):
             return None
 
@@ -81,7 +105,7 @@ class HTMLMessageExtractor:
         msg_id = int(msg_id_match.group(1))
 
         # Determinar tipo de mensaje
-        classes = div.get('class', [])
+        classes = self._get_classes(div)
         is_service = 'service' in classes
         is_joined = 'joined' in classes
 
@@ -93,11 +117,11 @@ class HTMLMessageExtractor:
 
     def _parse_service_message(self, div, msg_id: int, source_file: str) -> Optional[ParsedMessage]:
         """Parsea un mensaje de servicio (fechas, acciones de sistema)"""
-        body = div.find('div', class_='body')
-        if not body:
+        body = self._find(div, 'div', 'body')
+        if body is None:
             return None
 
-        text = body.get_text(strip=True)
+        text = self._get_text(body, strip=True)
         if not text:
             return None
 
@@ -134,9 +158,9 @@ class HTMLMessageExtractor:
         if is_joined and current_sender:
             sender_name = current_sender
         else:
-            from_name_div = div.find('div', class_='from_name')
-            if from_name_div:
-                sender_name = from_name_div.get_text(strip=True)
+            from_name_div = self._find(div, 'div', 'from_name')
+            if from_name_div is not None:
+                sender_name = self._get_text(from_name_div, strip=True)
             else:
                 sender_name = "[Desconocido]"
 
@@ -147,13 +171,11 @@ class HTMLMessageExtractor:
             timestamp = datetime.now()
 
         # Extraer texto
-        text_div = div.find('div', class_='text')
+        text_div = self._find(div, 'div', 'text')
         text = ""
-        if text_div:
+        if text_div is not None:
             # Preservar saltos de línea
-            for br in text_div.find_all('br'):
-                br.replace_with('\n')
-            text = text_div.get_text()
+            text = self._get_text_with_breaks(text_div)
 
         # Detectar tipo de mensaje y media
         message_type = 'text'
@@ -161,19 +183,19 @@ class HTMLMessageExtractor:
         media_type = None
 
         # Buscar media
-        if div.find('a', class_='photo_wrap'):
+        if self._find(div, 'a', 'photo_wrap') is not None:
             message_type = 'photo'
             has_media = True
             media_type = 'photo'
-        elif div.find('a', class_='media_file'):
+        elif self._find(div, 'a', 'media_file') is not None:
             message_type = 'file'
             has_media = True
             media_type = 'file'
-        elif div.find('div', class_='media_video'):
+        elif self._find(div, 'div', 'media_video') is not None:
             message_type = 'video'
             has_media = True
             media_type = 'video'
-        elif 'Sticker' in str(div):
+        elif self._contains_text(div, 'Sticker'):
             message_type = 'sticker'
             has_media = True
             media_type = 'sticker'
@@ -203,12 +225,12 @@ class HTMLMessageExtractor:
 
     def _extract_timestamp(self, div) -> Optional[datetime]:
         """Extrae el timestamp del atributo title del div de fecha"""
-        date_div = div.find('div', class_='date')
-        if not date_div:
-            date_div = div.find('div', class_='pull_right')
+        date_div = self._find(div, 'div', 'date')
+        if date_div is None:
+            date_div = self._find(div, 'div', 'pull_right')
 
-        if date_div and date_div.get('title'):
-            title = date_div['title']
+        title = self._get_attr(date_div, 'title') if date_div is not None else None
+        if title:
             # Formato: "24.11.2025 22:59:16 UTC+01:00"
             try:
                 # Remover timezone para simplificar
@@ -221,14 +243,14 @@ class HTMLMessageExtractor:
 
     def _extract_reply_to(self, div) -> Optional[int]:
         """Extrae el ID del mensaje al que se responde"""
-        reply_div = div.find('div', class_='reply_to')
-        if not reply_div:
+        reply_div = self._find(div, 'div', 'reply_to')
+        if reply_div is None:
             return None
 
         # Buscar enlace con formato #go_to_messageXXXX o messages.html#go_to_messageXXXX
-        link = reply_div.find('a')
-        if link and link.get('href'):
-            href = link['href']
+        link = self._find(reply_div, 'a')
+        href = self._get_attr(link, 'href') if link is not None else None
+        if href:
             match = re.search(r'go_to_message(\d+)', href)
             if match:
                 return int(match.group(1))
@@ -237,8 +259,43 @@ class HTMLMessageExtractor:
 
     def _is_joined_message(self, div) -> bool:
         """Determina si es un mensaje continuación (sin userpic)"""
-        classes = div.get('class', [])
-        return 'joined' in classes
+        return 'joined' in self._get_classes(div)
+
+    # --- Acceso al árbol HTML (BeautifulSoup) ---
+
+    def _load_message_divs(self, file_path: Path) -> Iterator:
+        """Carga el archivo y devuelve los divs con clase 'message' en orden"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            soup = BeautifulSoup(f, 'lxml')
+        return soup.find_all('div', class_='message')
+
+    def _find(self, element, tag: str, class_name: Optional[str] = None):
+        """Primer descendiente con la etiqueta (y clase) indicada, o None"""
+        if class_name is None:
+            return element.find(tag)
+        return element.find(tag, class_=class_name)
+
+    def _get_attr(self, element, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Valor de un atributo del elemento"""
+        return element.get(name, default)
+
+    def _get_classes(self, element) -> list[str]:
+        """Lista de clases CSS del elemento"""
+        return element.get('class', [])
+
+    def _get_text(self, element, strip: bool = False) -> str:
+        """Texto del elemento y sus descendientes"""
+        return element.get_text(strip=strip)
+
+    def _get_text_with_breaks(self, element) -> str:
+        """Texto del elemento convirtiendo los <br> en saltos de línea"""
+        for br in element.find_all('br'):
+            br.replace_with('\n')
+        return element.get_text()
+
+    def _contains_text(self, element, needle: str) -> bool:
+        """Indica si el HTML del elemento contiene el texto indicado"""
+        return needle in str(element)
 
     def _clean_text(self, text: str) -> str:
         """Limpia el texto para búsqueda"""
@@ -252,45 +309,205 @@ class HTMLMessageExtractor:
         return text
 
 
-def parse_all_html_files(
-    html_dir: Path,
-    chat_id: str,
-    topic_id: str
-) -> list[ParsedMessage]:
+def create_extractor(chat_id: str, topic_id: str, backend: str = "bs4") -> HTMLMessageExtractor:
     """
-    Parsea todos los archivos messages*.html en orden.
+    Crea el extractor para el backend de parseo indicado.
 
-    Returns:
-        Lista de todos los mensajes parseados
+    Args:
+        chat_id: ID del chat
+        topic_id: ID del topic
+        backend: 'bs4' (BeautifulSoup) o 'lxml' (XPath nativo, más rápido)
     """
-    extractor = HTMLMessageExtractor(chat_id, topic_id)
+    if backend == "bs4":
+        return HTMLMessageExtractor(chat_id, topic_id)
+    if backend == "lxml":
+        from .lxml_extractor import LxmlMessageExtractor
+        return LxmlMessageExtractor(chat_id, topic_id)
+    raise ValueError(f"Backend de parseo desconocido: {backend} (usa 'bs4' o 'lxml')")
+
 
-    # Encontrar todos los archivos messages*.html
-    html_files = sorted(html_dir.glob("messages*.html"))
+def _parse_file_timed(args: tuple[str, str, str, Path]) -> tuple[list[ParsedMessage], float]:
+    """Parsea un archivo en un proceso worker y devuelve (mensajes, segundos)"""
+    chat_id, topic_id, backend, file_path = args
+    start = time.perf_counter()
+    extractor = create_extractor(chat_id, topic_id, backend)
+    messages = extractor.parse_file(file_path, initial_sender=_PENDING_SENDER)
+    return messages, time.perf_counter() - start
+
+
+def _resolve_pending_senders(messages: list[ParsedMessage], carried_sender: Optional[str]) -> None:
+    """Asigna el remitente del archivo anterior a los "joined" iniciales"""
+    for msg in messages:
+        if msg.sender_name != _PENDING_SENDER:
+            break
+        msg.sender_name = carried_sender or "[Desconocido]"
+
+
+def html_file_order(file_path: Path) -> tuple[int, str]:
+    """
+    Clave de orden natural de los archivos del export: messages.html es el 1,
+    messages2.html el 2... (el orden de cadenas pondría messages10.html antes
+    que messages2.html). Otros nombres van al principio.
+    """
+    match = _HTML_FILE_PATTERN.match(file_path.name)
+    if not match:
+        return 0, file_path.name
+    return int(match.group(1) or 1), file_path.name
+
+
+def find_html_files(html_dir: Path) -> list[Path]:
+    """Devuelve los archivos messages*.html del export, en orden"""
+    html_files = sorted(html_dir.glob("messages*.html"), key=html_file_order)
 
     if not html_files:
         raise FileNotFoundError(f"No se encontraron archivos messages*.html en {html_dir}")
 
     logger.info(f"Encontrados {len(html_files)} archivos HTML")
+    return html_files
 
-    all_messages = []
-    for file_path in html_files:
-        messages = extractor.parse_file(file_path)
-        all_messages.extend(messages)
 
-    # Ordenar por ID de mensaje
-    all_messages.sort(key=lambda m: m.id)
+def iter_parsed_files(
+    html_files: list[Path],
+    chat_id: str,
+    topic_id: str,
+    workers: int = 1,
+    backend: str = "bs4",
+    initial_senders: Optional[dict[str, Optional[str]]] = None
+) -> Iterator[tuple[Path, list[ParsedMessage], float]]:
+    """
+    Parsea los archivos en orden y genera (archivo, mensajes, segundos).
+
+    Con workers > 1 los archivos se parsean en un pool de procesos con una
+    ventana acotada de archivos en vuelo: los siguientes archivos se parsean
+    mientras el consumidor procesa el actual, sin acumular el export entero.
+
+    Args:
+        html_files: Archivos a parsear, en orden
+        chat_id: ID del chat
+        topic_id: ID del topic
+        workers: Número de procesos para parsear en paralelo (1 = secuencial)
+        backend: Backend de parseo ('bs4' o 'lxml')
+        initial_senders: Remitente con el que empieza cada archivo (por nombre)
+                         cuando el archivo anterior del export no se parsea
+    """
+    initial_senders = initial_senders or {}
+    # Remitente del último mensaje parseado, para mensajes "joined" que
+    # continúan en el archivo siguiente
+    carried_sender = None
+
+    def sender_for(file_path: Path) -> Optional[str]:
+        return initial_senders.get(file_path.name, carried_sender)
+
+    def resolve(file_path: Path, messages: list[ParsedMessage]) -> None:
+        nonlocal carried_sender
+        _resolve_pending_senders(messages, sender_for(file_path))
+        if messages:
+            # Los "joined" heredan el remitente actual, así que el del último
+            # mensaje es el que continúa en el archivo siguiente
+            carried_sender = messages[-1].sender_name
+
+    if workers > 1 and len(html_files) > 1:
+        logger.info(f"Parseando en paralelo con {workers} procesos")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            files = iter(html_files)
+
+            def submit_next() -> None:
+                file_path = next(files, None)
+                if file_path is not None:
+                    pending.append((file_path, executor.submit(
+                        _parse_file_timed, (chat_id, topic_id, backend, file_path)
+                    )))
+
+            for _ in range(workers * 2):
+                submit_next()
+
+            # Los resultados se consumen en el orden de los archivos
+            while pending:
+                file_path, future = pending.popleft()
+                messages, elapsed = future.result()
+                submit_next()
+                resolve(file_path, messages)
+                yield file_path, messages, elapsed
+    else:
+        extractor = create_extractor(chat_id, topic_id, backend)
+        for file_path in html_files:
+            start = time.perf_counter()
+            messages = extractor.parse_file(file_path, initial_sender=sender_for(file_path))
+            elapsed = time.perf_counter() - start
+            resolve(file_path, messages)
+            yield file_path, messages, elapsed
+
 
-    # Eliminar duplicados (pueden existir en límites de archivos)
+def iter_html_messages(
+    html_dir: Path,
+    chat_id: str,
+    topic_id: str,
+    workers: int = 1,
+    on_file_parsed: Optional[Callable[[str, int, float], None]] = None,
+    backend: str = "bs4"
+) -> Iterator[ParsedMessage]:
+    """
+    Genera los mensajes de todos los archivos messages*.html sin duplicados.
+
+    Los mensajes se generan archivo a archivo, por lo que la memoria no crece
+    con el tamaño del export (salvo el conjunto de IDs ya vistos). Si un ID
+    aparece en varios archivos se conserva la primera aparición.
+
+    Args:
+        html_dir: Directorio del export de Telegram Desktop
+        chat_id: ID del chat
+        topic_id: ID del topic
+        workers: Número de procesos para parsear en paralelo (1 = secuencial)
+        on_file_parsed: Callback opcional (nombre_archivo, n_mensajes, segundos)
+                        llamado por cada archivo, en orden
+        backend: Backend de parseo ('bs4' o 'lxml')
+    """
     seen_ids = set()
-    unique_messages = []
-    for msg in all_messages:
-        if msg.id not in seen_ids:
-            seen_ids.add(msg.id)
-            unique_messages.append(msg)
+    html_files = find_html_files(html_dir)
+
+    for file_path, messages, elapsed in iter_parsed_files(html_files, chat_id, topic_id, workers, backend):
+        logger.info(f"{file_path.name}: {len(messages)} mensajes en {elapsed:.2f}s")
+        if on_file_parsed:
+            on_file_parsed(file_path.name, len(messages), elapsed)
+
+        # Eliminar duplicados (pueden existir en límites de archivos)
+        for msg in messages:
+            if msg.id not in seen_ids:
+                seen_ids.add(msg.id)
+                yield msg
 
-    logger.info(f"Total de mensajes únicos: {len(unique_messages)}")
-    return unique_messages
+    logger.info(f"Total de mensajes únicos: {len(seen_ids)}")
+
+
+def parse_all_html_files(
+    html_dir: Path,
+    chat_id: str,
+    topic_id: str,
+    workers: int = 1,
+    on_file_parsed: Optional[Callable[[str, int, float], None]] = None,
+    backend: str = "bs4"
+) -> list[ParsedMessage]:
+    """
+    Parsea todos los archivos messages*.html en orden.
+
+    Args:
+        html_dir: Directorio del export de Telegram Desktop
+        chat_id: ID del chat
+        topic_id: ID del topic
+        workers: Número de procesos para parsear en paralelo (1 = secuencial)
+        on_file_parsed: Callback opcional (nombre_archivo, n_mensajes, segundos)
+                        llamado por cada archivo, en orden
+        backend: Backend de parseo ('bs4' o 'lxml')
+
+    Returns:
+        Lista de todos los mensajes parseados, ordenados por ID
+    """
+    messages = list(iter_html_messages(html_dir, chat_id, topic_id, workers, on_file_parsed, backend))
+
+    # Ordenar por ID de mensaje
+    messages.sort(key=lambda m: m.id)
+    return messages
 
 
 if __name__ == "__main__":
@@ -298,6 +515,11 @@ if __name__ == "__main__":
     import sys
     logging.basicConfig(level=logging.INFO)
 
+    # Orden natural de los archivos (los remitentes "joined" dependen de él)
+    names = ["messages10.html", "messages2.html", "messages.html", "messages11.html", "messages3.html"]
+    ordered = [p.name for p in sorted(map(Path, names), key=html_file_order)]
+    assert ordered == ["messages.html", "messages2.html", "messages3.html", "messages10.html", "messages11.html"], ordered
+
     if len(sys.argv) > 1:
         html_dir = Path(sys.argv[1])
     else:
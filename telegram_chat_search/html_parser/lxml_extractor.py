@@ -0,0 +1,149 @@
+"""
+Backend de parseo rápido basado directamente en lxml (XPath)
+
+Produce exactamente los mismos ParsedMessage que HTMLMessageExtractor sin
+construir un árbol de BeautifulSoup: el árbol de lxml se recorre con
+expresiones XPath precompiladas y la detección de stickers no serializa el
+elemento completo.
+"""
+
+from pathlib import Path
+from typing import Iterator, Optional
+import logging
+
+from lxml import etree, html
+
+from .extractor import HTMLMessageExtractor
+
+logger = logging.getLogger(__name__)
+
+_PARSER = html.HTMLParser(encoding='utf-8')
+
+
+def _has_class_xpath(class_name: str) -> str:
+    """Condición XPath equivalente a class_=... de BeautifulSoup"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+_MESSAGE_DIVS = etree.XPath(f"//div[{_has_class_xpath('message')}]")
+
+# Caché de expresiones XPath compiladas por (etiqueta, clase)
+_FIND_XPATHS: dict[tuple[str, Optional[str]], etree.XPath] = {}
+
+
+def _find_xpath(tag: str, class_name: Optional[str]) -> etree.XPath:
+    """XPath compilado para el primer descendiente con etiqueta y clase"""
+    key = (tag, class_name)
+    if key not in _FIND_XPATHS:
+        condition = f"[{_has_class_xpath(class_name)}]" if class_name else ""
+        _FIND_XPATHS[key] = etree.XPath(f"(.//{tag}{condition})[1]")
+    return _FIND_XPATHS[key]
+
+
+class LxmlMessageExtractor(HTMLMessageExtractor):
+    """Extractor de mensajes que usa lxml + XPath en lugar de BeautifulSoup"""
+
+    backend = "lxml"
+
+    def _load_message_divs(self, file_path: Path) -> Iterator:
+        tree = html.parse(str(file_path), parser=_PARSER)
+        return _MESSAGE_DIVS(tree)
+
+    def _find(self, element, tag: str, class_name: Optional[str] = None):
+        matches = _find_xpath(tag, class_name)(element)
+        return matches[0] if matches else None
+
+    def _get_attr(self, element, name: str, default: Optional[str] = None) -> Optional[str]:
+        return element.get(name, default)
+
+    def _get_classes(self, element) -> list[str]:
+        return element.get('class', '').split()
+
+    def _get_text(self, element, strip: bool = False) -> str:
+        if strip:
+            return ''.join(part.strip() for part in element.itertext() if part.strip())
+        return ''.join(element.itertext())
+
+    def _get_text_with_breaks(self, element) -> str:
+        parts = []
+        self._collect_text(element, parts)
+        return ''.join(parts)
+
+    def _collect_text(self, element, parts: list[str]) -> None:
+        """Acumula el texto del subárbol sustituyendo <br> por saltos de línea"""
+        if element.tag == 'br':
+            parts.append('\n')
+        elif element.text:
+            parts.append(element.text)
+
+        for child in element:
+            # Los comentarios no aportan texto, pero su tail sí
+            if isinstance(child.tag, str):
+                self._collect_text(child, parts)
+            if child.tail:
+                parts.append(child.tail)
+
+    def _contains_text(self, element, needle: str) -> bool:
+        # Equivale a buscar en el HTML serializado: texto, comentarios y
+        # valores de atributos
+        if any(needle in part for part in element.itertext()):
+            return True
+        for node in element.iter():
+            if isinstance(node.tag, str):
+                if any(needle in value for value in node.attrib.values()):
+                    return True
+            elif node.text and needle in node.text:
+                return True
+        return False
+
+
+if __name__ == "__main__":
+    # Paridad con el backend BeautifulSoup y benchmark de mensajes/segundo
+    import sys
+    import time
+    from dataclasses import asdict
+    from datetime import datetime
+    from .extractor import find_html_files
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if len(sys.argv) > 1:
+        html_dir = Path(sys.argv[1])
+    else:
+        html_dir = Path(__file__).parent.parent.parent / "chats"
+
+    html_files = find_html_files(html_dir)
+    results = {}
+    run_start = datetime.now()
+
+    for extractor in (HTMLMessageExtractor("562952938253116", "1478"),
+                      LxmlMessageExtractor("562952938253116", "1478")):
+        start = time.perf_counter()
+        messages = []
+        for file_path in html_files:
+            messages.extend(extractor.parse_file(file_path))
+        elapsed = time.perf_counter() - start
+        results[extractor.backend] = messages
+        print(f"{extractor.backend:>5}: {len(messages)} mensajes en {elapsed:.2f}s "
+              f"({len(messages) / elapsed:.0f} msg/s)")
+
+    def comparable(msg):
+        data = asdict(msg)
+        # Los mensajes sin timestamp usan datetime.now() como placeholder
+        if msg.timestamp >= run_start:
+            data.pop('timestamp')
+            data.pop('timestamp_utc')
+        return data
+
+    expected = [comparable(m) for m in results["bs4"]]
+    actual = [comparable(m) for m in results["lxml"]]
+    mismatches = [(a, b) for a, b in zip(expected, actual) if a != b]
+
+    if len(expected) != len(actual) or mismatches:
+        print(f"\n✗ Paridad FALLIDA: {len(expected)} vs {len(actual)} mensajes, "
+              f"{len(mismatches)} diferencias")
+        for a, b in mismatches[:5]:
+            print(f"  bs4:  {a}\n  lxml: {b}")
+        sys.exit(1)
+
+    print("\n✓ Paridad OK: ambos backends producen los mismos mensajes")
@@ -0,0 +1,193 @@
+"""
+Planificación de re-importaciones incrementales a partir del manifest
+
+Compara los archivos del export (messages*.html o result.json) con el manifest
+guardado en la base de datos (tamaño, mtime y hash del contenido) para parsear
+solo los archivos nuevos o modificados. Los archivos que ya no están en el
+export se eliminan del manifest junto con sus mensajes.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+import logging
+
+from ..database.schema import ImportManifestEntry
+from .extractor import ParsedMessage, html_file_order
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImportPlan:
+    """Resultado de comparar el export con el manifest"""
+    changed: list[Path] = field(default_factory=list)
+    unchanged: list[Path] = field(default_factory=list)
+    # Hash de contenido de cada archivo modificado
+    hashes: dict[str, str] = field(default_factory=dict)
+    # Entradas con mtime distinto pero mismo contenido (solo hay que actualizarlas)
+    refreshed: list[ImportManifestEntry] = field(default_factory=list)
+    # Remitente con el que empieza un archivo modificado cuyo anterior no se parsea
+    initial_senders: dict[str, Optional[str]] = field(default_factory=dict)
+    # Entradas de archivos que ya no están en el export
+    removed: list[ImportManifestEntry] = field(default_factory=list)
+
+
+def hash_file(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Calcula el hash SHA-256 del contenido de un archivo"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def plan_import(
+    files: list[Path],
+    manifest: dict[str, ImportManifestEntry],
+    full: bool = False
+) -> ImportPlan:
+    """
+    Decide qué archivos hay que (re)parsear.
+
+    Un archivo se salta si su tamaño y mtime coinciden con el manifest. Si
+    solo cambia el mtime se compara el hash del contenido antes de parsearlo.
+
+    Args:
+        files: Archivos del export (se recorren en orden natural, ver html_file_order)
+        manifest: Manifest actual indexado por nombre de archivo
+        full: Re-importar todos los archivos ignorando el manifest
+    """
+    plan = ImportPlan()
+    files = sorted(files, key=html_file_order)
+
+    for file_path in files:
+        stat = file_path.stat()
+        entry = manifest.get(file_path.name)
+
+        if not full and entry and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+            plan.unchanged.append(file_path)
+            continue
+
+        content_hash = hash_file(file_path)
+        if not full and entry and entry.content_hash == content_hash:
+            entry.size = stat.st_size
+            entry.mtime_ns = stat.st_mtime_ns
+            plan.refreshed.append(entry)
+            plan.unchanged.append(file_path)
+            continue
+
+        plan.changed.append(file_path)
+        plan.hashes[file_path.name] = content_hash
+
+    # Los "joined" al inicio de un archivo modificado continúan el último
+    # remitente del archivo anterior; si ese no se parsea, sale del manifest
+    changed = set(plan.changed)
+    for previous, current in zip(files, files[1:]):
+        if current in changed and previous not in changed:
+            previous_entry = manifest.get(previous.name)
+            plan.initial_senders[current.name] = previous_entry.last_sender if previous_entry else None
+
+    names = {file_path.name for file_path in files}
+    plan.removed = [entry for name, entry in manifest.items() if name not in names]
+
+    logger.info(
+        f"Plan de importación: {len(plan.changed)} archivos a parsear, "
+        f"{len(plan.unchanged)} sin cambios, {len(plan.removed)} eliminados del export"
+    )
+    return plan
+
+
+def plan_resync(
+    files: list[Path],
+    manifest: dict[str, ImportManifestEntry],
+    last_senders: dict[str, Optional[str]],
+    inherited: dict[str, Optional[str]]
+) -> ImportPlan:
+    """
+    Archivos que hay que volver a parsear porque el último remitente del
+    archivo anterior (el que heredan sus mensajes "joined" iniciales) ya no
+    es el remitente con el que se importaron.
+
+    Args:
+        files: Archivos del export
+        manifest: Manifest anterior a la importación
+        last_senders: Último remitente de cada archivo parseado en esta importación
+        inherited: Remitente inicial con el que se parseó cada uno de esos archivos
+    """
+    plan = ImportPlan()
+    files = sorted(files, key=html_file_order)
+
+    for previous, current in zip(files, files[1:]):
+        if previous.name not in last_senders:
+            continue
+
+        if current.name in inherited:
+            started_with = inherited[current.name]
+        else:
+            # Sin parsear en esta importación: empezó con el remitente guardado del anterior
+            previous_entry = manifest.get(previous.name)
+            started_with = previous_entry.last_sender if previous_entry else None
+
+        if last_senders[previous.name] != started_with:
+            plan.changed.append(current)
+            plan.initial_senders[current.name] = last_senders[previous.name]
+            entry = manifest.get(current.name)
+            if current.name not in last_senders and entry is not None:
+                plan.hashes[current.name] = entry.content_hash
+
+    if plan.changed:
+        logger.info(f"Re-parseando {len(plan.changed)} archivos cuyo remitente inicial cambió")
+    return plan
+
+
+@dataclass
+class ImportedRange:
+    """Rango de IDs y último remitente de los mensajes importados de un archivo"""
+    min_message_id: Optional[int] = None
+    max_message_id: Optional[int] = None
+    message_count: int = 0
+    last_sender: Optional[str] = None
+
+    def add(self, msg: ParsedMessage) -> None:
+        """Registra un mensaje del archivo"""
+        if self.min_message_id is None or msg.id < self.min_message_id:
+            self.min_message_id = msg.id
+        if self.max_message_id is None or msg.id > self.max_message_id:
+            self.max_message_id = msg.id
+        self.message_count += 1
+        self.last_sender = msg.sender_name
+
+    def track(self, messages: Iterable[ParsedMessage]) -> Iterator[ParsedMessage]:
+        """Registra los mensajes a medida que se consumen (para streams)"""
+        for msg in messages:
+            self.add(msg)
+            yield msg
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[ParsedMessage]) -> "ImportedRange":
+        imported = cls()
+        for msg in messages:
+            imported.add(msg)
+        return imported
+
+
+def build_manifest_entry(
+    file_path: Path,
+    content_hash: str,
+    imported: ImportedRange
+) -> ImportManifestEntry:
+    """Crea la entrada del manifest para un archivo recién importado"""
+    stat = file_path.stat()
+
+    return ImportManifestEntry(
+        file_name=file_path.name,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        content_hash=content_hash,
+        min_message_id=imported.min_message_id,
+        max_message_id=imported.max_message_id,
+        message_count=imported.message_count,
+        last_sender=imported.last_sender,
+    )
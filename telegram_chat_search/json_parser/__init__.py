@@ -0,0 +1,3 @@
+from .extractor import JSONMessageExtractor, find_json_export, iter_json_messages
+
+__all__ = ["JSONMessageExtractor", "find_json_export", "iter_json_messages"]
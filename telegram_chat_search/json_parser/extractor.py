@@ -0,0 +1,346 @@
+"""
+Parser de exports JSON (result.json) de Telegram Desktop
+
+El archivo puede ocupar varios GB, así que no se carga con json.load: se lee
+por bloques y cada mensaje del array "messages" se decodifica por separado con
+JSONDecoder.raw_decode, de forma que la memoria solo depende del tamaño de un
+mensaje. Los demás campos del nivel superior se saltan sin decodificarlos.
+Soporta el export de un único chat (objeto con "messages" en el nivel
+superior); el export de la cuenta completa (con "chats") se rechaza.
+"""
+
+import json
+import re
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Any, Iterator, Optional, TextIO
+import logging
+
+from ..html_parser.extractor import ParsedMessage
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Al saltar un valor: caracteres estructurales fuera de los strings y
+# contenido de un string (hasta la comilla de cierre, con escapes)
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+
+# Campos del nivel superior del export de la cuenta completa
+_ACCOUNT_EXPORT_KEYS = {'chats', 'left_chats'}
+
+# media_type del export JSON -> message_type de la base de datos
+_MEDIA_TYPES = {
+    'sticker': 'sticker',
+    'video_file': 'video',
+    'video_message': 'video',
+    'animation': 'video',
+}
+
+
+class _JSONStream:
+    """Lector incremental de JSON sobre un archivo de texto"""
+
+    def __init__(self, f: TextIO, chunk_size: int = 1024 * 1024):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Lee el siguiente bloque del archivo. Devuelve False al llegar al final"""
+        if self._eof:
+            return False
+
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+
+        # Descartar lo ya consumido para que el buffer no crezca
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        self._buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """Siguiente carácter significativo sin consumirlo ('' al final)"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or not self._fill():
+                return self._buf[self._pos:self._pos + 1]
+
+    def expect(self, char: str) -> None:
+        """Consume el carácter indicado o lanza ValueError"""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON inválido: se esperaba '{char}' y se encontró '{found}'")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decodifica el siguiente valor JSON completo"""
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+                # Un valor que llega justo al final del buffer puede estar
+                # truncado (p. ej. un número): leer más antes de aceptarlo
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def skip(self) -> None:
+        """
+        Salta el siguiente valor JSON sin decodificarlo. Los objetos, arrays y
+        strings se recorren por bloques contando corchetes (fuera de los
+        strings), así que la memoria no depende del tamaño del valor.
+        """
+        if self.peek() not in '{["':
+            # Número, true, false o null
+            self.value()
+            return
+
+        depth = 0
+        in_string = False
+        while True:
+            if in_string:
+                self._pos = _STRING_BODY.match(self._buf, self._pos).end()
+                # Fin del bloque (o escape partido entre bloques): leer más
+                if self._pos >= len(self._buf) or self._buf[self._pos] == '\\':
+                    if not self._fill():
+                        raise ValueError("JSON inválido: valor sin terminar")
+                    continue
+                self._pos += 1
+                in_string = False
+            else:
+                match = _STRUCTURAL.search(self._buf, self._pos)
+                if match is None:
+                    self._pos = len(self._buf)
+                    if not self._fill():
+                        raise ValueError("JSON inválido: valor sin terminar")
+                    continue
+                self._pos = match.end()
+                char = match.group()
+                if char == '"':
+                    in_string = True
+                    continue
+                depth += 1 if char in '{[' else -1
+
+            if depth == 0 and not in_string:
+                return
+
+
+def iter_json_array(f: TextIO, key: str = "messages") -> Iterator[Any]:
+    """
+    Genera uno a uno los elementos del array `key` del objeto JSON raíz.
+
+    Los demás campos del nivel superior se saltan sin decodificarlos.
+
+    Raises:
+        ValueError: Si el archivo es el export de la cuenta completa (los
+                    mensajes están dentro de "chats", no en el nivel superior)
+    """
+    stream = _JSONStream(f)
+    stream.expect('{')
+
+    while stream.peek() != '}':
+        name = stream.value()
+        stream.expect(':')
+
+        if name != key and name in _ACCOUNT_EXPORT_KEYS:
+            raise ValueError(
+                f"El JSON es un export de la cuenta completa (campo '{name}'): "
+                f"exporta solo el chat desde Telegram Desktop"
+            )
+        if name != key:
+            stream.skip()
+        else:
+            stream.expect('[')
+            if stream.peek() == ']':
+                return
+            while True:
+                yield stream.value()
+                if stream.peek() != ',':
+                    stream.expect(']')
+                    return
+                stream.expect(',')
+
+        if stream.peek() == ',':
+            stream.expect(',')
+
+    logger.warning(f"El JSON no contiene el array '{key}'")
+
+
+class JSONMessageExtractor:
+    """Extrae mensajes del result.json exportado por Telegram Desktop"""
+
+    def __init__(self, chat_id: str, topic_id: str):
+        self.chat_id = chat_id
+        self.topic_id = topic_id
+
+    def iter_messages(self, json_path: Path) -> Iterator[ParsedMessage]:
+        """Genera los mensajes del export en el orden del archivo"""
+        logger.info(f"Parseando archivo: {json_path.name}")
+
+        count = 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            for entry in iter_json_array(f, "messages"):
+                try:
+                    msg = self._parse_entry(entry, json_path.name)
+                except Exception as e:
+                    logger.warning(f"Error parseando mensaje {entry.get('id', 'unknown')}: {e}")
+                    continue
+                if msg:
+                    count += 1
+                    yield msg
+
+        logger.info(f"Extraídos {count} mensajes de {json_path.name}")
+
+    def _parse_entry(self, entry: dict, source_file: str) -> Optional[ParsedMessage]:
+        """Convierte una entrada del array 'messages' en ParsedMessage"""
+        msg_id = entry.get('id')
+        if not isinstance(msg_id, int):
+            return None
+
+        timestamp, timestamp_utc = self._extract_timestamps(entry)
+        text = self._extract_text(entry.get('text'))
+
+        if entry.get('type') == 'service':
+            if not text.strip():
+                action = (entry.get('action') or '').replace('_', ' ')
+                text = f"{entry.get('actor') or ''} {action}".strip()
+            if not text:
+                return None
+
+            return ParsedMessage(
+                id=msg_id,
+                chat_id=self.chat_id,
+                topic_id=self.topic_id,
+                sender_name="[Sistema]",
+                text=text,
+                text_clean=self._clean_text(text),
+                timestamp=timestamp,
+                timestamp_utc=timestamp_utc,
+                message_type='service',
+                source_file=source_file,
+            )
+
+        # Detectar tipo de mensaje y media
+        media_type = None
+        if entry.get('photo'):
+            media_type = 'photo'
+        elif entry.get('media_type') in _MEDIA_TYPES:
+            media_type = _MEDIA_TYPES[entry['media_type']]
+        elif entry.get('file'):
+            media_type = 'file'
+
+        # Si no hay texto pero hay media, usar descripción
+        if not text.strip() and media_type:
+            text = f"[{media_type.upper()}]"
+
+        reply_to_id = entry.get('reply_to_message_id')
+
+        return ParsedMessage(
+            id=msg_id,
+            chat_id=self.chat_id,
+            topic_id=self.topic_id,
+            sender_name=entry.get('from') or "[Desconocido]",
+            text=text,
+            text_clean=self._clean_text(text),
+            timestamp=timestamp,
+            timestamp_utc=timestamp_utc,
+            message_type=media_type or 'text',
+            reply_to_message_id=reply_to_id if isinstance(reply_to_id, int) else None,
+            source_file=source_file,
+            has_media=media_type is not None,
+            media_type=media_type,
+        )
+
+    def _extract_timestamps(self, entry: dict) -> tuple[datetime, datetime]:
+        """Devuelve (hora local del export, hora UTC)"""
+        try:
+            timestamp = datetime.fromisoformat(entry['date'])
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Mensaje {entry.get('id')} sin timestamp")
+            timestamp = datetime.now()
+
+        unixtime = entry.get('date_unixtime')
+        if unixtime:
+            timestamp_utc = datetime.fromtimestamp(int(unixtime), tz=timezone.utc).replace(tzinfo=None)
+        else:
+            timestamp_utc = timestamp
+
+        return timestamp, timestamp_utc
+
+    def _extract_text(self, text: Any) -> str:
+        """El campo 'text' es un string o una lista de strings y entidades"""
+        if isinstance(text, str):
+            return text
+        if isinstance(text, list):
+            return ''.join(
+                part if isinstance(part, str) else part.get('text', '')
+                for part in text
+            )
+        return ""
+
+    def _clean_text(self, text: str) -> str:
+        """Limpia el texto para búsqueda"""
+        if not text:
+            return ""
+
+        # Normalizar espacios y saltos de línea
+        return re.sub(r'\s+', ' ', text).strip()
+
+
+def find_json_export(path: Path) -> Optional[Path]:
+    """Devuelve el result.json del export si existe (path puede ser el archivo o su directorio)"""
+    if path.is_file() and path.suffix == '.json':
+        return path
+    candidate = path / "result.json"
+    return candidate if candidate.is_file() else None
+
+
+def iter_json_messages(json_path: Path, chat_id: str, topic_id: str) -> Iterator[ParsedMessage]:
+    """
+    Genera los mensajes de un result.json sin duplicados, en streaming.
+
+    Returns:
+        Iterador de mensajes parseados en el orden del archivo
+    """
+    seen_ids = set()
+    extractor = JSONMessageExtractor(chat_id, topic_id)
+
+    for msg in extractor.iter_messages(json_path):
+        if msg.id not in seen_ids:
+            seen_ids.add(msg.id)
+            yield msg
+
+    logger.info(f"Total de mensajes únicos: {len(seen_ids)}")
+
+
+if __name__ == "__main__":
+    # Test básico
+    import sys
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) > 1:
+        json_path = Path(sys.argv[1])
+    else:
+        json_path = Path(__file__).parent.parent.parent / "chats" / "result.json"
+
+    count = 0
+    for msg in iter_json_messages(json_path, "562952938253116", "1478"):
+        # Mostrar primeros 5 mensajes
+        if count < 5:
+            print(f"\n[{msg.id}] {msg.sender_name} ({msg.timestamp}):")
+            print(f"  {msg.text[:100]}...")
+        count += 1
+
+    print(f"\nTotal mensajes: {count}")
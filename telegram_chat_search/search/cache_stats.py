@@ -0,0 +1,71 @@
+"""
+Contadores de aciertos de las cachés de búsqueda
+
+Las cachés de embeddings de queries y de resultados miden lo mismo: cuántas
+consultas se sirvieron de la caché y cuánto tiempo cuesta de media calcular
+lo que no estaba. El ahorro estimado es aciertos × coste medio.
+"""
+
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántas consultas a una caché se registran sus estadísticas
+_LOG_EVERY = 100
+
+
+class CacheStats:
+    """Aciertos, fallos y coste medio de lo calculado, seguros entre hilos"""
+
+    def __init__(self, name: str, saved_label: str):
+        """
+        Args:
+            name: Nombre de la caché en el log ("Caché de queries")
+            saved_label: Qué se ahorra, para el log ("de CPU", "de búsqueda")
+        """
+        self.name = name
+        self.saved_label = saved_label
+        self.hits = 0
+        self.misses = 0
+        # Tiempo total de calcular los valores guardados, para estimar el ahorro
+        self.cost_seconds = 0.0
+        self.costed = 0
+        self._lock = threading.Lock()
+
+    def record_lookup(self, hit: bool) -> None:
+        """Cuenta un acierto o un fallo (y registra las estadísticas cada _LOG_EVERY)"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            lookups = self.hits + self.misses
+
+        if lookups % _LOG_EVERY == 0:
+            self.log()
+
+    def record_cost(self, seconds: float) -> None:
+        """Cuenta el coste de calcular un valor que se guarda en la caché"""
+        with self._lock:
+            self.cost_seconds += seconds
+            self.costed += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_cost = self.cost_seconds / self.costed if self.costed else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_cost_ms": avg_cost * 1000,
+                "saved_seconds": self.hits * avg_cost,
+            }
+
+    def log(self) -> None:
+        stats = self.as_dict()
+        logger.info(
+            f"{self.name}: {stats['hits']} aciertos / {stats['misses']} fallos "
+            f"({stats['hit_rate']:.0%}), ~{stats['saved_seconds']:.1f}s {self.saved_label} ahorrados"
+        )
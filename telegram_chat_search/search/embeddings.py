@@ -2,63 +2,145 @@
 Motor de embeddings usando sentence-transformers
 """
 
+import os
+import time
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from typing import Optional
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
 import logging
 
+from .query_cache import QueryEmbeddingCache
+
 logger = logging.getLogger(__name__)
 
 # Lazy loading para evitar cargar el modelo hasta que se necesite
 _model = None
-_model_name = None
+_model_key = None
 
 
-def get_model(model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
+def get_model(
+    model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+    backend: str = "sentence-transformers",
+    onnx_dir: Optional[Path] = None
+):
     """
     Obtiene el modelo de embeddings (lazy loading).
 
     Args:
         model_name: Nombre del modelo de sentence-transformers
+        backend: 'sentence-transformers' (PyTorch), 'onnx' u 'onnx-int8'
+                 (ONNX Runtime, ver onnx_encoder)
+        onnx_dir: Directorio del modelo exportado con export-onnx
     """
-    global _model, _model_name
-
-    if _model is None or _model_name != model_name:
-        logger.info(f"Cargando modelo de embeddings: {model_name}")
-        try:
-            from sentence_transformers import SentenceTransformer
-            _model = SentenceTransformer(model_name)
-            _model_name = model_name
-            logger.info("Modelo cargado correctamente")
-        except ImportError:
-            raise ImportError(
-                "sentence-transformers no está instalado. "
-                "Ejecuta: pip install sentence-transformers"
+    global _model, _model_key
+
+    key = (model_name, backend, onnx_dir)
+    if _model is None or _model_key != key:
+        logger.info(f"Cargando modelo de embeddings: {model_name} ({backend})")
+        if backend in ("onnx", "onnx-int8"):
+            from .onnx_encoder import OnnxEncoder
+            if onnx_dir is None:
+                raise ValueError("El backend ONNX necesita el directorio del modelo exportado")
+            _model = OnnxEncoder(onnx_dir, model_name=model_name, quantized=backend == "onnx-int8")
+        elif backend == "sentence-transformers":
+            try:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(model_name)
+            except ImportError:
+                raise ImportError(
+                    "sentence-transformers no está instalado. "
+                    "Ejecuta: pip install sentence-transformers"
+                )
+        else:
+            raise ValueError(
+                f"Backend de embeddings desconocido: {backend} "
+                "(usa sentence-transformers, onnx u onnx-int8)"
             )
+        _model_key = key
+        logger.info("Modelo cargado correctamente")
 
     return _model
 
 
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Índices de los top_k scores más altos, ordenados de mayor a menor.
+
+    Selección parcial con argpartition (O(n)) y ordenación solo de los k
+    supervivientes, en lugar de ordenar el array completo.
+    """
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if top_k < len(scores):
+        candidates = np.argpartition(scores, -top_k)[-top_k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+def top_k_indices_rows(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """top_k_indices por filas de una matriz de scores (n_queries, n)"""
+    top_k = min(top_k, scores.shape[1])
+    if top_k <= 0:
+        return np.empty((len(scores), 0), dtype=np.intp)
+
+    if top_k < scores.shape[1]:
+        candidates = np.argpartition(scores, -top_k, axis=1)[:, -top_k:]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(np.take_along_axis(scores, candidates, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
 class EmbeddingEngine:
     """Motor para generar y buscar embeddings semánticos"""
 
-    def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
+    def __init__(
+        self,
+        model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        backend: str = "sentence-transformers",
+        onnx_dir: Optional[Path] = None
+    ):
         """
         Inicializa el motor de embeddings.
 
         Args:
             model_name: Modelo de sentence-transformers a usar.
                         'paraphrase-multilingual-MiniLM-L12-v2' es bueno para español.
+            query_cache: Caché de embeddings de queries (None = sin caché)
+            backend: Backend del encoder (ver get_model)
+            onnx_dir: Directorio del modelo ONNX exportado
         """
         self.model_name = model_name
+        self.query_cache = query_cache
+        self.backend = backend
+        self.onnx_dir = onnx_dir
         self._model = None
+        self._warmed_up = False
 
     @property
     def model(self):
         """Lazy loading del modelo"""
         if self._model is None:
-            self._model = get_model(self.model_name)
+            self._model = get_model(self.model_name, backend=self.backend, onnx_dir=self.onnx_dir)
         return self._model
 
+    def warm_up(self) -> None:
+        """
+        Carga el modelo y hace una primera inferencia (que reserva memoria y
+        prepara el grafo), para que no cuenten en la primera búsqueda.
+        """
+        if not self._warmed_up:
+            self.model.encode(["warm up"], convert_to_numpy=True)
+            self._warmed_up = True
+
     def encode(
         self,
         texts: list[str],
@@ -101,12 +183,49 @@ class EmbeddingEngine:
         Returns:
             Vector de embedding (embedding_dim,)
         """
-        return self.model.encode([query], convert_to_numpy=True)[0]
+        if self.query_cache is None:
+            return self.model.encode([query], convert_to_numpy=True)[0]
+
+        cached = self.query_cache.get(query)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        embedding = self.model.encode([query], convert_to_numpy=True)[0]
+        self.query_cache.put(query, embedding, encode_seconds=time.perf_counter() - start)
+        return embedding
+
+    def encode_queries(self, queries: list[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Genera los embeddings de varias queries en una sola llamada al modelo.
+
+        Con caché, solo se codifican las queries que no estaban cacheadas.
+
+        Returns:
+            Matriz (n_queries, embedding_dim)
+        """
+        if self.query_cache is None:
+            return self.model.encode(queries, batch_size=batch_size, convert_to_numpy=True)
+
+        cached = [self.query_cache.get(query) for query in queries]
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            start = time.perf_counter()
+            encoded = self.model.encode(
+                [queries[i] for i in missing], batch_size=batch_size, convert_to_numpy=True
+            )
+            per_query = (time.perf_counter() - start) / len(missing)
+            for i, vector in zip(missing, encoded):
+                self.query_cache.put(queries[i], vector, encode_seconds=per_query)
+                cached[i] = vector
+
+        return np.stack(cached) if cached else np.empty((0, 0), dtype=np.float32)
 
     def cosine_similarity(
         self,
         query_embedding: np.ndarray,
-        corpus_embeddings: np.ndarray
+        corpus_embeddings: np.ndarray,
+        normalized: bool = False
     ) -> np.ndarray:
         """
         Calcula similitud coseno entre query y corpus.
@@ -114,13 +233,18 @@ class EmbeddingEngine:
         Args:
             query_embedding: Embedding de la query (embedding_dim,)
             corpus_embeddings: Matriz de embeddings del corpus (n, embedding_dim)
+            normalized: El corpus ya tiene norma L2 = 1 (evita normalizar y
+                        copiar la matriz completa en cada query)
 
         Returns:
             Array de scores de similitud (n,)
         """
         # Normalizar
         query_norm = query_embedding / np.linalg.norm(query_embedding)
-        corpus_norm = corpus_embeddings / np.linalg.norm(corpus_embeddings, axis=1, keepdims=True)
+        if normalized:
+            corpus_norm = corpus_embeddings
+        else:
+            corpus_norm = corpus_embeddings / np.linalg.norm(corpus_embeddings, axis=1, keepdims=True)
 
         # Similitud coseno
         similarities = np.dot(corpus_norm, query_norm)
@@ -132,7 +256,9 @@ class EmbeddingEngine:
         query: str,
         corpus_embeddings: np.ndarray,
         corpus_ids: list[int],
-        top_k: int = 10
+        top_k: int = 10,
+        normalized: bool = False,
+        mask: Optional[np.ndarray] = None
     ) -> list[tuple[int, float]]:
         """
         Busca los documentos más similares a la query.
@@ -142,6 +268,8 @@ class EmbeddingEngine:
             corpus_embeddings: Matriz de embeddings del corpus
             corpus_ids: IDs correspondientes a cada embedding
             top_k: Número de resultados a devolver
+            normalized: El corpus ya está normalizado (ver cosine_similarity)
+            mask: bool (n,): solo se devuelven las filas a True
 
         Returns:
             Lista de tuplas (id, score) ordenados por similitud descendente
@@ -153,21 +281,226 @@ class EmbeddingEngine:
         query_embedding = self.encode_query(query)
 
         # Calcular similitudes
-        similarities = self.cosine_similarity(query_embedding, corpus_embeddings)
+        similarities = self.cosine_similarity(query_embedding, corpus_embeddings, normalized=normalized)
+        if mask is not None:
+            similarities[~mask] = -np.inf
+            top_k = min(top_k, int(mask.sum()))
 
         # Obtener top_k índices
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        top_indices = top_k_indices(similarities, top_k)
 
         # Devolver (id, score)
         results = [
-            (corpus_ids[idx], float(similarities[idx]))
+            (int(corpus_ids[idx]), float(similarities[idx]))
             for idx in top_indices
         ]
 
         return results
 
+    def search_batch(
+        self,
+        queries: list[str],
+        corpus_embeddings: np.ndarray,
+        corpus_ids: list[int],
+        top_k: int = 10,
+        normalized: bool = False
+    ) -> list[list[tuple[int, float]]]:
+        """
+        Versión de search para varias queries: un único encode y un producto
+        matriz-matriz contra el corpus.
+
+        Returns:
+            Una lista de tuplas (id, score) por query, en el mismo orden
+        """
+        if not queries:
+            return []
+        if len(corpus_embeddings) == 0:
+            return [[] for _ in queries]
+
+        return self.search_embeddings(
+            self.encode_queries(queries), corpus_embeddings, corpus_ids,
+            top_k=top_k, normalized=normalized
+        )
+
+    def search_embeddings(
+        self,
+        query_embeddings: np.ndarray,
+        corpus_embeddings: np.ndarray,
+        corpus_ids: list[int],
+        top_k: int = 10,
+        normalized: bool = False,
+        max_block_bytes: int = 256 * 1024 * 1024,
+        mask: Optional[np.ndarray] = None
+    ) -> list[list[tuple[int, float]]]:
+        """
+        Top-k de varias queries ya codificadas.
+
+        Las queries se procesan en bloques para que la matriz de scores
+        (bloque × corpus) no supere max_block_bytes. Con mask (bool (n,))
+        solo se devuelven las filas a True.
+        """
+        queries = query_embeddings / np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+        queries = queries.astype(np.float32, copy=False)
+        if not normalized:
+            corpus_embeddings = corpus_embeddings / np.linalg.norm(corpus_embeddings, axis=1, keepdims=True)
+
+        if mask is not None:
+            top_k = min(top_k, int(mask.sum()))
+
+        block = max(1, max_block_bytes // (4 * len(corpus_embeddings)))
+        results = []
+        for start in range(0, len(queries), block):
+            scores = queries[start:start + block] @ corpus_embeddings.T
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+            top = top_k_indices_rows(scores, top_k)
+            for row_scores, row_top in zip(scores, top):
+                results.append([(int(corpus_ids[idx]), float(row_scores[idx])) for idx in row_top])
+
+        return results
+
+
+T = TypeVar("T")
+
+# Variables que fijan los hilos de OpenMP/BLAS; se leen al importar numpy/torch
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+@contextmanager
+def _worker_thread_env(threads: int) -> Iterator[None]:
+    """
+    Fija los hilos de OpenMP/BLAS en el entorno del proceso principal mientras
+    se lanzan los procesos del pool. Con spawn, cada proceso importa numpy (al
+    deserializar el inicializador) antes de ejecutar código propio, así que
+    las variables tienen que heredarse ya puestas. Los valores definidos por
+    el usuario se respetan.
+    """
+    added = [var for var in _THREAD_ENV_VARS if var not in os.environ]
+    for var in added:
+        os.environ[var] = str(threads)
+    try:
+        yield
+    finally:
+        for var in added:
+            os.environ.pop(var, None)
+
+
+def _init_encode_worker(model_name: str, backend: str, onnx_dir: Optional[Path], threads: int) -> None:
+    """Inicializador de cada proceso del pool: reparte los cores y carga su modelo"""
+    # torch fija su pool de hilos al importarse; se ajusta también por si el
+    # entorno no llegó a tiempo
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    get_model(model_name, backend=backend, onnx_dir=onnx_dir)
+
+
+def _encode_in_worker(texts: list[str], batch_size: int) -> np.ndarray:
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    return _model.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+
+
+def iter_encoded_chunks(
+    chunks: Iterable[T],
+    get_texts: Callable[[T], list[str]],
+    model_name: str,
+    batch_size: int = 32,
+    workers: int = 2,
+    backend: str = "sentence-transformers",
+    onnx_dir: Optional[Path] = None
+) -> Iterator[tuple[T, np.ndarray]]:
+    """
+    Codifica bloques en un pool de procesos y genera (bloque, embeddings) en orden.
+
+    Cada proceso (spawn) carga su propio modelo y usa cpu_count / workers
+    hilos. Hay como mucho 2·workers bloques en vuelo: los siguientes se
+    codifican mientras el consumidor guarda el actual, sin acumular el corpus.
+
+    Args:
+        chunks: Bloques a codificar, en orden
+        get_texts: Función que extrae los textos de cada bloque
+        workers: Número de procesos
+    """
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"Codificando con {workers} procesos de {threads} hilo(s)")
+
+    # Los procesos se lanzan según se envían bloques: el entorno con los hilos
+    # limitados se mantiene mientras el pool está abierto
+    with _worker_thread_env(threads), ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_encode_worker,
+        initargs=(model_name, backend, onnx_dir, threads),
+    ) as executor:
+        pending = deque()
+        chunk_iter = iter(chunks)
+
+        def submit_next() -> None:
+            chunk = next(chunk_iter, None)
+            if chunk is not None:
+                pending.append((chunk, executor.submit(
+                    _encode_in_worker, get_texts(chunk), batch_size
+                )))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        # Los resultados se consumen en el orden de los bloques
+        while pending:
+            chunk, future = pending.popleft()
+            embeddings = future.result()
+            submit_next()
+            yield chunk, embeddings
+
+
+def _benchmark_vector_search(sizes=(100_000, 1_000_000), dim: int = 384, top_k: int = 30, n_queries: int = 20) -> None:
+    """Latencia y memoria por query: normalizar + argsort vs corpus normalizado + argpartition"""
+    import time
+    import tracemalloc
+
+    engine = EmbeddingEngine()
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+
+    for n in sizes:
+        corpus = rng.standard_normal((n, dim), dtype=np.float32)
+
+        def legacy(q):
+            scores = engine.cosine_similarity(q, corpus)
+            return np.argsort(scores)[::-1][:top_k]
+
+        def prenormalized(q):
+            scores = engine.cosine_similarity(q, normalized_corpus, normalized=True)
+            return top_k_indices(scores, top_k)
+
+        normalized_corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+
+        for label, fn in (("normalizar + argsort", legacy), ("normalizado + argpartition", prenormalized)):
+            fn(queries[0])  # calentamiento
+            tracemalloc.start()
+            start = time.perf_counter()
+            for q in queries:
+                top = fn(q)
+            elapsed = (time.perf_counter() - start) / n_queries
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{n:>9,} vectores | {label:<27} | {elapsed * 1000:8.2f} ms/query | "
+                  f"pico asignado {peak / 1024 / 1024:8.1f} MB")
+
+        assert set(legacy(queries[0])) == set(prenormalized(queries[0]))
+        del corpus, normalized_corpus
+
 
 if __name__ == "__main__":
+    import sys
+
+    if "--bench" in sys.argv:
+        _benchmark_vector_search()
+        sys.exit(0)
+
     # Test básico
     logging.basicConfig(level=logging.INFO)
 
@@ -0,0 +1,193 @@
+"""
+Planificación de los bloques de generate-embeddings
+
+Antes de codificar un bloque de mensajes:
+
+- Se omiten (opcionalmente) los de bajo valor según es_mensaje_bajo_valor.
+- Cada text_clean distinto se codifica una sola vez: los repetidos dentro del
+  bloque, los de bloques recientes y los que ya tienen un embedding guardado
+  con el mismo text_hash reutilizan ese vector.
+- Los textos a codificar se ordenan por longitud, para que cada batch agrupe
+  textos parecidos y el padding sea mínimo (los backends ya ordenan así lo que
+  reciben en encode(); el orden solo fija cómo se reparten los vectores).
+
+EncodeStats compara lo hecho con codificar el bloque entero tal cual, como lo
+haría el backend (todos los textos, ordenados por longitud dentro de encode()),
+en forward passes y tokens con padding (estimados por palabras). El ahorro
+viene por tanto de la deduplicación y de los mensajes omitidos.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+
+from ..database.repositories import text_hash
+from ..database.schema import Message
+from .filters import es_mensaje_bajo_valor
+
+# Vectores de bloques recientes que se recuerdan para reutilizar (~30 MB con 384 dim)
+DEFAULT_RECENT_VECTORS = 20_000
+
+# Tope de tokens del modelo: los textos más largos se truncan
+_MAX_SEQ_LENGTH = 128
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokens aproximados de un texto (palabras + tokens especiales, truncado)"""
+    return min(_MAX_SEQ_LENGTH, len(text.split()) + 2)
+
+
+def padded_tokens(lengths: list[int], batch_size: int) -> int:
+    """Tokens procesados por el modelo si cada batch se rellena hasta su texto más largo"""
+    return sum(
+        max(lengths[start:start + batch_size]) * len(lengths[start:start + batch_size])
+        for start in range(0, len(lengths), batch_size)
+    )
+
+
+@dataclass
+class EncodeStats:
+    """Ahorro acumulado de la deduplicación y de omitir mensajes de bajo valor"""
+    batch_size: int = 32
+    messages: int = 0
+    skipped: int = 0
+    duplicates: int = 0   # repetidos dentro del bloque o de bloques recientes
+    reused: int = 0       # con embedding ya guardado para el mismo texto
+    encoded: int = 0
+    batches: int = 0
+    naive_batches: int = 0
+    tokens: int = 0
+    naive_tokens: int = 0
+
+    def summary(self) -> list[str]:
+        def saved(before: int, after: int) -> str:
+            return f"{before} → {after} (-{(1 - after / before) * 100:.0f}%)" if before else "0"
+
+        return [
+            f"{self.messages} mensajes: {self.encoded} textos codificados, "
+            f"{self.duplicates} duplicados, {self.reused} reutilizados de la base de datos, "
+            f"{self.skipped} de bajo valor omitidos",
+            f"Forward passes: {saved(self.naive_batches, self.batches)}",
+            f"Tokens con padding (estimados): {saved(self.naive_tokens, self.tokens)}",
+        ]
+
+
+@dataclass
+class ChunkPlan:
+    """Mensajes de un bloque y los textos únicos que hay que codificar"""
+    processed: int                                              # mensajes del bloque, incluidos los omitidos
+    last_id: int                                                # último id del bloque (checkpoint)
+    messages: list[Message]
+    hashes: list[str]
+    texts: list[str]                                            # a codificar, ordenados por longitud
+    text_hashes: list[str]                                      # text_hash de cada texto a codificar
+    known: dict[str, np.ndarray] = field(default_factory=dict)  # vectores reutilizados
+    skipped_hashes: list[str] = field(default_factory=list)     # text_hash de los de bajo valor omitidos
+
+    def expand(self, encoded: np.ndarray) -> tuple[list[int], np.ndarray, list[str]]:
+        """
+        Reparte los vectores codificados (en el orden de texts) entre todos los
+        mensajes del bloque.
+
+        Returns:
+            (message_ids, matriz de embeddings, text_hashes) alineados
+        """
+        vectors = dict(self.known)
+        vectors.update(zip(self.text_hashes, encoded))
+
+        if not self.messages:
+            return [], np.empty((0, 0), dtype=np.float32), []
+        embeddings = np.stack([vectors[h] for h in self.hashes]).astype(np.float32, copy=False)
+        return [m.id for m in self.messages], embeddings, self.hashes
+
+
+class EncodePlanner:
+    """Genera los ChunkPlan de cada bloque y acumula las estadísticas"""
+
+    def __init__(
+        self,
+        batch_size: int = 32,
+        skip_low_value: bool = False,
+        lookup_existing: Optional[Callable[[list[str]], dict[str, np.ndarray]]] = None,
+        recent_vectors: int = DEFAULT_RECENT_VECTORS
+    ):
+        """
+        Args:
+            skip_low_value: No codificar los mensajes de bajo valor
+            lookup_existing: Busca embeddings ya guardados por text_hash
+                             (None = no reutilizar los de la base de datos)
+            recent_vectors: Vectores de bloques anteriores que se recuerdan
+        """
+        self.batch_size = batch_size
+        self.skip_low_value = skip_low_value
+        self.lookup_existing = lookup_existing
+        self.stats = EncodeStats(batch_size=batch_size)
+        self._recent: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._recent_size = recent_vectors
+
+    def plan(self, chunk: list[Message]) -> ChunkPlan:
+        """Planifica la codificación de un bloque de mensajes"""
+        stats = self.stats
+        stats.messages += len(chunk)
+
+        # Referencia: el backend ordena por longitud todo lo que recibe
+        naive_lengths = sorted((estimate_tokens(m.text_clean or "") for m in chunk), reverse=True)
+        stats.naive_batches += -(-len(chunk) // self.batch_size)
+        stats.naive_tokens += padded_tokens(naive_lengths, self.batch_size)
+
+        skipped_hashes = []
+        if self.skip_low_value:
+            kept = []
+            for message in chunk:
+                if es_mensaje_bajo_valor(message.text_clean):
+                    skipped_hashes.append(text_hash(message.text_clean))
+                else:
+                    kept.append(message)
+            stats.skipped += len(skipped_hashes)
+        else:
+            kept = chunk
+
+        hashes = [text_hash(m.text_clean) for m in kept]
+        unique: dict[str, str] = {}
+        for message, hash_ in zip(kept, hashes):
+            unique.setdefault(hash_, message.text_clean)
+
+        known = {}
+        for hash_ in unique:
+            if hash_ in self._recent:
+                self._recent.move_to_end(hash_)
+                known[hash_] = self._recent[hash_]
+        stats.duplicates += len(kept) - len(unique) + len(known)
+        if self.lookup_existing is not None:
+            missing = [h for h in unique if h not in known]
+            existing = self.lookup_existing(missing) if missing else {}
+            stats.reused += len(existing)
+            known.update(existing)
+
+        pending = sorted(
+            ((h, text) for h, text in unique.items() if h not in known),
+            key=lambda item: estimate_tokens(item[1]), reverse=True
+        )
+        texts = [text for _, text in pending]
+        stats.encoded += len(texts)
+        stats.batches += -(-len(texts) // self.batch_size)
+        stats.tokens += padded_tokens([estimate_tokens(t) for t in texts], self.batch_size)
+
+        return ChunkPlan(
+            processed=len(chunk), last_id=chunk[-1].id if chunk else 0,
+            messages=kept, hashes=hashes, texts=texts,
+            text_hashes=[h for h, _ in pending], known=known,
+            skipped_hashes=skipped_hashes
+        )
+
+    def remember(self, plan: ChunkPlan, encoded: np.ndarray) -> None:
+        """Recuerda los vectores recién codificados para los bloques siguientes"""
+        if self._recent_size <= 0:
+            return
+        for hash_, vector in zip(plan.text_hashes, encoded):
+            self._recent[hash_] = vector
+            self._recent.move_to_end(hash_)
+        while len(self._recent) > self._recent_size:
+            self._recent.popitem(last=False)
@@ -2,10 +2,22 @@
 Filtros para excluir mensajes de bajo valor informativo de los resultados de busqueda.
 
 Filtra monosilabos, risas repetitivas, y mensajes donde todas las palabras son muy cortas.
+
+SearchFilters acota una busqueda por metadatos (fechas, remitentes, tipo,
+usuarios importantes) dentro de ambas ramas: como WHERE en la consulta FTS y
+como mascara sobre los vectores antes del top-k (calculada con los arrays de
+MessageMetadata, sin consultar SQLite).
 """
 
+import json
 import re
-from typing import Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+from ..database.message_metadata import MessageMetadata
 
 # Patron para risas repetitivas: jaja, jejeje, jajajaja, jiji, etc.
 _RISAS_PATTERN = re.compile(r'^(?:j+[aeiou]+)+j*[aeiou]*$', re.IGNORECASE)
@@ -77,3 +89,91 @@ def es_mensaje_bajo_valor(texto: Optional[str]) -> bool:
         return True
 
     return False
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """Filtros de metadatos de una busqueda (inmutable: sirve de clave de cache)"""
+    since: Optional[datetime] = None         # timestamp >= since
+    until: Optional[datetime] = None         # timestamp < until
+    senders: frozenset = frozenset()         # sender_name en el conjunto
+    message_types: frozenset = frozenset()   # message_type en el conjunto
+    important_only: bool = False             # solo is_important_user
+
+    @classmethod
+    def from_options(
+        cls,
+        since: Union[str, datetime, None] = None,
+        until: Union[str, datetime, None] = None,
+        senders: Iterable[str] = (),
+        message_types: Iterable[str] = (),
+        important_only: bool = False
+    ) -> "SearchFilters":
+        """
+        Crea los filtros desde opciones de CLI o de la interfaz.
+
+        Las fechas aceptan AAAA-MM-DD o AAAA-MM-DD HH:MM; una fecha sin hora en
+        until incluye ese dia completo.
+        """
+        until_value = _parse_datetime(until)
+        if until_value is not None and until_value == datetime.combine(until_value.date(), datetime.min.time()):
+            until_value += timedelta(days=1)
+
+        return cls(
+            since=_parse_datetime(since),
+            until=until_value,
+            senders=frozenset(s.strip() for s in senders if s and s.strip()),
+            message_types=frozenset(t.strip() for t in message_types if t and t.strip()),
+            important_only=bool(important_only),
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return (self.since is None and self.until is None and not self.senders
+                and not self.message_types and not self.important_only)
+
+    def to_sql(self, alias: str = "m") -> tuple[str, list]:
+        """
+        Condicion WHERE sobre la tabla messages (con el alias dado).
+
+        Returns:
+            Tupla (sql, parametros); "1" si no hay filtros
+        """
+        clauses, params = [], []
+        if self.since is not None:
+            clauses.append(f"{alias}.timestamp >= ?")
+            params.append(self.since.isoformat(sep=" "))
+        if self.until is not None:
+            clauses.append(f"{alias}.timestamp < ?")
+            params.append(self.until.isoformat(sep=" "))
+        if self.senders:
+            clauses.append(f"{alias}.sender_name IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(sorted(self.senders), ensure_ascii=False))
+        if self.message_types:
+            clauses.append(f"{alias}.message_type IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(sorted(self.message_types)))
+        if self.important_only:
+            clauses.append(f"{alias}.is_important_user = 1")
+        return " AND ".join(clauses) or "1", params
+
+    def to_mask(self, metadata: MessageMetadata) -> np.ndarray:
+        """Mascara bool alineada con metadata (y VectorStore.ids) equivalente a to_sql()"""
+        return metadata.mask(
+            since=self.since,
+            until=self.until,
+            senders=self.senders,
+            message_types=self.message_types,
+            important_only=self.important_only,
+        )
+
+
+def _parse_datetime(value: Union[str, datetime, None]) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Fecha no valida: '{value}' (usa AAAA-MM-DD o AAAA-MM-DD HH:MM)")
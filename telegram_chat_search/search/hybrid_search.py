@@ -2,6 +2,10 @@
 Motor de búsqueda híbrida que combina búsqueda vectorial (semántica) con FTS5 (keywords)
 """
 
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
@@ -9,11 +13,97 @@ import numpy as np
 import logging
 
 from ..database.schema import Message
-from ..database.repositories import MessageRepository, EmbeddingRepository
+from ..database.repositories import MessageRepository, EmbeddingRepository, DEFAULT_MESSAGE_CACHE_SIZE
+from ..database.vector_store import VectorStore, load_vector_store
+from ..database.message_metadata import MessageMetadata, load_message_metadata
 from .embeddings import EmbeddingEngine
+from .filters import SearchFilters
+from .query_cache import QueryEmbeddingCache, DEFAULT_QUERY_CACHE_SIZE
+from .result_cache import SearchResultCache, result_cache_key, DEFAULT_RESULT_CACHE_SIZE, DEFAULT_RESULT_CACHE_TTL
+from .ivf_index import IVFIndex, load_ivf_index, DEFAULT_NPROBE
+from .quantization import QuantizedVectors, load_quantized, search_quantized, TIERS, DEFAULT_RESCORE_FACTOR
 
 logger = logging.getLogger(__name__)
 
+# Hilos compartidos por todas las instancias para las dos ramas de la búsqueda
+DEFAULT_SEARCH_WORKERS = 4
+# Plazo por defecto (segundos) de cada rama de una búsqueda híbrida
+DEFAULT_LEG_TIMEOUT = 2.0
+
+# Máscaras de filtros recientes que se conservan (una por combinación de filtros)
+_MASK_CACHE_SIZE = 16
+# Si los filtros dejan menos de esta fracción de vectores, la búsqueda exacta
+# puntúa solo esas filas en lugar de todo el corpus
+_SELECTIVE_FILTER = 0.25
+
+_search_pool: Optional[ThreadPoolExecutor] = None
+_search_pool_lock = threading.Lock()
+
+# Ramas que superaron su plazo pero siguen ejecutándose: un hilo en marcha no
+# se puede cancelar y sigue ocupando el pool hasta que termina
+_abandoned_legs = 0
+_abandoned_lock = threading.Lock()
+# Con tantas ramas abandonadas en curso la rama vectorial no se lanza (solo
+# FTS, en el hilo de la llamada) para no encolar más trabajo detrás de ellas
+_MAX_ABANDONED_LEGS = DEFAULT_SEARCH_WORKERS - 2
+
+
+def get_search_pool(max_workers: int = DEFAULT_SEARCH_WORKERS) -> ThreadPoolExecutor:
+    """
+    Pool de hilos compartido para ejecutar en paralelo la rama vectorial
+    (inferencia y numpy) y la FTS (SQLite): ambas liberan el GIL casi todo
+    el tiempo.
+    """
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hybrid-search")
+        return _search_pool
+
+
+def _abandon_leg(future: Future) -> None:
+    """Cuenta una rama en curso que se deja de esperar hasta que termine"""
+    global _abandoned_legs
+    with _abandoned_lock:
+        _abandoned_legs += 1
+    future.add_done_callback(_release_leg)
+
+
+def _release_leg(future: Future) -> None:
+    global _abandoned_legs
+    with _abandoned_lock:
+        _abandoned_legs -= 1
+
+
+def abandoned_legs() -> int:
+    """Ramas que superaron su plazo y todavía ocupan un hilo del pool"""
+    with _abandoned_lock:
+        return _abandoned_legs
+
+
+class _Leg:
+    """Rama de una búsqueda enviada al pool; anota cuándo empieza a ejecutarse"""
+
+    def __init__(self, pool: ThreadPoolExecutor, fn, *args):
+        self.started = threading.Event()
+        self.start_time = 0.0
+        self.future = pool.submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        self.start_time = time.monotonic()
+        self.started.set()
+        return fn(*args)
+
+
+@dataclass(frozen=True)
+class _SearchData:
+    """Almacén de vectores, metadatos e índices de una misma versión de los datos"""
+    store: VectorStore
+    metadata: MessageMetadata              # alineados con store.ids
+    ann_index: Optional[IVFIndex]          # None = búsqueda exacta
+    quantized: Optional[QuantizedVectors]  # copia comprimida residente (None = float32)
+    version: tuple[int, int]               # (mensajes, embeddings) con la que se cargó
+
 
 @dataclass
 class SearchResult:
@@ -35,62 +125,343 @@ class HybridSearch:
     def __init__(
         self,
         db_path: Path,
-        model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"
+        model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+        message_cache_size: int = DEFAULT_MESSAGE_CACHE_SIZE,
+        nprobe: int = DEFAULT_NPROBE,
+        vector_tier: str = "float32",
+        rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+        query_cache_size: int = DEFAULT_QUERY_CACHE_SIZE,
+        query_cache_path: Optional[Path] = None,
+        embedding_backend: str = "sentence-transformers",
+        onnx_dir: Optional[Path] = None,
+        vector_timeout: Optional[float] = DEFAULT_LEG_TIMEOUT,
+        fts_timeout: Optional[float] = DEFAULT_LEG_TIMEOUT,
+        result_cache_size: int = DEFAULT_RESULT_CACHE_SIZE,
+        result_cache_ttl: Optional[float] = DEFAULT_RESULT_CACHE_TTL
     ):
         self.db_path = db_path
-        self.message_repo = MessageRepository(db_path)
+        self.message_repo = MessageRepository(db_path, cache_size=message_cache_size)
         self.embedding_repo = EmbeddingRepository(db_path)
-        self.embedding_engine = EmbeddingEngine(model_name)
-
-        # Cache de embeddings en memoria
-        self._corpus_ids: Optional[list[int]] = None
-        self._corpus_embeddings: Optional[np.ndarray] = None
+        self.query_cache = (
+            QueryEmbeddingCache(
+                model_name, max_size=query_cache_size, persist_path=query_cache_path, backend=embedding_backend
+            )
+            if query_cache_size > 0 else None
+        )
+        self.embedding_engine = EmbeddingEngine(
+            model_name, query_cache=self.query_cache, backend=embedding_backend, onnx_dir=onnx_dir
+        )
+        # Rankings de search() completos, invalidados al cambiar los datos
+        self.result_cache = (
+            SearchResultCache(max_size=result_cache_size, ttl=result_cache_ttl)
+            if result_cache_size > 0 else None
+        )
+        self.nprobe = nprobe
+        if vector_tier not in TIERS:
+            raise ValueError(f"Nivel de vectores desconocido: {vector_tier} (usa {', '.join(TIERS)})")
+        self.vector_tier = vector_tier
+        self.rescore_factor = rescore_factor
+        # Plazo de cada rama en search() (None = sin límite)
+        self.vector_timeout = vector_timeout
+        self.fts_timeout = fts_timeout
+        # Ramas que no terminaron a tiempo (la búsqueda siguió sin ellas)
+        self.leg_timeouts = {"vector": 0, "fts": 0}
+        self._leg_timeouts_lock = threading.Lock()
+
+        # Almacén, metadatos e índices cargados (None = sin cargar). Se
+        # sustituyen enteros al recargar: cada búsqueda trabaja con el
+        # _SearchData que leyó al empezar
+        self._data: Optional[_SearchData] = None
+        # (filtros, versiones de los metadatos) -> (máscara de mensajes, máscara de vectores)
+        self._masks: OrderedDict[tuple, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self._masks_lock = threading.Lock()
+        self._load_lock = threading.Lock()
 
     def load_embeddings(self) -> None:
-        """Carga todos los embeddings en memoria para búsqueda rápida"""
-        logger.info("Cargando embeddings en memoria...")
-        self._corpus_ids, self._corpus_embeddings = self.embedding_repo.get_all_embeddings()
-        logger.info(f"Cargados {len(self._corpus_ids)} embeddings")
-
-    def _ensure_embeddings_loaded(self) -> None:
-        """Asegura que los embeddings están cargados"""
-        if self._corpus_ids is None or self._corpus_embeddings is None:
-            self.load_embeddings()
-
-    def vector_search(self, query: str, top_k: int = 20) -> list[tuple[int, float]]:
+        """Abre el almacén de vectores en disco (np.memmap, ya normalizados)"""
+        with self._load_lock:
+            self._load()
+
+    def _load(self) -> _SearchData:
+        # Con _load_lock adquirido
+        logger.info("Cargando embeddings...")
+        # Versión leída antes de cargar: si cambia durante la carga se recargará
+        data_version = self.message_repo.get_data_version()
+        store = load_vector_store(self.db_path)
+        metadata = load_message_metadata(self.db_path, store)
+        ann_index = load_ivf_index(self.db_path, store) if len(store) else None
+        quantized = None
+        if ann_index is None and self.vector_tier != "float32" and len(store):
+            quantized = load_quantized(self.db_path, store, self.vector_tier)
+            logger.info(f"Nivel {self.vector_tier}: {quantized.nbytes / 1024 / 1024:.1f} MB en memoria")
+
+        # Todo se sustituye a la vez, en una sola asignación
+        data = _SearchData(store, metadata, ann_index, quantized, data_version)
+        self._data = data
+        with self._masks_lock:
+            self._masks.clear()
+        logger.info(f"Cargados {len(store.ids)} embeddings ({store.n_vectors} vectores únicos)")
+        return data
+
+    def _ensure_embeddings_loaded(self, data_version: Optional[tuple[int, int]] = None) -> _SearchData:
+        """
+        Datos cargados para una búsqueda. Si se indica data_version, se
+        recargan almacén y metadatos cuando no corresponden a esa versión de
+        los datos (otro proceso importó mensajes o generó embeddings).
+        """
+        data = self._data
+        if data is not None and (data_version is None or data_version == data.version):
+            return data
+        with self._load_lock:
+            data = self._data
+            if data is None:
+                return self._load()
+            if data_version is not None and data_version != data.version:
+                logger.info("Los datos cambiaron en la base de datos, recargando almacén y metadatos")
+                return self._load()
+            return data
+
+    def vector_search(
+        self,
+        query: str,
+        top_k: int = 20,
+        filters: Optional[SearchFilters] = None
+    ) -> list[tuple[int, float]]:
         """
         Búsqueda puramente vectorial (semántica).
 
+        Args:
+            filters: Solo se puntúan los vectores de mensajes que los cumplen
+
         Returns:
             Lista de tuplas (message_id, score)
         """
-        self._ensure_embeddings_loaded()
+        return self._vector_search(self._ensure_embeddings_loaded(), query, top_k, filters)
 
-        if len(self._corpus_embeddings) == 0:
+    def _vector_search(
+        self,
+        data: _SearchData,
+        query: str,
+        top_k: int,
+        filters: Optional[SearchFilters]
+    ) -> list[tuple[int, float]]:
+        if len(data.store.vectors) == 0:
             logger.warning("No hay embeddings disponibles")
             return []
 
+        masks = self._filter_masks(data, filters)
+        if masks is not None and not masks[1].any():
+            return []
+
+        if data.ann_index is not None or data.quantized is not None:
+            return self._indexed_search(data, self.embedding_engine.encode_query(query), top_k, masks)
+
+        # Se puntúan los vectores únicos y cada acierto se expande a sus mensajes
+        corpus, rows, mask = self._exact_corpus(data, masks)
         results = self.embedding_engine.search(
             query,
-            self._corpus_embeddings,
-            self._corpus_ids,
-            top_k=top_k
+            corpus,
+            rows,
+            top_k=top_k,
+            normalized=True,
+            mask=mask
+        )
+
+        return self._expand(data, results, top_k, masks)
+
+    def vector_search_batch(
+        self,
+        queries: list[str],
+        top_k: int = 20,
+        filters: Optional[SearchFilters] = None
+    ) -> list[list[tuple[int, float]]]:
+        """
+        Búsqueda vectorial de varias queries con un único encode del modelo.
+
+        Sin índice ni nivel comprimido, todas se puntúan con un producto
+        matriz-matriz contra el corpus.
+
+        Returns:
+            Una lista de tuplas (message_id, score) por query
+        """
+        return self._vector_search_batch(self._ensure_embeddings_loaded(), queries, top_k, filters)
+
+    def _vector_search_batch(
+        self,
+        data: _SearchData,
+        queries: list[str],
+        top_k: int,
+        filters: Optional[SearchFilters]
+    ) -> list[list[tuple[int, float]]]:
+        if not queries:
+            return []
+        if len(data.store.vectors) == 0:
+            logger.warning("No hay embeddings disponibles")
+            return [[] for _ in queries]
+
+        masks = self._filter_masks(data, filters)
+        if masks is not None and not masks[1].any():
+            return [[] for _ in queries]
+
+        query_embeddings = self.embedding_engine.encode_queries(queries)
+
+        if data.ann_index is not None or data.quantized is not None:
+            return [self._indexed_search(data, q, top_k, masks) for q in query_embeddings]
+
+        corpus, rows, mask = self._exact_corpus(data, masks)
+        batch_results = self.embedding_engine.search_embeddings(
+            query_embeddings,
+            corpus,
+            rows,
+            top_k=top_k,
+            normalized=True,
+            mask=mask
         )
+        return [self._expand(data, results, top_k, masks) for results in batch_results]
+
+    def _filter_masks(
+        self,
+        data: _SearchData,
+        filters: Optional[SearchFilters]
+    ) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """
+        Máscaras (mensajes, vectores) del almacén para unos filtros, o None si
+        no hay filtros. Se calculan sobre los metadatos en memoria y se
+        cachean por filtros y versión de los metadatos.
+        """
+        if filters is None or filters.is_empty:
+            return None
+
+        key = (filters, data.metadata.store_version, data.metadata.messages_version)
+        with self._masks_lock:
+            masks = self._masks.get(key)
+            if masks is not None:
+                self._masks.move_to_end(key)
+                return masks
+
+        message_mask = filters.to_mask(data.metadata)
+        masks = (message_mask, data.store.vector_mask(message_mask))
+        with self._masks_lock:
+            self._masks[key] = masks
+            while len(self._masks) > _MASK_CACHE_SIZE:
+                self._masks.popitem(last=False)
+        logger.debug(f"Filtros: {int(masks[0].sum())} mensajes, {int(masks[1].sum())} vectores")
+        return masks
+
+    def _exact_corpus(
+        self,
+        data: _SearchData,
+        masks: Optional[tuple[np.ndarray, np.ndarray]]
+    ) -> tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Corpus a puntuar en la búsqueda exacta: (vectores, fila de cada vector,
+        máscara para el motor). Con filtros selectivos solo se leen las filas
+        permitidas; con filtros amplios se puntúa todo y se enmascara.
+        """
+        vectors = data.store.vectors
+        all_rows = np.arange(data.store.n_vectors)
+        if masks is None:
+            return vectors, all_rows, None
+
+        vector_mask = masks[1]
+        if vector_mask.mean() < _SELECTIVE_FILTER:
+            rows = np.flatnonzero(vector_mask)
+            return vectors[rows], rows, None
+        return vectors, all_rows, vector_mask
+
+    def _expand(
+        self,
+        data: _SearchData,
+        row_results: list[tuple[int, float]],
+        top_k: int,
+        masks: Optional[tuple[np.ndarray, np.ndarray]] = None
+    ) -> list[tuple[int, float]]:
+        """(fila de vector, score) -> (message_id, score) de todos los mensajes de cada fila"""
+        if not row_results:
+            return []
+        rows, scores = zip(*row_results)
+        return data.store.expand(rows, scores, top_k, masks[0] if masks is not None else None)
 
+    def _indexed_search(
+        self,
+        data: _SearchData,
+        query_embedding: np.ndarray,
+        top_k: int,
+        masks: Optional[tuple[np.ndarray, np.ndarray]] = None
+    ) -> list[tuple[int, float]]:
+        """
+        Búsqueda con el índice IVF o el nivel comprimido cargado.
+
+        Los filtros solo descartan candidatos de las listas exploradas (o de
+        la preselección comprimida): con filtros selectivos, o si tras
+        filtrar quedan menos de top_k resultados, se recurre a la búsqueda
+        exacta sobre las filas permitidas.
+        """
+        message_mask, vector_mask = masks if masks is not None else (None, None)
+        if vector_mask is not None and vector_mask.mean() < _SELECTIVE_FILTER:
+            return self._exact_search(data, query_embedding, top_k, masks)
+
+        if data.ann_index is not None:
+            results = data.ann_index.search(
+                data.store, query_embedding, top_k=top_k, nprobe=self.nprobe,
+                vector_mask=vector_mask, message_mask=message_mask
+            )
+        else:
+            results = search_quantized(
+                data.store, data.quantized, query_embedding,
+                top_k=top_k, rescore_factor=self.rescore_factor,
+                vector_mask=vector_mask, message_mask=message_mask
+            )
+
+        if masks is not None and len(results) < top_k:
+            return self._exact_search(data, query_embedding, top_k, masks)
         return results
 
-    def fts_search(self, query: str, top_k: int = 20) -> list[tuple[int, float]]:
+    def _exact_search(
+        self,
+        data: _SearchData,
+        query_embedding: np.ndarray,
+        top_k: int,
+        masks: Optional[tuple[np.ndarray, np.ndarray]] = None
+    ) -> list[tuple[int, float]]:
+        """Búsqueda exacta de una query ya codificada (solo filas permitidas por los filtros)"""
+        corpus, rows, mask = self._exact_corpus(data, masks)
+        results = self.embedding_engine.search_embeddings(
+            query_embedding[np.newaxis, :], corpus, rows, top_k=top_k, normalized=True, mask=mask
+        )[0]
+        return self._expand(data, results, top_k, masks)
+
+
+    def fts_search(
+        self,
+        query: str,
+        top_k: int = 20,
+        filters: Optional[SearchFilters] = None
+    ) -> list[tuple[int, float]]:
         """
         Búsqueda Full-Text Search con FTS5.
 
+        Args:
+            filters: Se añaden como condición WHERE a la consulta FTS
+
         Returns:
             Lista de tuplas (message_id, score)
         """
-        results = self.message_repo.fts_search(query, limit=top_k)
+        where_sql, where_params = filters.to_sql() if filters is not None else ("1", [])
+
+        # El repositorio cachea las filas completas, así que hidratar estos
+        # resultados no vuelve a consultar la base de datos
+        results = self.message_repo.fts_search(
+            query, limit=top_k, where_sql=where_sql, where_params=where_params
+        )
 
         # Convertir a formato (id, score)
         return [(msg.id, abs(score)) for msg, score in results]
 
+    def _hydrate(self, message_ids) -> dict[int, Message]:
+        """Carga los mensajes de los resultados en una sola consulta"""
+        return {msg.id: msg for msg in self.message_repo.get_messages(message_ids)}
+
     def rrf_fusion(
         self,
         vector_results: list[tuple[int, float]],
@@ -131,7 +502,8 @@ class HybridSearch:
         query: str,
         top_k: int = 15,
         vector_weight: float = 0.6,
-        fts_weight: float = 0.4
+        fts_weight: float = 0.4,
+        filters: Optional[SearchFilters] = None
     ) -> list[SearchResult]:
         """
         Búsqueda híbrida combinando vectorial y FTS.
@@ -141,61 +513,182 @@ class HybridSearch:
             top_k: Número de resultados a devolver
             vector_weight: Peso para resultados vectoriales (0-1)
             fts_weight: Peso para resultados FTS (0-1)
+            filters: Filtros de metadatos aplicados dentro de ambas ramas
 
         Returns:
             Lista de SearchResult ordenados por relevancia
         """
         logger.info(f"Búsqueda híbrida: '{query}'")
 
-        # Búsqueda vectorial
-        vector_results = self.vector_search(query, top_k=top_k * 2)
-        logger.debug(f"Resultados vectoriales: {len(vector_results)}")
+        # La carga del almacén (o su recarga si cambiaron los datos) y del
+        # modelo no cuenta para el plazo
+        data_version = self.message_repo.get_data_version()
+        data = self._ensure_embeddings_loaded(data_version)
+
+        if self.result_cache is not None:
+            cache_key = result_cache_key(query, top_k, filters, vector_weight, fts_weight)
+            ranked = self.result_cache.get(cache_key, data_version)
+            if ranked is not None:
+                logger.info(f"Devolviendo {len(ranked)} resultados de la caché")
+                return self._build_results(ranked, self._hydrate(msg_id for msg_id, _, _ in ranked))
+
+        if len(data.store.vectors):
+            self.embedding_engine.warm_up()
+
+        start = time.monotonic()
+        if abandoned_legs() >= _MAX_ABANDONED_LEGS:
+            # El pool sigue ocupado por ramas vectoriales lentas de búsquedas
+            # anteriores: se responde solo con FTS sin esperar a un hilo libre
+            self._record_leg_timeout("vector", f"{abandoned_legs()} ramas abandonadas siguen en curso")
+            vector_results = None
+            fts_results = self.fts_search(query, top_k * 2, filters)
+        else:
+            # Ambas ramas en paralelo: la latencia tiende a max(ramas) en lugar de la suma
+            pool = get_search_pool()
+            vector_leg = _Leg(pool, self._vector_search, data, query, top_k * 2, filters)
+            fts_leg = _Leg(pool, self.fts_search, query, top_k * 2, filters)
+
+            # Si la rama vectorial no llega a tiempo, la búsqueda queda solo con FTS
+            fts_results = self._leg_result(fts_leg, "fts", self.fts_timeout)
+            vector_results = self._leg_result(vector_leg, "vector", self.vector_timeout)
+
+        complete = vector_results is not None and fts_results is not None
+        vector_results = vector_results or []
+        fts_results = fts_results or []
+        logger.debug(f"Resultados FTS: {len(fts_results)}, vectoriales: {len(vector_results)}")
+
+        ranked = self._rank(vector_results, fts_results, top_k)
+
+        # Un ranking sin alguna de las ramas (plazo superado) no se cachea
+        if self.result_cache is not None and complete:
+            self.result_cache.put(cache_key, data.version, ranked, time.monotonic() - start)
+
+        results = self._build_results(ranked, self._hydrate(msg_id for msg_id, _, _ in ranked))
 
-        # Búsqueda FTS
-        fts_results = self.fts_search(query, top_k=top_k * 2)
-        logger.debug(f"Resultados FTS: {len(fts_results)}")
+        logger.info(f"Devolviendo {len(results)} resultados")
+        return results
 
-        # Combinar con RRF
+    def _leg_result(
+        self,
+        leg: _Leg,
+        name: str,
+        timeout: Optional[float]
+    ) -> Optional[list[tuple[int, float]]]:
+        """
+        Resultado de una rama, o None si no termina a tiempo. El plazo cuenta
+        desde que la rama empieza a ejecutarse, no desde que se encola: con el
+        pool ocupado se espera como mucho otro plazo a que empiece y, si no
+        lo hace, se cancela (una rama en cola sí se puede cancelar).
+        """
+        if timeout is None:
+            return leg.future.result()
+
+        if not leg.started.wait(timeout) and leg.future.cancel():
+            self._record_leg_timeout(name, f"no empezó en {timeout:.2f}s (pool ocupado)")
+            return None
+
+        # cancel() falla si la rama ya empezó entre medias
+        leg.started.wait()
+        remaining = max(0.0, leg.start_time + timeout - time.monotonic())
+        try:
+            return leg.future.result(timeout=remaining)
+        except FutureTimeoutError:
+            # Ya en ejecución no se puede cancelar: queda abandonada hasta que termine
+            _abandon_leg(leg.future)
+            self._record_leg_timeout(name, f"superó {timeout:.2f}s")
+            return None
+
+    def _record_leg_timeout(self, name: str, reason: str) -> None:
+        with self._leg_timeouts_lock:
+            self.leg_timeouts[name] += 1
+        logger.warning(f"La rama {name} {reason}, se continúa sin ella")
+
+    def search_batch(
+        self,
+        queries: list[str],
+        top_k: int = 15,
+        filters: Optional[SearchFilters] = None
+    ) -> list[list[SearchResult]]:
+        """
+        Búsqueda híbrida de varias queries (evaluación offline, replay de logs,
+        pre-calentado). La parte vectorial se resuelve en lote y todos los
+        mensajes se hidratan con una sola consulta. No usa la caché de
+        resultados: cada lote se calcula de nuevo.
+
+        Returns:
+            Una lista de SearchResult por query, en el mismo orden
+        """
+        logger.info(f"Búsqueda híbrida en lote: {len(queries)} queries")
+        data = self._ensure_embeddings_loaded(self.message_repo.get_data_version())
+
+        # Las FTS se resuelven mientras la rama vectorial codifica el lote
+        vector_future = get_search_pool().submit(self._vector_search_batch, data, queries, top_k * 2, filters)
+        fts_results = [self.fts_search(query, top_k=top_k * 2, filters=filters) for query in queries]
+        rankings = [
+            self._rank(vector, fts, top_k)
+            for vector, fts in zip(vector_future.result(), fts_results)
+        ]
+
+        messages = self._hydrate(msg_id for ranked in rankings for msg_id, _, _ in ranked)
+        return [self._build_results(ranked, messages) for ranked in rankings]
+
+    def _rank(
+        self,
+        vector_results: list[tuple[int, float]],
+        fts_results: list[tuple[int, float]],
+        top_k: int
+    ) -> list[tuple[int, float, str]]:
+        """
+        Combina ambos resultados con RRF.
+
+        Returns:
+            Lista de (message_id, score combinado, match_type) de los top_k
+        """
         combined_scores = self.rrf_fusion(vector_results, fts_results)
 
         # Ordenar por score combinado
         sorted_ids = sorted(combined_scores.keys(), key=lambda x: combined_scores[x], reverse=True)
 
-        # Obtener mensajes y crear resultados
-        results = []
         vector_ids = {msg_id for msg_id, _ in vector_results}
         fts_ids = {msg_id for msg_id, _ in fts_results}
 
+        ranked = []
         for msg_id in sorted_ids[:top_k]:
-            message = self.message_repo.get_message(msg_id)
-            if message:
-                # Determinar tipo de match
-                in_vector = msg_id in vector_ids
-                in_fts = msg_id in fts_ids
+            # Determinar tipo de match
+            in_vector = msg_id in vector_ids
+            in_fts = msg_id in fts_ids
 
-                if in_vector and in_fts:
-                    match_type = 'hybrid'
-                elif in_vector:
-                    match_type = 'vector'
-                else:
-                    match_type = 'fts'
+            if in_vector and in_fts:
+                match_type = 'hybrid'
+            elif in_vector:
+                match_type = 'vector'
+            else:
+                match_type = 'fts'
 
-                results.append(SearchResult(
-                    message=message,
-                    score=combined_scores[msg_id],
-                    match_type=match_type
-                ))
+            ranked.append((msg_id, combined_scores[msg_id], match_type))
 
-        logger.info(f"Devolviendo {len(results)} resultados")
-        return results
+        return ranked
+
+    def _build_results(
+        self,
+        ranked: list[tuple[int, float, str]],
+        messages: dict[int, Message]
+    ) -> list[SearchResult]:
+        """Crea los SearchResult de un ranking con los mensajes ya hidratados"""
+        return [
+            SearchResult(message=messages[msg_id], score=score, match_type=match_type)
+            for msg_id, score, match_type in ranked
+            if msg_id in messages
+        ]
 
     def semantic_search_only(self, query: str, top_k: int = 15) -> list[SearchResult]:
         """Búsqueda solo semántica (sin FTS)"""
         vector_results = self.vector_search(query, top_k=top_k)
+        messages = self._hydrate(msg_id for msg_id, _ in vector_results)
 
         results = []
         for msg_id, score in vector_results:
-            message = self.message_repo.get_message(msg_id)
+            message = messages.get(msg_id)
             if message:
                 results.append(SearchResult(
                     message=message,
@@ -208,10 +701,11 @@ class HybridSearch:
     def keyword_search_only(self, query: str, top_k: int = 15) -> list[SearchResult]:
         """Búsqueda solo por keywords (FTS)"""
         fts_results = self.fts_search(query, top_k=top_k)
+        messages = self._hydrate(msg_id for msg_id, _ in fts_results)
 
         results = []
         for msg_id, score in fts_results:
-            message = self.message_repo.get_message(msg_id)
+            message = messages.get(msg_id)
             if message:
                 results.append(SearchResult(
                     message=message,
@@ -0,0 +1,257 @@
+"""
+Índice aproximado (IVF) para búsqueda semántica sublineal
+
+Inverted file index: los vectores del almacén se agrupan con k-means esférico
+(numpy) en nlist listas alrededor de sus centroides. Una query solo se compara
+con los vectores de las nprobe listas cuyos centroides están más cerca, en
+lugar de con el corpus completo.
+
+El índice se guarda junto al almacén de vectores (<db>.vectors/ivf.npz) con la
+versión del almacén con la que se construyó; si los embeddings cambian queda
+desactualizado y la búsqueda vuelve a ser exacta hasta reconstruirlo con
+`build-ann-index`.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import logging
+
+import numpy as np
+
+from ..database.vector_store import VectorStore, vector_store_path
+from .embeddings import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+_INDEX_FILE = "ivf.npz"
+
+DEFAULT_NPROBE = 8
+
+
+@dataclass
+class IVFIndex:
+    """Listas invertidas sobre las filas de un VectorStore"""
+    centroids: np.ndarray  # float32 (nlist, dim), normalizados
+    offsets: np.ndarray    # int64 (nlist + 1,): la lista i son rows[offsets[i]:offsets[i + 1]]
+    rows: np.ndarray       # int64 (n,): filas del almacén agrupadas por lista
+    store_version: int
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def search(
+        self,
+        store: VectorStore,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        nprobe: int = DEFAULT_NPROBE,
+        vector_mask: Optional[np.ndarray] = None,
+        message_mask: Optional[np.ndarray] = None
+    ) -> list[tuple[int, float]]:
+        """
+        Búsqueda aproximada en las nprobe listas más cercanas a la query.
+
+        Args:
+            vector_mask: bool (u,): filas del almacén candidatas (filtros)
+            message_mask: bool (n,): mensajes que se pueden devolver
+
+        Returns:
+            Lista de tuplas (message_id, score) ordenadas por similitud
+        """
+        rows, scores = self.search_rows(store, query_embedding, top_k, nprobe, vector_mask)
+        return store.expand(rows, scores, top_k, message_mask)
+
+    def search_rows(
+        self,
+        store: VectorStore,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        nprobe: int = DEFAULT_NPROBE,
+        vector_mask: Optional[np.ndarray] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Filas de vectors del almacén (y sus scores) más similares a la query"""
+        query = query_embedding / np.linalg.norm(query_embedding)
+
+        probes = top_k_indices(self.centroids @ query, nprobe)
+        candidates = np.concatenate([
+            self.rows[self.offsets[i]:self.offsets[i + 1]] for i in probes
+        ])
+        if vector_mask is not None:
+            # Las filas excluidas por los filtros no se leen ni se puntúan
+            candidates = candidates[vector_mask[candidates]]
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+
+        # Acceso ordenado al memmap para leer las páginas secuencialmente
+        candidates.sort()
+        scores = store.vectors[candidates] @ query
+        best = top_k_indices(scores, top_k)
+
+        return candidates[best], scores[best]
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65_536) -> np.ndarray:
+    """Centroide más cercano (máximo producto escalar) de cada vector, por bloques"""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        block = np.asarray(vectors[start:start + chunk_size])
+        labels[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(
+    vectors: np.ndarray,
+    nlist: int,
+    n_iter: int = 20,
+    sample_size: int = 100_000,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Entrena los centroides con k-means esférico sobre una muestra del corpus.
+
+    Returns:
+        Matriz float32 (nlist, dim) de centroides normalizados
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_rows = np.sort(rng.choice(n, size=min(n, max(sample_size, nlist)), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = _assign(sample, centroids)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+
+        # Las listas vacías se reinician con un punto aleatorio de la muestra
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        centroids = (sums / norms).astype(np.float32)
+
+    return centroids
+
+
+def build_ivf_index(
+    store: VectorStore,
+    nlist: Optional[int] = None,
+    n_iter: int = 20,
+    seed: int = 0
+) -> IVFIndex:
+    """
+    Construye el índice IVF de un almacén de vectores.
+
+    Args:
+        nlist: Número de listas (default: 4·√n)
+        n_iter: Iteraciones de k-means
+    """
+    n = store.n_vectors
+    if n == 0:
+        raise ValueError("No hay embeddings para indexar")
+
+    nlist = min(n, nlist or max(1, int(4 * np.sqrt(n))))
+    logger.info(f"Entrenando IVF con {nlist} listas sobre {n} vectores...")
+
+    centroids = train_centroids(store.vectors, nlist, n_iter=n_iter, seed=seed)
+    labels = _assign(store.vectors, centroids)
+
+    rows = np.argsort(labels, kind='stable')
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+
+    return IVFIndex(centroids=centroids, offsets=offsets, rows=rows, store_version=store.version)
+
+
+def save_ivf_index(index: IVFIndex, db_path: Path) -> Path:
+    """Guarda el índice junto al almacén de vectores"""
+    path = vector_store_path(db_path) / _INDEX_FILE
+    tmp_path = path.with_name(f"{_INDEX_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            centroids=index.centroids,
+            offsets=index.offsets,
+            rows=index.rows,
+            store_version=np.int64(index.store_version),
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_ivf_index(db_path: Path, store: VectorStore) -> Optional[IVFIndex]:
+    """
+    Carga el índice si existe y se construyó sobre la versión actual del almacén.
+
+    Returns:
+        IVFIndex o None (búsqueda exacta)
+    """
+    path = vector_store_path(db_path) / _INDEX_FILE
+    if not path.exists():
+        return None
+
+    with np.load(path) as data:
+        index = IVFIndex(
+            centroids=data["centroids"],
+            offsets=data["offsets"],
+            rows=data["rows"],
+            store_version=int(data["store_version"]),
+        )
+
+    if index.store_version != store.version or index.offsets[-1] != store.n_vectors:
+        logger.warning("Índice IVF desactualizado, usando búsqueda exacta (ejecuta build-ann-index)")
+        return None
+
+    logger.info(f"Índice IVF cargado: {index.nlist} listas")
+    return index
+
+
+def evaluate_recall(
+    index: IVFIndex,
+    store: VectorStore,
+    queries: np.ndarray,
+    top_k: int = 10,
+    nprobe_values: tuple[int, ...] = (1, 2, 4, 8, 16, 32, 64)
+) -> list[dict]:
+    """
+    Recall@k del índice frente a la búsqueda exacta para varios nprobe,
+    medido sobre filas de vectores únicos.
+
+    Returns:
+        Lista de dicts con nprobe, recall y latencias medias (ms) de ambos métodos
+    """
+    exact_results = []
+    start = time.perf_counter()
+    for query in queries:
+        scores = store.vectors @ (query / np.linalg.norm(query))
+        exact_results.append(set(top_k_indices(scores, top_k).tolist()))
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    report = []
+    for nprobe in nprobe_values:
+        if nprobe > index.nlist:
+            break
+        hits = 0
+        start = time.perf_counter()
+        for query, expected in zip(queries, exact_results):
+            found = set(index.search_rows(store, query, top_k=top_k, nprobe=nprobe)[0].tolist())
+            hits += len(found & expected)
+        ann_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        report.append({
+            "nprobe": nprobe,
+            "recall": hits / max(1, sum(len(e) for e in exact_results)),
+            "ann_ms": ann_ms,
+            "exact_ms": exact_ms,
+        })
+
+    return report
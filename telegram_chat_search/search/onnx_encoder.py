@@ -0,0 +1,321 @@
+"""
+Backend ONNX Runtime para el encoder de embeddings
+
+El backend por defecto carga el SentenceTransformer de PyTorch: importar torch
+cuesta varios segundos y cientos de MB, y la inferencia es fp32. Este módulo
+exporta localmente el transformer del mismo modelo cacheado a ONNX (con una
+variante int8 de cuantización dinámica) y lo ejecuta con onnxruntime y
+tokenizers, sin torch en tiempo de ejecución.
+
+El pooling (mean/cls) y la normalización se replican los del SentenceTransformer
+original, así que los vectores son compatibles con los ya guardados: la
+exportación mide la similitud coseno mínima entre ambos backends y la guarda en
+onnx_config.json.
+
+Requiere `pip install onnxruntime tokenizers` para usarlo y, además,
+sentence-transformers (torch) para exportarlo.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("sentence-transformers", "onnx", "onnx-int8")
+
+_MODEL_FILE = "model.onnx"
+_INT8_MODEL_FILE = "model_int8.onnx"
+_CONFIG_FILE = "onnx_config.json"
+
+# Frases de control para comparar los vectores de ambos backends al exportar
+_VALIDATION_TEXTS = [
+    "Hola, ¿cómo estás?",
+    "¿Alguien sabe cómo configurar el nodo?",
+    "Me gusta programar en Python",
+    "El precio ha bajado mucho esta semana, ¿es buen momento para comprar?",
+    "ok",
+    "Gracias por la información, lo pruebo mañana y os cuento qué tal",
+]
+
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+        from tokenizers import Tokenizer
+    except ImportError:
+        raise ImportError(
+            "El backend ONNX necesita onnxruntime y tokenizers. "
+            "Ejecuta: pip install onnxruntime tokenizers"
+        )
+    return onnxruntime, Tokenizer
+
+
+class OnnxEncoder:
+    """
+    Encoder con la misma interfaz `encode` que SentenceTransformer, ejecutado
+    con ONNX Runtime.
+    """
+
+    def __init__(self, model_dir: Path, model_name: Optional[str] = None, quantized: bool = False):
+        """
+        Args:
+            model_dir: Directorio generado por export_onnx
+            model_name: Modelo esperado; si no coincide con el exportado se
+                        rechaza (los vectores no serían compatibles)
+            quantized: Usar la variante int8
+        """
+        onnxruntime, Tokenizer = _import_onnxruntime()
+
+        model_dir = Path(model_dir)
+        config_path = model_dir / _CONFIG_FILE
+        if not config_path.exists():
+            raise FileNotFoundError(
+                f"No hay modelo ONNX en {model_dir}. Ejecuta: python -m telegram_chat_search export-onnx"
+            )
+        self.config = json.loads(config_path.read_text())
+        if model_name is not None and self.config["model_name"] != model_name:
+            raise ValueError(
+                f"El modelo ONNX de {model_dir} es {self.config['model_name']}, no {model_name}. "
+                "Vuelve a ejecutar export-onnx"
+            )
+
+        model_path = model_dir / (_INT8_MODEL_FILE if quantized else _MODEL_FILE)
+        if not model_path.exists():
+            raise FileNotFoundError(f"No existe {model_path} (exporta sin --no-quantize para la variante int8)")
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # ONNX Runtime no lee OMP_NUM_THREADS: se aplica el mismo límite (pool de generate-embeddings)
+        if os.getenv("OMP_NUM_THREADS", "").isdigit():
+            options.intra_op_num_threads = int(os.environ["OMP_NUM_THREADS"])
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"Modelo ONNX cargado: {model_path.name}")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+
+        if self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.config["normalize"]:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32, copy=False)
+
+    def encode(
+        self,
+        sentences,
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True
+    ) -> np.ndarray:
+        """
+        Embeddings (n, dim) de una lista de textos.
+
+        Como SentenceTransformer, ordena por longitud para que cada batch
+        tenga el mínimo padding y devuelve los vectores en el orden original.
+        """
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size=batch_size)[0]
+        if not sentences:
+            return np.empty((0, self.config["dimension"]), dtype=np.float32)
+
+        order = np.argsort([-len(s) for s in sentences], kind='stable')
+        embeddings = np.empty((len(sentences), self.config["dimension"]), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._encode_batch([sentences[i] for i in rows])
+        return embeddings
+
+
+def export_onnx(
+    model_name: str,
+    output_dir: Path,
+    quantize: bool = True,
+    opset: int = 17
+) -> dict:
+    """
+    Exporta el SentenceTransformer cacheado a ONNX (y a int8 si quantize).
+
+    Returns:
+        Dict con las rutas generadas y la similitud coseno mínima de cada
+        variante frente a sentence-transformers sobre frases de control
+    """
+    try:
+        import torch
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        raise ImportError(
+            "Exportar a ONNX necesita sentence-transformers (torch). "
+            "Ejecuta: pip install sentence-transformers"
+        )
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    auto_model = transformer.auto_model.eval()
+
+    pooling = _pooling_mode(st_model)
+    normalize = any(type(module).__name__ == "Normalize" for module in st_model)
+
+    sample = tokenizer(["hola mundo"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    model_path = output_dir / _MODEL_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(auto_model),
+            tuple(sample[name] for name in input_names),
+            str(model_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    tokenizer.save_pretrained(str(output_dir))
+    config = {
+        "model_name": model_name,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "pooling": pooling,
+        "normalize": normalize,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    }
+    (output_dir / _CONFIG_FILE).write_text(json.dumps(config, indent=2))
+
+    report = {"model": str(model_path)}
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        int8_path = output_dir / _INT8_MODEL_FILE
+        quantize_dynamic(str(model_path), str(int8_path), weight_type=QuantType.QInt8)
+        report["model_int8"] = str(int8_path)
+
+    # Compatibilidad con los vectores ya guardados
+    reference = st_model.encode(_VALIDATION_TEXTS, convert_to_numpy=True)
+    for key, quantized in (("min_cosine", False), ("min_cosine_int8", True)):
+        if quantized and not quantize:
+            continue
+        encoded = OnnxEncoder(output_dir, quantized=quantized).encode(_VALIDATION_TEXTS)
+        report[key] = float(_row_cosine(reference, encoded).min())
+
+    config["validation"] = {k: v for k, v in report.items() if k.startswith("min_cosine")}
+    (output_dir / _CONFIG_FILE).write_text(json.dumps(config, indent=2))
+    return report
+
+
+def _pooling_mode(st_model) -> str:
+    """Modo de pooling del SentenceTransformer (solo se replican mean y cls)"""
+    for module in st_model:
+        if type(module).__name__ == "Pooling":
+            mode = module.get_pooling_mode_str()
+            if mode not in ("mean", "cls"):
+                raise ValueError(f"Pooling '{mode}' no soportado por el backend ONNX")
+            return mode
+    raise ValueError("El modelo no tiene módulo de Pooling")
+
+
+def _row_cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def _benchmark_backend(backend: str, model_name: str, model_dir: Optional[str]) -> dict:
+    """Arranque en frío, throughput, latencia de una query y RSS de un backend (proceso nuevo)"""
+    import resource
+    import time
+    from .embeddings import get_model
+
+    start = time.perf_counter()
+    model = get_model(model_name, backend=backend, onnx_dir=Path(model_dir) if model_dir else None)
+    model.encode(["calentamiento"], convert_to_numpy=True)
+    cold_start = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    words = " ".join(_VALIDATION_TEXTS).split()
+    texts = [" ".join(rng.choice(words, size=rng.integers(3, 40))) for _ in range(1000)]
+
+    start = time.perf_counter()
+    model.encode(texts, batch_size=32, convert_to_numpy=True)
+    throughput = len(texts) / (time.perf_counter() - start)
+
+    latencies = []
+    for text in texts[:50]:
+        start = time.perf_counter()
+        model.encode([text], convert_to_numpy=True)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "backend": backend,
+        "cold_start_s": cold_start,
+        "texts_per_s": throughput,
+        "query_ms_p50": float(np.median(latencies)) * 1000,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+if __name__ == "__main__":
+    # Benchmark: python -m telegram_chat_search.search.onnx_encoder <dir_onnx> [modelo]
+    # Cada backend se mide en un proceso nuevo para que el arranque en frío y
+    # el RSS no se contaminen entre sí.
+    import subprocess
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _, _, backend, model_name, model_dir = sys.argv
+        print(json.dumps(_benchmark_backend(backend, model_name, model_dir or None)))
+        sys.exit(0)
+
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else "data/onnx"
+    model_name = sys.argv[2] if len(sys.argv) > 2 else "paraphrase-multilingual-MiniLM-L12-v2"
+
+    print(f"{'backend':>22} | {'arranque':>9} | {'textos/s':>9} | {'query p50':>10} | {'RSS':>8}")
+    for backend in BACKENDS:
+        proc = subprocess.run(
+            [sys.executable, "-m", __spec__.name, "--child", backend, model_name, model_dir],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{backend:>22} | error: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{backend:>22} | {r['cold_start_s']:8.2f}s | {r['texts_per_s']:9.1f} | "
+              f"{r['query_ms_p50']:7.2f} ms | {r['rss_mb']:5.0f} MB")
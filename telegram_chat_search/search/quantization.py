@@ -0,0 +1,243 @@
+"""
+Niveles comprimidos de los embeddings para reducir la memoria residente
+
+El almacén de vectores guarda float32 (1.5 KB por mensaje con 384 dimensiones).
+Para la búsqueda exacta se puede mantener en RAM una copia comprimida y
+recorrer esa en lugar de la matriz completa:
+
+- "float16": mitad de tamaño (2x).
+- "int8": un byte por dimensión con escala por vector (4x).
+- "binary": un bit por dimensión (el signo respecto a la media del corpus),
+  comparado por distancia de Hamming (32x).
+
+La copia comprimida solo preselecciona candidatos; el top-k final se recalcula
+con los float32 del almacén, leyendo del disco solo esas filas.
+
+Cada nivel se genera a partir del almacén la primera vez que se usa y se guarda
+en <db>.vectors/<nivel>.npz con la versión del almacén.
+"""
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import logging
+
+import numpy as np
+
+from ..database.vector_store import VectorStore, vector_store_path
+from .embeddings import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("float32", "float16", "int8", "binary")
+
+DEFAULT_RESCORE_FACTOR = 10
+
+# Bits a 1 de cada valor de byte, para la distancia de Hamming
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_CHUNK_SIZE = 65_536
+# Filas por bloque al puntuar: el bloque convertido a float32 cabe en caché
+_SCORE_CHUNK_SIZE = 1024
+
+
+@dataclass
+class QuantizedVectors:
+    """Copia comprimida de las filas de un VectorStore"""
+    tier: str
+    codes: np.ndarray                     # float16 / int8 (n, dim) o uint8 (n, dim/8)
+    scales: Optional[np.ndarray] = None   # float32 (n,) para int8
+    center: Optional[np.ndarray] = None   # float32 (dim,) para binary
+    store_version: int = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.codes, self.scales, self.center) if a is not None)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        Similitud aproximada de cada fila con la query normalizada (mayor = mejor).
+
+        Se calcula por bloques para no materializar la matriz en float32.
+        """
+        n = len(self.codes)
+        scores = np.empty(n, dtype=np.float32)
+
+        if self.tier == "binary":
+            query_code = np.packbits(query - self.center > 0)
+            for start in range(0, n, _CHUNK_SIZE):
+                block = self.codes[start:start + _CHUNK_SIZE]
+                distance = _POPCOUNT[np.bitwise_xor(block, query_code)].sum(axis=1, dtype=np.int32)
+                scores[start:start + _CHUNK_SIZE] = -distance
+            return scores
+
+        buffer = np.empty((_SCORE_CHUNK_SIZE, self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, n, _SCORE_CHUNK_SIZE):
+            block = self.codes[start:start + _SCORE_CHUNK_SIZE]
+            np.copyto(buffer[:len(block)], block)
+            np.matmul(buffer[:len(block)], query, out=scores[start:start + len(block)])
+
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+
+def quantize(vectors: np.ndarray, tier: str, store_version: int = 0) -> QuantizedVectors:
+    """Genera el nivel comprimido de una matriz de vectores normalizados, por bloques"""
+    if tier not in TIERS or tier == "float32":
+        raise ValueError(f"Nivel de cuantización desconocido: {tier} (usa {', '.join(TIERS[1:])})")
+
+    n, dim = vectors.shape
+    if tier == "float16":
+        codes = np.empty((n, dim), dtype=np.float16)
+    elif tier == "int8":
+        codes = np.empty((n, dim), dtype=np.int8)
+    else:
+        codes = np.empty((n, (dim + 7) // 8), dtype=np.uint8)
+    scales = np.empty(n, dtype=np.float32) if tier == "int8" else None
+    center = _column_mean(vectors) if tier == "binary" else None
+
+    for start in range(0, n, _CHUNK_SIZE):
+        block = np.asarray(vectors[start:start + _CHUNK_SIZE], dtype=np.float32)
+        end = start + len(block)
+
+        if tier == "float16":
+            codes[start:end] = block
+        elif tier == "int8":
+            block_scales = np.abs(block).max(axis=1) / 127
+            block_scales[block_scales == 0] = 1
+            codes[start:end] = np.round(block / block_scales[:, None])
+            scales[start:end] = block_scales
+        else:
+            # Centrar antes del signo: los embeddings comparten una componente
+            # común que haría casi todos los bits iguales
+            codes[start:end] = np.packbits(block - center > 0, axis=1)
+
+    return QuantizedVectors(tier=tier, codes=codes, scales=scales, center=center, store_version=store_version)
+
+
+def _column_mean(vectors: np.ndarray) -> np.ndarray:
+    """Media por dimensión calculada por bloques (vectors puede ser un memmap)"""
+    total = np.zeros(vectors.shape[1], dtype=np.float64)
+    for start in range(0, len(vectors), _CHUNK_SIZE):
+        total += np.asarray(vectors[start:start + _CHUNK_SIZE], dtype=np.float32).sum(axis=0)
+    return (total / max(1, len(vectors))).astype(np.float32)
+
+
+def _tier_path(db_path: Path, tier: str) -> Path:
+    return vector_store_path(db_path) / f"{tier}.npz"
+
+
+def load_quantized(db_path: Path, store: VectorStore, tier: str) -> QuantizedVectors:
+    """
+    Carga en memoria el nivel comprimido, generándolo si falta o está desactualizado.
+    """
+    path = _tier_path(db_path, tier)
+    if path.exists():
+        with np.load(path) as data:
+            if int(data["store_version"]) == store.version and len(data["codes"]) == store.n_vectors:
+                return QuantizedVectors(
+                    tier=tier,
+                    codes=data["codes"],
+                    scales=data["scales"] if "scales" in data else None,
+                    center=data["center"] if "center" in data else None,
+                    store_version=store.version,
+                )
+
+    logger.info(f"Generando nivel {tier} de {store.n_vectors} vectores...")
+    quantized = quantize(store.vectors, tier, store_version=store.version)
+
+    arrays = {"codes": quantized.codes, "store_version": np.int64(store.version)}
+    if quantized.scales is not None:
+        arrays["scales"] = quantized.scales
+    if quantized.center is not None:
+        arrays["center"] = quantized.center
+    try:
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el nivel {tier} ({e}), se regenerará en el próximo arranque")
+
+    return quantized
+
+
+def search_quantized(
+    store: VectorStore,
+    quantized: QuantizedVectors,
+    query_embedding: np.ndarray,
+    top_k: int = 10,
+    rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+    vector_mask: Optional[np.ndarray] = None,
+    message_mask: Optional[np.ndarray] = None
+) -> list[tuple[int, float]]:
+    """
+    Preselecciona top_k·rescore_factor candidatos con el nivel comprimido y
+    los reordena con los vectores float32 del almacén.
+
+    Con vector_mask/message_mask (filtros) solo se consideran esas filas y
+    mensajes.
+
+    Returns:
+        Lista de tuplas (message_id, score exacto) ordenadas por similitud
+    """
+    query = (query_embedding / np.linalg.norm(query_embedding)).astype(np.float32)
+
+    approx = quantized.scores(query)
+    n_candidates = top_k * max(1, rescore_factor)
+    if vector_mask is not None:
+        approx[~vector_mask] = -np.inf
+        n_candidates = min(n_candidates, int(vector_mask.sum()))
+    shortlist = top_k_indices(approx, n_candidates)
+    if len(shortlist) == 0:
+        return []
+
+    # Acceso ordenado al memmap: solo se leen del disco las filas candidatas
+    shortlist.sort()
+    exact = store.vectors[shortlist] @ query
+    best = top_k_indices(exact, top_k)
+
+    return store.expand(shortlist[best], exact[best], top_k, message_mask)
+
+
+if __name__ == "__main__":
+    # Memoria residente, recall@k y latencia de cada nivel frente a la búsqueda exacta
+    import sys
+    import time
+
+    logging.basicConfig(level=logging.WARNING)
+
+    n_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    dim, top_k, n_queries = 384, 10, 100
+
+    # Datos agrupados (como los embeddings reales) y ya normalizados
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((500, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n_vectors)]
+    vectors += 0.6 * rng.standard_normal((n_vectors, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    store = VectorStore(ids=np.arange(n_vectors, dtype=np.int64), vectors=vectors, version=0)
+    queries = vectors[rng.choice(n_vectors, n_queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+    start = time.perf_counter()
+    exact_results = [set(top_k_indices(vectors @ (q / np.linalg.norm(q)), top_k).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) / n_queries * 1000
+    print(f"{'float32':>8} | {vectors.nbytes / 1024 / 1024:8.1f} MB ( 1.0x) | "
+          f"recall@{top_k} 1.000 | {exact_ms:6.2f} ms/query")
+
+    for tier in TIERS[1:]:
+        quantized = quantize(vectors, tier)
+        for factor in (1, 10, 50):
+            hits = 0
+            start = time.perf_counter()
+            for q, expected in zip(queries, exact_results):
+                found = {msg_id for msg_id, _ in search_quantized(store, quantized, q, top_k, factor)}
+                hits += len(found & expected)
+            elapsed = (time.perf_counter() - start) / n_queries * 1000
+            print(f"{tier:>8} | {quantized.nbytes / 1024 / 1024:8.1f} MB ({vectors.nbytes / quantized.nbytes:4.1f}x) | "
+                  f"recall@{top_k} {hits / (n_queries * top_k):.3f} | {elapsed:6.2f} ms/query "
+                  f"(rescore x{factor})")
@@ -0,0 +1,171 @@
+"""
+Caché de embeddings de queries
+
+Codificar la query es el paso más caro de una búsqueda (una pasada completa
+del transformer en CPU) y los usuarios repiten las mismas preguntas. La caché
+guarda los vectores en un LRU acotado con el encoder (modelo y backend) y la
+query normalizada (minúsculas y espacios colapsados) como clave: los backends
+ONNX (sobre todo int8) no dan exactamente los mismos vectores que
+sentence-transformers, así que cada uno tiene sus propias entradas.
+
+Opcionalmente se persiste en un archivo SQLite propio, separado de la base de
+datos de mensajes (que en el perfil "serve" es de solo lectura), para
+sobrevivir a los reinicios.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+import logging
+
+import numpy as np
+
+from .cache_stats import CacheStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_CACHE_SIZE = 1000
+
+# model_name guarda el encoder (modelo@backend, ver encoder_key): las filas
+# antiguas, solo con el nombre del modelo, ya no se leen
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS query_embeddings (
+    model_name TEXT NOT NULL,
+    query_key TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model_name, query_key)
+)
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Clave de caché: minúsculas y espacios colapsados"""
+    return " ".join(query.lower().split())
+
+
+def encoder_key(model_name: str, backend: str) -> str:
+    """Identifica el encoder: mismo modelo con otro backend (o cuantizado) da otros vectores"""
+    return f"{model_name}@{backend}"
+
+
+class QueryEmbeddingCache:
+    """LRU de embeddings de queries con contadores de aciertos y persistencia opcional"""
+
+    def __init__(
+        self,
+        model_name: str,
+        max_size: int = DEFAULT_QUERY_CACHE_SIZE,
+        persist_path: Optional[Path] = None,
+        backend: str = "sentence-transformers"
+    ):
+        """
+        Args:
+            model_name: Modelo de embeddings
+            max_size: Queries guardadas como máximo
+            persist_path: Archivo SQLite donde persistir la caché (None = solo en memoria)
+            backend: Backend del encoder (sentence-transformers, onnx, onnx-int8)
+        """
+        self.model_name = model_name
+        self.backend = backend
+        self.encoder = encoder_key(model_name, backend)
+        self.max_size = max_size
+        # Aciertos y tiempo de codificación de los fallos
+        self.counters = CacheStats("Caché de queries", "de CPU")
+
+        # (encoder, query normalizada) -> vector
+        self._vectors: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if persist_path is not None and max_size > 0:
+            self._open(Path(persist_path))
+
+    def _open(self, path: Path) -> None:
+        """Abre el archivo de persistencia y carga las queries más recientes"""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.execute(CREATE_TABLE_SQL)
+            rows = self._conn.execute("""
+                SELECT query_key, embedding FROM query_embeddings
+                WHERE model_name = ?
+                ORDER BY last_used DESC
+                LIMIT ?
+            """, (self.encoder, self.max_size)).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"No se pudo abrir la caché de queries en {path} ({e}), solo en memoria")
+            self._conn = None
+            return
+
+        # De la menos a la más reciente, para respetar el orden LRU
+        for query_key, blob in reversed(rows):
+            self._vectors[(self.encoder, query_key)] = np.frombuffer(blob, dtype=np.float32)
+        logger.info(f"Caché de queries: {len(self._vectors)} embeddings cargados de {path.name}")
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Embedding cacheado de la query (cuenta acierto o fallo)"""
+        key = (self.encoder, normalize_query(query))
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is not None:
+                self._vectors.move_to_end(key)
+
+        self.counters.record_lookup(vector is not None)
+        return vector
+
+    def put(self, query: str, vector: np.ndarray, encode_seconds: float = 0.0) -> None:
+        """Guarda el embedding recién calculado de una query"""
+        if self.max_size <= 0:
+            return
+
+        key = (self.encoder, normalize_query(query))
+        vector = np.asarray(vector, dtype=np.float32)
+        self.counters.record_cost(encode_seconds)
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_size:
+                self._vectors.popitem(last=False)
+
+            if self._conn is not None:
+                self._persist(key[1], vector)
+
+    def _persist(self, query_key: str, vector: np.ndarray) -> None:
+        try:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO query_embeddings (model_name, query_key, embedding, last_used)
+                VALUES (?, ?, ?, ?)
+            """, (self.encoder, query_key, vector.tobytes(), time.time()))
+            # Mantener el archivo acotado al tamaño de la caché
+            self._conn.execute("""
+                DELETE FROM query_embeddings
+                WHERE model_name = ? AND query_key NOT IN (
+                    SELECT query_key FROM query_embeddings
+                    WHERE model_name = ?
+                    ORDER BY last_used DESC
+                    LIMIT ?
+                )
+            """, (self.encoder, self.encoder, self.max_size))
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo persistir la caché de queries: {e}")
+
+    def stats(self) -> dict:
+        """Aciertos, fallos y CPU estimada ahorrada (aciertos × coste medio de un fallo)"""
+        return {"size": len(self._vectors), **self.counters.as_dict()}
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def log_stats(self) -> None:
+        self.counters.log()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,116 @@
+"""
+Caché de resultados de búsquedas híbridas completas
+
+La interfaz repite búsquedas idénticas: dobles clics, la misma pregunta
+frecuente de muchos usuarios, reintentos tras un error del LLM. La caché
+guarda el ranking final (message_id, score, match_type) de cada búsqueda en
+un LRU acotado con caducidad (TTL), con la query normalizada, top_k, los
+filtros y los parámetros de fusión como clave.
+
+Cada entrada se guarda con la versión de los datos (mensajes y embeddings,
+ver store_metadata) con la que se calculó y la caché se descarta entera
+cuando la versión cambia. HybridSearch recarga en ese momento el almacén de
+vectores y los metadatos, así que los rankings nuevos ya usan los datos
+actuales.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+import logging
+
+from .cache_stats import CacheStats
+from .query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_CACHE_SIZE = 256
+DEFAULT_RESULT_CACHE_TTL = 600.0
+
+Ranking = list[tuple[int, float, str]]
+
+
+def result_cache_key(query: str, top_k: int, *params: Hashable) -> tuple:
+    """Clave de caché: query normalizada, top_k y el resto de parámetros (filtros, fusión)"""
+    return (normalize_query(query), top_k, *params)
+
+
+class SearchResultCache:
+    """LRU con TTL de rankings de búsqueda, invalidado por versión de los datos"""
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_RESULT_CACHE_SIZE,
+        ttl: Optional[float] = DEFAULT_RESULT_CACHE_TTL
+    ):
+        """
+        Args:
+            max_size: Rankings guardados como máximo
+            ttl: Segundos de validez de cada ranking (None = sin caducidad)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        # Aciertos y latencia de las búsquedas cacheadas
+        self.counters = CacheStats("Caché de resultados", "de búsqueda")
+        self.expired = 0
+        self.invalidations = 0
+
+        # clave -> (instante de guardado, ranking)
+        self._entries: OrderedDict[tuple, tuple[float, Ranking]] = OrderedDict()
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: Hashable) -> None:
+        # Con el lock adquirido
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info(f"Caché de resultados invalidada ({len(self._entries)} entradas): cambiaron los datos")
+                self._entries.clear()
+            self._version = version
+
+    def get(self, key: tuple, version: Hashable) -> Optional[Ranking]:
+        """Ranking cacheado para la clave con la versión de datos actual (cuenta acierto o fallo)"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        self.counters.record_lookup(entry is not None)
+        return list(entry[1]) if entry is not None else None
+
+    def put(self, key: tuple, version: Hashable, ranking: Ranking, search_seconds: float = 0.0) -> None:
+        """Guarda el ranking recién calculado con la versión de datos usada"""
+        if self.max_size <= 0:
+            return
+
+        self.counters.record_cost(search_seconds)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic(), list(ranking))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Aciertos, fallos y latencia estimada ahorrada (aciertos × latencia media)"""
+        with self._lock:
+            sizes = {"size": len(self._entries), "expired": self.expired, "invalidations": self.invalidations}
+        return {**sizes, **self.counters.as_dict()}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def log_stats(self) -> None:
+        self.counters.log()